@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""sc2bench times how long sc2reader takes to load a set of replays.
+
+Each benchmark loads the same replays in a couple of different ways and
+reports the best time out of several runs along with the number of events
+kept, when it loads any, so the effect of a loading option can be measured on
+your own replays::
+
+    python examples/sc2bench.py filters test_replays/2.0.8.25604
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import argparse
+import subprocess
+import sys
+import time
+
+import sc2reader
+from sc2reader.utils import get_files
+
+
+def best_time(function, repeat, setup=None):
+    """ Returns the fastest of ``repeat`` runs of function and its result.
+    When setup is given it is called, untimed, before each run and function
+    is called with what it returns.
+    """
+    best = None
+    for i in range(repeat):
+        args = (setup(),) if setup is not None else ()
+        start = time.time()
+        result = function(*args)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def load_events(paths, **options):
+    return sum(len(replay.events) for replay in sc2reader.load_replays(paths, engine=None, **options))
+
+
+def bench_filters(paths):
+    """ Event type filtering, as used by jobs that only care about actions """
+    return [
+        ('all events', lambda: load_events(paths)),
+        ('no camera or unit positions', lambda: load_events(paths, exclude_event_types=['CameraEvent', 'UnitPositionsEvent'])),
+        ('ability events only', lambda: load_events(paths, event_types=['AbilityEvent'])),
+        ('tracker events only', lambda: load_events(paths, event_types=['TrackerEvent'])),
+    ]
+
+
+def bench_merge(paths):
+    """ Merging the tracker, game and message events into replay.events """
+    replays = list(sc2reader.load_replays(paths, engine=None))
+
+    def sort_three_times():
+        # The way replay.events used to be built, sorting once per source
+        count = 0
+        for replay in replays:
+            events = sorted(replay.message_events, key=lambda e: e.frame)
+            events = sorted(replay.game_events + events, key=lambda e: e.frame)
+            events = sorted(replay.tracker_events + events, key=lambda e: e.frame)
+            count += len(events)
+        return count
+
+    return [
+        ('three sorts', sort_three_times),
+        ('merged_events', lambda: sum(len(replay.merged_events()) for replay in replays)),
+    ]
+
+
+def bench_engine(paths):
+    """ Engine throughput with the default GameHeartNormalizer and ContextLoader plugins """
+    from sc2reader.engine import GameEngine
+    from sc2reader.engine.plugins import GameHeartNormalizer, ContextLoader
+
+    def load_replays():
+        # The plugins change the replays, so every run gets fresh ones
+        return list(sc2reader.load_replays(paths, engine=None))
+
+    def run_engine(engine, replays):
+        for replay in replays:
+            engine.run(replay)
+        return sum(len(replay.events) for replay in replays)
+
+    engine = GameEngine(plugins=[GameHeartNormalizer(), ContextLoader()])
+    profiled = GameEngine(plugins=[GameHeartNormalizer(), ContextLoader()], profile=True)
+    return [
+        ('new engine per run', lambda replays: run_engine(GameEngine(plugins=[GameHeartNormalizer(), ContextLoader()]), replays), load_replays),
+        ('one engine for every run', lambda replays: run_engine(engine, replays), load_replays),
+        ('profiling engine', lambda replays: run_engine(profiled, replays), load_replays),
+    ]
+
+
+def bench_import(paths):
+    """ Start up time of a new interpreter importing sc2reader and peeking at the replay headers """
+    def run(script):
+        subprocess.check_call([sys.executable, '-c', script])
+        return None
+
+    peek = "import sc2reader; [sc2reader.peek_header(path) for path in {0!r}]".format([str(path) for path in paths])
+    return [
+        ('python', lambda: run("pass")),
+        ('import sc2reader', lambda: run("import sc2reader")),
+        ('peek_header', lambda: run(peek)),
+        ('import the engine and factories', lambda: run("import sc2reader.engine, sc2reader.factories")),
+    ]
+
+
+BENCHMARKS = dict(
+    filters=bench_filters,
+    merge=bench_merge,
+    engine=bench_engine,
+    imports=bench_import,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times replay loading with different sc2reader options')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS.keys()), help='The benchmark to run')
+    parser.add_argument('paths', nargs='+', help='Replay files or directories to load')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of runs to take the best time from')
+    args = parser.parse_args()
+
+    paths = [path for source in args.paths for path in get_files(source, extension='SC2Replay')]
+    print('Loading {0} replays, best of {1} runs'.format(len(paths), args.repeat))
+
+    baseline = None
+    for benchmark in BENCHMARKS[args.benchmark](paths):
+        name, function, setup = (benchmark + (None,))[:3]
+        elapsed, events = best_time(function, args.repeat, setup)
+        baseline = baseline or elapsed
+        line = '{0:<40} {1:>8.3f}s {2:>6.2f}x'.format(name, elapsed, baseline / elapsed)
+        if events:
+            # Benchmarks that don't load events return None
+            line += ' {0:>10} events {1:>10.0f} events/s'.format(events, events / elapsed)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,23 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals, division
 
+__version__ = '0.5.1'
+
 import os
 import sys
 
-# import submodules
-from sc2reader import engine
-from sc2reader import factories, log_utils
+from sc2reader import log_utils
 
 # setup the library logging
 log_utils.setup()
 
-# For backwards compatibility
-SC2Reader = factories.SC2Factory
-
 
 def setFactory(factory):
     # Expose a nice module level interface
     module = sys.modules[__name__]
     module.load_replays = factory.load_replays
     module.load_replay = factory.load_replay
+    module.peek_header = factory.peek_header
     module.load_maps = factory.load_maps
     module.load_map = factory.load_map
     module.load_game_summaries = factory.load_game_summaries
@@ -33,25 +31,69 @@ def setFactory(factory):
 
 
 def useFileCache(cache_dir, **options):
+    from sc2reader import factories
     setFactory(factories.FileCachedSC2Factory(cache_dir, **options))
 
 
-def useDictCache(cache_max_size=0, **options):
-    setFactory(factories.DictCachedSC2Factory(cache_max_size, **options))
+def useDictCache(cache_max_size=0, cache_max_bytes=0, **options):
+    from sc2reader import factories
+    setFactory(factories.DictCachedSC2Factory(cache_max_size, cache_max_bytes, **options))
+
+
+def useDoubleCache(cache_dir, cache_max_size=0, cache_max_bytes=0, **options):
+    from sc2reader import factories
+    setFactory(factories.DoubleCachedSC2Factory(cache_dir, cache_max_size, cache_max_bytes, **options))
 
 
-def useDoubleCache(cache_dir, cache_max_size=0, **options):
-    setFactory(factories.DoubleCachedSC2Factory(cache_dir, cache_max_size, **options))
+def useDefaultFactory():
+    """ Sets up the default factory, using the caches that the environment
+    variables ask for.
+    """
+    from sc2reader import factories
+    if cache_dir and (cache_max_size or cache_max_bytes):
+        useDoubleCache(cache_dir, cache_max_size, cache_max_bytes, cache_dir_max_bytes=cache_dir_max_bytes)
+    elif cache_dir:
+        useFileCache(cache_dir, cache_dir_max_bytes=cache_dir_max_bytes)
+    elif cache_max_size or cache_max_bytes:
+        useDictCache(cache_max_size, cache_max_bytes)
+    else:
+        setFactory(factories.SC2Factory())
 
 
 # Allow environment variables to activate caching
 cache_dir = os.getenv('SC2READER_CACHE_DIR')
-cache_max_size = os.getenv('SC2READER_CACHE_MAX_SIZE')
-if cache_dir and cache_max_size:
-    useDoubleCache(cache_dir, cache_max_size)
-elif cache_dir:
-    useFileCache(cache_dir)
-elif cache_max_size:
-    useDictCache(cache_max_size)
-else:
-    setFactory(factories.SC2Factory())
+cache_max_size = int(os.getenv('SC2READER_CACHE_MAX_SIZE') or 0)
+cache_max_bytes = int(os.getenv('SC2READER_CACHE_MAX_BYTES') or 0)
+cache_dir_max_bytes = int(os.getenv('SC2READER_CACHE_DIR_MAX_BYTES') or 0)
+
+# The names that setFactory fills in
+_factory_names = ('load_replays', 'load_replay', 'peek_header', 'load_maps', 'load_map', 'load_game_summaries',
+                  'load_game_summary', 'configure', 'reset', 'register_plugin', '_defaultFactory')
+
+# The submodules that used to be imported along with sc2reader
+_submodule_names = ('constants', 'data', 'decoders', 'engine', 'events', 'exceptions', 'factories', 'objects',
+                    'readers', 'resources', 'schema', 'utils')
+
+
+def __getattr__(name):
+    # The submodules and the default factory are set up the first time they
+    # are used, so that importing sc2reader stays cheap. See the importing
+    # section of the docs for the budget the tests hold this to.
+    if name in _factory_names:
+        useDefaultFactory()
+        return getattr(sys.modules[__name__], name)
+    elif name in _submodule_names:
+        import importlib
+        return importlib.import_module('sc2reader.' + name)
+    elif name == 'SC2Reader':
+        # For backwards compatibility
+        from sc2reader.factories import SC2Factory
+        return SC2Factory
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+
+if sys.version_info < (3, 7):
+    # Modules can only have a __getattr__ from python 3.7 on
+    from sc2reader import engine, factories
+    SC2Reader = factories.SC2Factory
+    useDefaultFactory()
@@ -0,0 +1,1039 @@
+/*
+ * Compiled implementation of sc2reader.decoders.BitPackedDecoder.
+ *
+ * Decodes exactly the same bit packed format as the pure python decoder,
+ * bit for bit, and exposes the same interface so it can be swapped in
+ * wherever a BitPackedDecoder is expected. sc2reader.decoders picks this
+ * version up automatically when it has been built and falls back to the
+ * pure python classes otherwise.
+ *
+ * Bits are consumed from the low end of each byte. Only the unused high
+ * bits of the last partially read byte are carried over between reads,
+ * shifted down so that the next read can take them from the bottom.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <structmember.h>
+#include <stdint.h>
+#include <string.h>
+
+#if PY_MAJOR_VERSION >= 3
+#define IS_PY3K
+#endif
+
+/* Py_SETREF and Py_XSETREF are only defined from 2.7.12 and 3.5.2 */
+#ifndef Py_SETREF
+#define Py_SETREF(op, op2) \
+    do { \
+        PyObject *_py_tmp = (PyObject *)(op); \
+        (op) = (op2); \
+        Py_DECREF(_py_tmp); \
+    } while (0)
+#endif
+
+#ifndef Py_XSETREF
+#define Py_XSETREF(op, op2) \
+    do { \
+        PyObject *_py_tmp = (PyObject *)(op); \
+        (op) = (op2); \
+        Py_XDECREF(_py_tmp); \
+    } while (0)
+#endif
+
+#ifndef IS_PY3K
+/* Python 2 has no PyBytes_FromObject, copy the object's buffer instead */
+static PyObject *
+bytes_from_object(PyObject *obj)
+{
+    Py_buffer view;
+    const char *buffer;
+    Py_ssize_t length;
+    PyObject *result;
+
+    if (PyBytes_Check(obj)) {
+        Py_INCREF(obj);
+        return obj;
+    }
+    if (PyObject_CheckBuffer(obj)) {
+        if (PyObject_GetBuffer(obj, &view, PyBUF_SIMPLE) < 0)
+            return NULL;
+        result = PyBytes_FromStringAndSize((const char *)view.buf, view.len);
+        PyBuffer_Release(&view);
+        return result;
+    }
+    /* mmap and buffer objects only have the old buffer interface */
+    if (PyObject_AsReadBuffer(obj, (const void **)&buffer, &length) < 0)
+        return NULL;
+    return PyBytes_FromStringAndSize(buffer, length);
+}
+#define PyBytes_FromObject bytes_from_object
+#endif
+
+/* Buffers up to this size are kept on the stack */
+#define STACK_BUFFER_SIZE 128
+
+/* Selection masks are capped like the python SINGLE_BIT_MASKS table */
+#define MAX_SELECTION_BITS 512
+
+static PyObject *OrderedDict = NULL;
+
+typedef struct {
+    PyObject_HEAD
+    /* The bytes object being decoded */
+    PyObject *contents;
+    const unsigned char *data;
+    Py_ssize_t length;
+    /* The offset of the next unread byte */
+    Py_ssize_t pos;
+    /* The unused bits of the last partially read byte, shifted down */
+    unsigned int next;
+    /* The number of unused bits left in next */
+    int nextbits;
+} Decoder;
+
+
+/* Low level helpers, these all return -1 with an exception set on failure */
+
+static int
+require(Decoder *self, Py_ssize_t count)
+{
+    if (count > self->length - self->pos) {
+        PyErr_Format(PyExc_EOFError, "Cannot read %zd bytes at offset %zd", count, self->pos);
+        return -1;
+    }
+    return 0;
+}
+
+static int
+read_uint(Decoder *self, int count, uint64_t *out)
+{
+    const unsigned char *p;
+    uint64_t data = 0;
+    int i, shift;
+
+    if (require(self, count) < 0)
+        return -1;
+
+    p = self->data + self->pos;
+    for (i = 0; i < count; i++)
+        data = data << 8 | p[i];
+    self->pos += count;
+
+    /* Unaligned reads keep the same bit offset into the new bytes */
+    if (self->nextbits) {
+        shift = 8 - self->nextbits;
+        uint64_t hi = (uint64_t)self->next << (count * 8 - self->nextbits);
+        uint64_t mi = (data >> 8) << shift;
+        uint64_t lo = data & ((1u << shift) - 1);
+        self->next = (unsigned int)(data & 0xFF) >> shift;
+        data = hi | mi | lo;
+    }
+
+    *out = data;
+    return 0;
+}
+
+static int
+read_bits64(Decoder *self, int count, uint64_t *out)
+{
+    const unsigned char *p;
+    uint64_t result;
+    int i, whole, bits, nextbits = self->nextbits;
+
+    /* Small reads can usually be served from the byte in progress */
+    if (count <= nextbits) {
+        *out = self->next & ((1u << count) - 1);
+        self->next >>= count;
+        self->nextbits = nextbits - count;
+        return 0;
+    }
+
+    /* Otherwise the rest of the byte in progress forms the high bits */
+    count -= nextbits;
+    result = nextbits ? self->next : 0;
+    whole = count >> 3;
+    bits = count & 7;
+    if (require(self, whole + (bits ? 1 : 0)) < 0)
+        return -1;
+
+    p = self->data + self->pos;
+    for (i = 0; i < whole; i++)
+        result = result << 8 | p[i];
+
+    /* Finally take the low bits from the next byte and keep the rest */
+    if (bits) {
+        result = result << bits | (p[whole] & ((1u << bits) - 1));
+        self->next = p[whole] >> bits;
+        self->nextbits = 8 - bits;
+        self->pos += whole + 1;
+    }
+    else {
+        self->nextbits = 0;
+        self->pos += whole;
+    }
+
+    *out = result;
+    return 0;
+}
+
+/* Appends the low ``count`` bits of value, high bit first, at bit offset *at */
+static void
+push_bits(unsigned char *buf, Py_ssize_t *at, unsigned int value, int count)
+{
+    while (count > 0) {
+        int used = (int)(*at & 7);
+        int take = count < 8 - used ? count : 8 - used;
+        unsigned int chunk = (value >> (count - take)) & ((1u << take) - 1);
+        buf[*at >> 3] |= (unsigned char)(chunk << (8 - used - take));
+        *at += take;
+        count -= take;
+    }
+}
+
+/* Same as read_bits64 but writes the result big endian into size bytes */
+static int
+read_bits_into(Decoder *self, Py_ssize_t count, unsigned char *buf, Py_ssize_t size)
+{
+    const unsigned char *p;
+    Py_ssize_t i, whole, at = size * 8 - count;
+    int bits, nextbits = self->nextbits;
+
+    memset(buf, 0, size);
+    if (count <= nextbits) {
+        push_bits(buf, &at, self->next & ((1u << count) - 1), (int)count);
+        self->next >>= count;
+        self->nextbits = nextbits - (int)count;
+        return 0;
+    }
+
+    count -= nextbits;
+    whole = count >> 3;
+    bits = (int)(count & 7);
+    if (require(self, whole + (bits ? 1 : 0)) < 0)
+        return -1;
+
+    push_bits(buf, &at, nextbits ? self->next : 0, nextbits);
+    p = self->data + self->pos;
+    for (i = 0; i < whole; i++)
+        push_bits(buf, &at, p[i], 8);
+
+    if (bits) {
+        push_bits(buf, &at, p[whole] & ((1u << bits) - 1), bits);
+        self->next = p[whole] >> bits;
+        self->nextbits = 8 - bits;
+        self->pos += whole + 1;
+    }
+    else {
+        self->nextbits = 0;
+        self->pos += whole;
+    }
+    return 0;
+}
+
+/* The python decoder doesn't reject small negative counts on a byte boundary.
+ * It reads the next byte and masks it with an index that wraps around to
+ * 9 + count bits. Some s2gs files have bit arrays like that. */
+static int
+read_negative_bits(Decoder *self, Py_ssize_t count, uint64_t *out)
+{
+    if (self->nextbits != 0 || count < -9) {
+        PyErr_SetString(PyExc_ValueError, "Cannot read a negative number of bits");
+        return -1;
+    }
+    if (require(self, 1) < 0)
+        return -1;
+    *out = self->data[self->pos++] & ((1u << (9 + count)) - 1);
+    return 0;
+}
+
+static PyObject *
+read_bits(Decoder *self, Py_ssize_t count)
+{
+    unsigned char stack[STACK_BUFFER_SIZE], *buf = stack;
+    Py_ssize_t size;
+    PyObject *result = NULL;
+    uint64_t value;
+
+    if (count < 0) {
+        if (read_negative_bits(self, count, &value) < 0)
+            return NULL;
+        return PyLong_FromUnsignedLongLong(value);
+    }
+
+    if (count <= 64) {
+        if (read_bits64(self, (int)count, &value) < 0)
+            return NULL;
+        return PyLong_FromUnsignedLongLong(value);
+    }
+
+    /* Big bit arrays are converted through a byte string */
+    size = (count + 7) / 8;
+    if (size > STACK_BUFFER_SIZE && (buf = PyMem_Malloc(size)) == NULL)
+        return PyErr_NoMemory();
+    if (read_bits_into(self, count, buf, size) == 0)
+        result = _PyLong_FromByteArray(buf, size, 0, 0);
+    if (buf != stack)
+        PyMem_Free(buf);
+    return result;
+}
+
+static PyObject *
+read_bytes(Decoder *self, Py_ssize_t count)
+{
+    PyObject *result;
+    const unsigned char *p;
+    unsigned char *out;
+    unsigned int next;
+    Py_ssize_t i;
+    int shift;
+
+    if (count < 0) {
+        PyErr_SetString(PyExc_ValueError, "Cannot read a negative number of bytes");
+        return NULL;
+    }
+    if (require(self, count) < 0)
+        return NULL;
+
+    p = self->data + self->pos;
+    if (!self->nextbits) {
+        result = PyBytes_FromStringAndSize((const char *)p, count);
+    }
+    else {
+        /* Each output byte joins the unused high bits of the previous byte
+         * with the low bits of the next one, just like read_uint8. */
+        result = PyBytes_FromStringAndSize(NULL, count);
+        if (result == NULL)
+            return NULL;
+        out = (unsigned char *)PyBytes_AS_STRING(result);
+        shift = 8 - self->nextbits;
+        next = self->next;
+        for (i = 0; i < count; i++) {
+            out[i] = (unsigned char)(next << shift | (p[i] & ((1u << shift) - 1)));
+            next = p[i] >> shift;
+        }
+        self->next = next;
+    }
+
+    if (result != NULL)
+        self->pos += count;
+    return result;
+}
+
+static PyObject *
+read_aligned_bytes(Decoder *self, Py_ssize_t count)
+{
+    self->nextbits = 0;
+    return read_bytes(self, count);
+}
+
+static PyObject *
+read_vint(Decoder *self)
+{
+    PyObject *result, *tmp, *part;
+    uint64_t byte, value;
+    int negative, bits = 6;
+
+    if (read_uint(self, 1, &byte) < 0)
+        return NULL;
+    negative = (int)(byte & 0x01);
+    value = (byte & 0x7F) >> 1;
+
+    while (byte & 0x80) {
+        if (read_uint(self, 1, &byte) < 0)
+            return NULL;
+        if (bits > 56)
+            goto overflow;
+        value |= (byte & 0x7F) << bits;
+        bits += 7;
+    }
+
+    if (value <= (uint64_t)INT64_MAX)
+        return PyLong_FromLongLong(negative ? -(long long)value : (long long)value);
+    result = PyLong_FromUnsignedLongLong(value);
+    goto finish;
+
+overflow:
+    /* Keep going with python integers if it doesn't fit in 64 bits */
+    result = PyLong_FromUnsignedLongLong(value);
+    while (result != NULL) {
+        part = PyLong_FromUnsignedLongLong(byte & 0x7F);
+        tmp = PyLong_FromLong(bits);
+        if (part == NULL || tmp == NULL) {
+            Py_XDECREF(part);
+            Py_XDECREF(tmp);
+            Py_CLEAR(result);
+            break;
+        }
+        Py_SETREF(part, PyNumber_Lshift(part, tmp));
+        Py_DECREF(tmp);
+        if (part == NULL) {
+            Py_CLEAR(result);
+            break;
+        }
+        Py_SETREF(result, PyNumber_Or(result, part));
+        Py_DECREF(part);
+        bits += 7;
+        if (result == NULL || !(byte & 0x80))
+            break;
+        if (read_uint(self, 1, &byte) < 0)
+            Py_CLEAR(result);
+    }
+
+finish:
+    if (result != NULL && negative)
+        Py_SETREF(result, PyNumber_Negative(result));
+    return result;
+}
+
+static int
+read_count(Decoder *self, Py_ssize_t *out)
+{
+    PyObject *value = read_vint(self);
+    if (value == NULL)
+        return -1;
+    *out = PyNumber_AsSsize_t(value, PyExc_OverflowError);
+    Py_DECREF(value);
+    return (*out == -1 && PyErr_Occurred()) ? -1 : 0;
+}
+
+static PyObject *
+read_struct(Decoder *self, long datatype)
+{
+    PyObject *data = NULL, *key, *value;
+    Py_ssize_t i, count;
+    uint64_t byte;
+
+    self->nextbits = 0;
+    if (datatype < 0) {
+        if (read_uint(self, 1, &byte) < 0)
+            return NULL;
+        datatype = (long)byte;
+    }
+
+    if (Py_EnterRecursiveCall(" while reading a struct"))
+        return NULL;
+
+    switch (datatype) {
+    case 0x00:  /* array */
+        if (read_count(self, &count) < 0)
+            break;
+        if ((data = PyList_New(0)) == NULL)
+            break;
+        for (i = 0; i < count; i++) {
+            if ((value = read_struct(self, -1)) == NULL || PyList_Append(data, value) < 0) {
+                Py_XDECREF(value);
+                Py_CLEAR(data);
+                break;
+            }
+            Py_DECREF(value);
+        }
+        break;
+
+    case 0x01:  /* bitarray */
+        if (read_count(self, &count) == 0)
+            data = read_bits(self, count);
+        break;
+
+    case 0x02:  /* blob */
+        if (read_count(self, &count) == 0)
+            data = read_bytes(self, count);
+        break;
+
+    case 0x03:  /* choice */
+        if ((value = read_vint(self)) != NULL) {
+            Py_DECREF(value);
+            data = read_struct(self, -1);
+        }
+        break;
+
+    case 0x04:  /* optional */
+        if (read_uint(self, 1, &byte) < 0)
+            break;
+        if (byte != 0)
+            data = read_struct(self, -1);
+        else {
+            Py_INCREF(Py_None);
+            data = Py_None;
+        }
+        break;
+
+    case 0x05:  /* struct */
+        if ((data = PyObject_CallObject(OrderedDict, NULL)) == NULL)
+            break;
+        if (read_count(self, &count) < 0) {
+            Py_CLEAR(data);
+            break;
+        }
+        for (i = 0; i < count; i++) {
+            /* The key must be read first */
+            if ((key = read_vint(self)) == NULL) {
+                Py_CLEAR(data);
+                break;
+            }
+            if ((value = read_struct(self, -1)) == NULL || PyObject_SetItem(data, key, value) < 0) {
+                Py_DECREF(key);
+                Py_XDECREF(value);
+                Py_CLEAR(data);
+                break;
+            }
+            Py_DECREF(key);
+            Py_DECREF(value);
+        }
+        break;
+
+    case 0x06:  /* u8 */
+        if (read_uint(self, 1, &byte) == 0)
+            data = PyLong_FromUnsignedLongLong(byte);
+        break;
+
+    case 0x07:  /* u32, kept as raw bytes */
+        data = read_bytes(self, 4);
+        break;
+
+    case 0x08:  /* u64 */
+        if (read_uint(self, 8, &byte) == 0)
+            data = PyLong_FromUnsignedLongLong(byte);
+        break;
+
+    case 0x09:  /* vint */
+        data = read_vint(self);
+        break;
+
+    default:
+        PyErr_Format(PyExc_TypeError, "Unknown Data Structure: '%ld'", datatype);
+    }
+
+    Py_LeaveRecursiveCall();
+    return data;
+}
+
+static int
+skip_bits(Decoder *self, Py_ssize_t count)
+{
+    Py_ssize_t whole;
+    int bits;
+
+    if (count < 0) {
+        uint64_t value;
+        return read_negative_bits(self, count, &value);
+    }
+
+    /* Same bookkeeping as read_bits64 without collecting the bits */
+    if (count <= self->nextbits) {
+        self->next >>= count;
+        self->nextbits -= (int)count;
+        return 0;
+    }
+
+    count -= self->nextbits;
+    whole = count >> 3;
+    bits = (int)(count & 7);
+    if (require(self, whole + (bits ? 1 : 0)) < 0)
+        return -1;
+
+    if (bits) {
+        self->next = self->data[self->pos + whole] >> bits;
+        self->nextbits = 8 - bits;
+        self->pos += whole + 1;
+    }
+    else {
+        self->nextbits = 0;
+        self->pos += whole;
+    }
+    return 0;
+}
+
+static int
+skip_struct(Decoder *self, long datatype)
+{
+    Py_ssize_t i, count;
+    uint64_t byte;
+    PyObject *value;
+    int result = -1;
+
+    self->nextbits = 0;
+    if (datatype < 0) {
+        if (read_uint(self, 1, &byte) < 0)
+            return -1;
+        datatype = (long)byte;
+    }
+
+    if (Py_EnterRecursiveCall(" while skipping a struct"))
+        return -1;
+
+    switch (datatype) {
+    case 0x00:  /* array */
+        if (read_count(self, &count) < 0)
+            break;
+        for (i = 0; i < count; i++)
+            if (skip_struct(self, -1) < 0)
+                break;
+        result = (i == count) ? 0 : -1;
+        break;
+
+    case 0x01:  /* bitarray */
+        if (read_count(self, &count) == 0)
+            result = skip_bits(self, count);
+        break;
+
+    case 0x02:  /* blob */
+        if (read_count(self, &count) == 0)
+            result = (count > PY_SSIZE_T_MAX / 8) ? require(self, count) : skip_bits(self, count * 8);
+        break;
+
+    case 0x03:  /* choice */
+        if ((value = read_vint(self)) != NULL) {
+            Py_DECREF(value);
+            result = skip_struct(self, -1);
+        }
+        break;
+
+    case 0x04:  /* optional */
+        if (read_uint(self, 1, &byte) == 0)
+            result = byte != 0 ? skip_struct(self, -1) : 0;
+        break;
+
+    case 0x05:  /* struct */
+        if (read_count(self, &count) < 0)
+            break;
+        for (i = 0; i < count; i++) {
+            if ((value = read_vint(self)) == NULL)
+                break;
+            Py_DECREF(value);
+            if (skip_struct(self, -1) < 0)
+                break;
+        }
+        result = (i == count) ? 0 : -1;
+        break;
+
+    case 0x06:  /* u8 */
+        result = skip_bits(self, 8);
+        break;
+
+    case 0x07:  /* u32 */
+        result = skip_bits(self, 32);
+        break;
+
+    case 0x08:  /* u64 */
+        result = skip_bits(self, 64);
+        break;
+
+    case 0x09:  /* vint */
+        if ((value = read_vint(self)) != NULL) {
+            Py_DECREF(value);
+            result = 0;
+        }
+        break;
+
+    default:
+        PyErr_Format(PyExc_TypeError, "Unknown Data Structure: '%ld'", datatype);
+    }
+
+    Py_LeaveRecursiveCall();
+    return result;
+}
+
+
+/* The python level interface */
+
+static int
+Decoder_init(Decoder *self, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"contents", NULL};
+    PyObject *contents;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O:BitPackedDecoder", kwlist, &contents))
+        return -1;
+
+    if (PyObject_HasAttrString(contents, "read"))
+        contents = PyObject_CallMethod(contents, "read", NULL);
+    else if (PyBytes_Check(contents))
+        Py_INCREF(contents);
+    else
+        contents = PyBytes_FromObject(contents);
+    if (contents == NULL)
+        return -1;
+    if (!PyBytes_Check(contents)) {
+        Py_SETREF(contents, PyBytes_FromObject(contents));
+        if (contents == NULL)
+            return -1;
+    }
+
+    Py_XSETREF(self->contents, contents);
+    self->data = (const unsigned char *)PyBytes_AS_STRING(contents);
+    self->length = PyBytes_GET_SIZE(contents);
+    self->pos = 0;
+    self->next = 0;
+    self->nextbits = 0;
+    return 0;
+}
+
+static void
+Decoder_dealloc(Decoder *self)
+{
+    Py_XDECREF(self->contents);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static Py_ssize_t
+as_count(PyObject *arg)
+{
+    return PyNumber_AsSsize_t(arg, PyExc_OverflowError);
+}
+
+#define CHECK_COUNT(count) if ((count) == -1 && PyErr_Occurred()) return NULL
+
+static PyObject *
+Decoder_tell(Decoder *self, PyObject *unused)
+{
+    return PyLong_FromSsize_t(self->pos);
+}
+
+static PyObject *
+Decoder_peek(Decoder *self, PyObject *arg)
+{
+    Py_ssize_t count = as_count(arg);
+    CHECK_COUNT(count);
+    return PySequence_GetSlice(self->contents, self->pos, self->pos + count);
+}
+
+static PyObject *
+Decoder_read_range(Decoder *self, PyObject *args)
+{
+    Py_ssize_t start, end;
+    if (!PyArg_ParseTuple(args, "nn:read_range", &start, &end))
+        return NULL;
+    return PySequence_GetSlice(self->contents, start, end);
+}
+
+static PyObject *
+Decoder_done(Decoder *self, PyObject *unused)
+{
+    return PyBool_FromLong(self->pos == self->length && self->nextbits == 0);
+}
+
+static PyObject *
+Decoder_byte_align(Decoder *self, PyObject *unused)
+{
+    self->nextbits = 0;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+Decoder_read_bool(Decoder *self, PyObject *unused)
+{
+    uint64_t value;
+    if (read_bits64(self, 1, &value) < 0)
+        return NULL;
+    return PyLong_FromLong((long)value);
+}
+
+#define DEFINE_READ_UINT(name, count) \
+    static PyObject * \
+    Decoder_##name(Decoder *self, PyObject *unused) \
+    { \
+        uint64_t value; \
+        if (read_uint(self, count, &value) < 0) \
+            return NULL; \
+        return PyLong_FromUnsignedLongLong(value); \
+    }
+
+DEFINE_READ_UINT(read_uint8, 1)
+DEFINE_READ_UINT(read_uint16, 2)
+DEFINE_READ_UINT(read_uint32, 4)
+DEFINE_READ_UINT(read_uint64, 8)
+
+static PyObject *
+Decoder_read_vint(Decoder *self, PyObject *unused)
+{
+    return read_vint(self);
+}
+
+static PyObject *
+Decoder_read_aligned_bytes(Decoder *self, PyObject *arg)
+{
+    Py_ssize_t count = as_count(arg);
+    CHECK_COUNT(count);
+    return read_aligned_bytes(self, count);
+}
+
+static PyObject *
+Decoder_read_aligned_string(Decoder *self, PyObject *args)
+{
+    Py_ssize_t count;
+    const char *encoding = "utf8";
+    PyObject *data, *result;
+
+    if (!PyArg_ParseTuple(args, "n|s:read_aligned_string", &count, &encoding))
+        return NULL;
+    if ((data = read_aligned_bytes(self, count)) == NULL)
+        return NULL;
+    result = PyUnicode_Decode(PyBytes_AS_STRING(data), PyBytes_GET_SIZE(data), encoding, NULL);
+    Py_DECREF(data);
+    return result;
+}
+
+static PyObject *
+Decoder_read_bytes(Decoder *self, PyObject *arg)
+{
+    Py_ssize_t count = as_count(arg);
+    CHECK_COUNT(count);
+    return read_bytes(self, count);
+}
+
+static PyObject *
+Decoder_read_bits(Decoder *self, PyObject *arg)
+{
+    Py_ssize_t count = as_count(arg);
+    CHECK_COUNT(count);
+    return read_bits(self, count);
+}
+
+static PyObject *
+Decoder_read_frames(Decoder *self, PyObject *unused)
+{
+    uint64_t byte, time, extra;
+
+    if (read_uint(self, 1, &byte) < 0)
+        return NULL;
+    time = byte >> 2;
+
+    switch (byte & 0x03) {
+    case 1:
+        if (read_uint(self, 1, &extra) < 0)
+            return NULL;
+        time = time << 8 | extra;
+        break;
+    case 2:
+        if (read_uint(self, 2, &extra) < 0)
+            return NULL;
+        time = time << 16 | extra;
+        break;
+    case 3:
+        if (read_uint(self, 2, &extra) < 0)
+            return NULL;
+        time = time << 16 | extra;
+        if (read_uint(self, 1, &extra) < 0)
+            return NULL;
+        time = time << 8 | extra;
+        break;
+    }
+    return PyLong_FromUnsignedLongLong(time);
+}
+
+static PyObject *
+Decoder_read_struct(Decoder *self, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"datatype", NULL};
+    PyObject *datatype = Py_None;
+    long type = -1;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|O:read_struct", kwlist, &datatype))
+        return NULL;
+    if (datatype != Py_None) {
+        type = PyLong_AsLong(datatype);
+        if (type == -1 && PyErr_Occurred())
+            return NULL;
+        if (type < 0)
+            return PyErr_Format(PyExc_TypeError, "Unknown Data Structure: '%ld'", type);
+    }
+    return read_struct(self, type);
+}
+
+static PyObject *
+Decoder_skip_struct(Decoder *self, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"datatype", NULL};
+    PyObject *datatype = Py_None;
+    long type = -1;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|O:skip_struct", kwlist, &datatype))
+        return NULL;
+    if (datatype != Py_None) {
+        type = PyLong_AsLong(datatype);
+        if (type == -1 && PyErr_Occurred())
+            return NULL;
+        if (type < 0)
+            return PyErr_Format(PyExc_TypeError, "Unknown Data Structure: '%ld'", type);
+    }
+    if (skip_struct(self, type) < 0)
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+Decoder_skip_bits(Decoder *self, PyObject *arg)
+{
+    Py_ssize_t count = as_count(arg);
+    CHECK_COUNT(count);
+    if (skip_bits(self, count) < 0)
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+Decoder_read_selection_bitmask(Decoder *self, PyObject *arg)
+{
+    unsigned char stack[STACK_BUFFER_SIZE], *buf = stack;
+    Py_ssize_t length, size, whole, i, j, bit;
+    PyObject *result = NULL;
+    int extra;
+
+    length = as_count(arg);
+    CHECK_COUNT(length);
+    if (length < 0) {
+        PyErr_SetString(PyExc_ValueError, "Cannot read a negative number of bits");
+        return NULL;
+    }
+
+    size = (length + 7) / 8;
+    if (size > STACK_BUFFER_SIZE && (buf = PyMem_Malloc(size)) == NULL)
+        return PyErr_NoMemory();
+    if (read_bits_into(self, length, buf, size) < 0)
+        goto done;
+
+    /* The odd low bits of the value become the top byte of the mask and the
+     * whole bytes above them are stored in reverse order. */
+    extra = (int)(length & 7);
+    whole = length >> 3;
+    if (length > MAX_SELECTION_BITS)
+        length = MAX_SELECTION_BITS;
+    if ((result = PyList_New(length)) == NULL)
+        goto done;
+    for (i = 0; i < length; i++) {
+        j = i >> 3;
+        bit = (j < whole) ? 8 * (whole - 1 - j) + (i & 7) + extra : (i & 7);
+        PyList_SET_ITEM(result, i, PyBool_FromLong((buf[size - 1 - (bit >> 3)] >> (bit & 7)) & 1));
+    }
+
+done:
+    if (buf != stack)
+        PyMem_Free(buf);
+    return result;
+}
+
+static PyObject *
+Decoder_get_bit_shift(Decoder *self, void *closure)
+{
+    return PyLong_FromLong((8 - self->nextbits) & 7);
+}
+
+static PyMethodDef Decoder_methods[] = {
+    {"tell", (PyCFunction)Decoder_tell, METH_NOARGS, "Returns the offset of the next unread byte"},
+    {"peek", (PyCFunction)Decoder_peek, METH_O, "Returns the raw byte string for the next ``count`` bytes"},
+    {"read_range", (PyCFunction)Decoder_read_range, METH_VARARGS, "Returns the raw byte string from the indicated address range"},
+    {"done", (PyCFunction)Decoder_done, METH_NOARGS, "Returns true when all bits in the buffer have been used"},
+    {"byte_align", (PyCFunction)Decoder_byte_align, METH_NOARGS, "Moves cursor to the beginning of the next byte"},
+    {"read_bool", (PyCFunction)Decoder_read_bool, METH_NOARGS, "Returns the next bit as an integer"},
+    {"read_uint8", (PyCFunction)Decoder_read_uint8, METH_NOARGS, "Returns the next 8 bits as an unsigned integer"},
+    {"read_uint16", (PyCFunction)Decoder_read_uint16, METH_NOARGS, "Returns the next 16 bits as an unsigned integer"},
+    {"read_uint32", (PyCFunction)Decoder_read_uint32, METH_NOARGS, "Returns the next 32 bits as an unsigned integer"},
+    {"read_uint64", (PyCFunction)Decoder_read_uint64, METH_NOARGS, "Returns the next 64 bits as an unsigned integer"},
+    {"read_vint", (PyCFunction)Decoder_read_vint, METH_NOARGS, "Reads a signed integer of variable length"},
+    {"read_aligned_bytes", (PyCFunction)Decoder_read_aligned_bytes, METH_O, "Skips to the beginning of the next byte and returns the next ``count`` bytes as a byte string"},
+    {"read_aligned_string", (PyCFunction)Decoder_read_aligned_string, METH_VARARGS, "Skips to the beginning of the next byte and returns the next ``count`` bytes decoded with encoding (default utf8)"},
+    {"read_bytes", (PyCFunction)Decoder_read_bytes, METH_O, "Returns the next ``count*8`` bits as a byte string"},
+    {"read_bits", (PyCFunction)Decoder_read_bits, METH_O, "Returns the next ``count`` bits as an unsigned integer"},
+    {"read_frames", (PyCFunction)Decoder_read_frames, METH_NOARGS, "Reads a frame count as an unsigned integer"},
+    {"read_struct", (PyCFunction)(void (*)(void))Decoder_read_struct, METH_VARARGS | METH_KEYWORDS, "Reads a nested data structure. If the type is not specified the first byte is used as the type identifier."},
+    {"read_selection_bitmask", (PyCFunction)Decoder_read_selection_bitmask, METH_O, "Reads a ``mask_length`` bit selection mask as a list of booleans, True => Deselect"},
+    {"skip_struct", (PyCFunction)(void (*)(void))Decoder_skip_struct, METH_VARARGS | METH_KEYWORDS, "Moves past a nested data structure without building it."},
+    {"skip_bits", (PyCFunction)Decoder_skip_bits, METH_O, "Moves past the next ``count`` bits without returning them"},
+    {NULL}
+};
+
+static PyMemberDef Decoder_members[] = {
+    {"length", T_PYSSIZET, offsetof(Decoder, length), READONLY, "The number of bytes being decoded"},
+    {"_contents", T_OBJECT, offsetof(Decoder, contents), READONLY, "The byte string being decoded"},
+    {NULL}
+};
+
+static PyGetSetDef Decoder_getset[] = {
+    {"_bit_shift", (getter)Decoder_get_bit_shift, NULL, "The number of bits already used from the current byte", NULL},
+    {NULL}
+};
+
+static PyTypeObject DecoderType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "sc2reader._decoders.BitPackedDecoder",     /* tp_name */
+    sizeof(Decoder),                            /* tp_basicsize */
+    0,                                          /* tp_itemsize */
+    (destructor)Decoder_dealloc,                /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,                                          /* tp_repr */
+    0,                                          /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,                                          /* tp_as_mapping */
+    0,                                          /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    0,                                          /* tp_getattro */
+    0,                                          /* tp_setattro */
+    0,                                          /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,   /* tp_flags */
+    "Compiled version of sc2reader.decoders.BitPackedDecoder", /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,                                          /* tp_richcompare */
+    0,                                          /* tp_weaklistoffset */
+    0,                                          /* tp_iter */
+    0,                                          /* tp_iternext */
+    Decoder_methods,                            /* tp_methods */
+    Decoder_members,                            /* tp_members */
+    Decoder_getset,                             /* tp_getset */
+    0,                                          /* tp_base */
+    0,                                          /* tp_dict */
+    0,                                          /* tp_descr_get */
+    0,                                          /* tp_descr_set */
+    0,                                          /* tp_dictoffset */
+    (initproc)Decoder_init,                     /* tp_init */
+    0,                                          /* tp_alloc */
+    PyType_GenericNew,                          /* tp_new */
+};
+
+static int
+init_module(PyObject *module)
+{
+    PyObject *collections;
+
+    if (PyType_Ready(&DecoderType) < 0)
+        return -1;
+
+    if ((collections = PyImport_ImportModule("collections")) == NULL)
+        return -1;
+    OrderedDict = PyObject_GetAttrString(collections, "OrderedDict");
+    Py_DECREF(collections);
+    if (OrderedDict == NULL)
+        return -1;
+
+    Py_INCREF(&DecoderType);
+    return PyModule_AddObject(module, "BitPackedDecoder", (PyObject *)&DecoderType);
+}
+
+#define MODULE_DOC "Compiled bit packed decoders for sc2reader.decoders"
+
+#ifdef IS_PY3K
+static struct PyModuleDef decoders_module = {
+    PyModuleDef_HEAD_INIT, "_decoders", MODULE_DOC, -1, NULL
+};
+
+PyMODINIT_FUNC
+PyInit__decoders(void)
+{
+    PyObject *module = PyModule_Create(&decoders_module);
+    if (module != NULL && init_module(module) < 0)
+        Py_CLEAR(module);
+    return module;
+}
+#else
+PyMODINIT_FUNC
+init_decoders(void)
+{
+    PyObject *module = Py_InitModule3("_decoders", NULL, MODULE_DOC);
+    if (module != NULL)
+        init_module(module);
+}
+#endif
@@ -2,13 +2,27 @@
 from __future__ import absolute_import, print_function, unicode_literals, division
 
 import json
+import os
+import pickle
 import pkgutil
+import sys
+import threading
+
+try:
+    import copyreg
+except ImportError:
+    import copy_reg as copyreg
 
 try:
     from collections import OrderedDict
 except ImportError as e:
     from ordereddict import OrderedDict
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 from sc2reader.log_utils import loggable
 
 ABIL_LOOKUP = dict()
@@ -35,7 +49,13 @@ train_commands = json.loads(command_data)
 class Unit(object):
     """
     Represents an in-game unit.
+
+    Long games have tens of thousands of units, so units keep their common
+    attributes in slots and share a :class:`UnitType` with the other units of
+    their type. Other attributes can still be set on a unit.
     """
+    __slots__ = ('owner', 'started_at', 'finished_at', 'died_at', 'killed_by', 'id', 'flags', 'location',
+                 '_type_class', '_type_history', '__dict__')
 
     def __init__(self, unit_id, flags):
         #: A reference to the player that currently owns this unit. Only available for 2.0.8+ replays.
@@ -67,20 +87,31 @@ class Unit(object):
 
         self.flags = flags
 
-        #: A reference to the unit type this unit is current in.
+        #: A reference to the :class:`UnitType` this unit is current in.
         #: e.g. SeigeTank is a different type than SeigeTankSeiged
         self._type_class = None
 
-        #: A history of all the unit types this unit has had stored
-        #: in order by frame the type was acquired.
-        self.type_history = OrderedDict()
+        # The frames and unit types of the type history, flattened into
+        # (frame, type, frame, type, ...). Most units only ever have one type.
+        self._type_history = ()
 
-        #: Is this unit type a hallucinated one? Unsure of this flag..
-        self.hallucinated = (flags & 2 == 2)
+    @property
+    def type_history(self):
+        """ A history of all the unit types this unit has had stored
+        in order by frame the type was acquired. """
+        return OrderedDict(zip(self._type_history[::2], self._type_history[1::2]))
+
+    @property
+    def hallucinated(self):
+        """ Is this unit type a hallucinated one? Unsure of this flag.. """
+        return self.flags & 2 == 2
 
     def set_type(self, unit_type, frame):
         self._type_class = unit_type
-        self.type_history[frame] = unit_type
+        if self._type_history and self._type_history[-2] == frame:
+            self._type_history = self._type_history[:-1] + (unit_type,)
+        else:
+            self._type_history += (frame, unit_type)
 
     def is_type(self, unit_type, strict=True):
         if strict:
@@ -89,7 +120,7 @@ class Unit(object):
                     return unit_type == self._type_class.id
                 else:
                     return unit_type == 0
-            elif isinstance(unit_type, Unit):
+            elif isinstance(unit_type, UnitType):
                 return self._type_class == unit_type
             else:
                 if self._type_class:
@@ -99,14 +130,14 @@ class Unit(object):
         else:
             if isinstance(unit_type, int):
                 if self._type_class:
-                    return unit_type in [utype.id for utype in self.type_history.values()]
+                    return unit_type in [utype.id for utype in self._type_history[1::2]]
                 else:
                     return unit_type == 0
-            elif isinstance(unit_type, Unit):
-                return unit_type in self.type_history.values()
+            elif isinstance(unit_type, UnitType):
+                return unit_type in self._type_history[1::2]
             else:
                 if self._type_class:
-                    return unit_type in [utype.str_id for utype in self.type_history.values()]
+                    return unit_type in [utype.str_id for utype in self._type_history[1::2]]
                 else:
                     return unit_type is None
 
@@ -190,6 +221,84 @@ class Unit(object):
         return str(self)
 
 
+class UnitType(object):
+    """
+    A unit type from a :class:`Build`, like Marine or SiegeTankSieged. Holds
+    the information that every unit of the type shares. Pickles hold a
+    reference to the datapack entry rather than the type.
+    """
+    __slots__ = ('datapack', 'id', 'str_id', 'name', 'title', 'race', 'minerals', 'vespene', 'supply',
+                 'is_building', 'is_worker', 'is_army')
+
+    def __init__(self, datapack, id, str_id, name, title, race, minerals, vespene, supply, is_building, is_worker, is_army):
+        #: The :class:`Build` this type belongs to
+        self.datapack = datapack
+
+        #: The internal integer id of this unit type
+        self.id = id
+
+        #: The internal string id of this unit type
+        self.str_id = str_id
+
+        #: The name of this unit type
+        self.name = name
+
+        #: The title of this unit type
+        self.title = title
+
+        #: The race of this unit type. One of Terran, Protoss, Zerg or Neutral
+        self.race = race
+
+        #: The mineral cost of this unit type
+        self.minerals = minerals
+
+        #: The vespene cost of this unit type
+        self.vespene = vespene
+
+        #: The supply used by this unit type. Negative for supply providers.
+        self.supply = supply
+
+        #: Boolean flagging buildings
+        self.is_building = is_building
+
+        #: Boolean flagging worker units. SCV, MULE, Drone, Probe
+        self.is_worker = is_worker
+
+        #: Boolean flagging army units
+        self.is_army = is_army
+
+    def __reduce__(self):
+        if self.datapack.expansion is None:
+            raise pickle.PicklingError("Can't pickle {0} from a datapack that isn't built in".format(self.name))
+        return _load_data_type, (self.datapack.expansion, self.datapack.id, 'units', self.id)
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "UnitType({0!r}, {1})".format(self.name, self.id)
+
+
+class DataType(type):
+    """
+    The type of the ability classes that a :class:`Build` creates.
+    Pickles hold a reference to the datapack entry rather than the class.
+    """
+
+
+def _load_data_type(expansion, build_id, kind, type_id):
+    return getattr(builds[expansion][build_id], kind)[type_id]
+
+
+def _reduce_data_type(cls):
+    datapack = cls.datapack
+    if datapack.expansion is None:
+        raise pickle.PicklingError("Can't pickle {0} from a datapack that isn't built in".format(cls.__name__))
+    return _load_data_type, (datapack.expansion, datapack.id, 'abilities', cls.id)
+
+copyreg.pickle(DataType, _reduce_data_type)
+
+
 class Ability(object):
 
     #: The internal integer id representing this ability.
@@ -204,7 +313,7 @@ class Ability(object):
     #: The number of seconds required to build this unit. 0 if not ``is_build``.
     build_time = 0
 
-    #: A reference to the :class:`Unit` type built by this ability. None if not ``is_build``.
+    #: A reference to the :class:`UnitType` built by this ability. None if not ``is_build``.
     build_unit = None
 
 
@@ -220,16 +329,25 @@ class Build(object):
     All build data is valid for standard games only. For arcade maps milage
     may vary.
     """
-    def __init__(self, build_id):
+    def __init__(self, build_id, expansion=None):
         #: The integer id of the build
         self.id = build_id
 
+        #: The expansion the build belongs to when it is one of the built in
+        #: datapacks in :data:`builds`. Only built in datapacks can be pickled.
+        self.expansion = expansion
+
         #: A dictionary mapping integer ids to available unit types.
         self.units = dict()
 
         #: A dictionary mapping integer ids to available abilities.
         self.abilities = dict()
 
+    def __reduce__(self):
+        if self.expansion is None:
+            return super(Build, self).__reduce__()
+        return _load_build, (self.expansion, self.id)
+
     def create_unit(self, unit_id, unit_type, unit_flags, frame):
         """
         :param unit_id: The unique id of this unit.
@@ -255,7 +373,8 @@ class Build(object):
             self.logger.error("Unable to change type of {0} to {1} [frame {2}]; unit type not found in build {3}".format(unit, new_type, frame, self.id))
 
     def add_ability(self, ability_id, name, title=None, is_build=False, build_time=None, build_unit=None):
-        ability = type(str(name), (Ability,), dict(
+        ability = DataType(str(name), (Ability,), dict(
+            datapack=self,
             id=ability_id,
             name=name,
             title=title or name,
@@ -267,7 +386,8 @@ class Build(object):
         self.abilities[ability_id] = ability
 
     def add_unit_type(self, type_id, str_id, name, title=None, race='Neutral', minerals=0, vespene=0, supply=0, is_building=False, is_worker=False, is_army=False):
-        unit = type(str(name), (Unit,), dict(
+        unit = UnitType(
+            datapack=self,
             id=type_id,
             str_id=str_id,
             name=name,
@@ -279,15 +399,23 @@ class Build(object):
             is_building=is_building,
             is_worker=is_worker,
             is_army=is_army,
-        ))
+        )
         setattr(self, name, unit)
         self.units[type_id] = unit
         self.units[str_id] = unit
 
 
-def load_build(expansion, version):
-    build = Build(version)
+def _load_build(expansion, build_id):
+    return builds[expansion][build_id]
 
+
+def build_rows(expansion, version):
+    """ Reads the unit types and abilities of a built in datapack from the data
+    files. Returns them as lists of keyword arguments for
+    :meth:`Build.add_unit_type` and :meth:`Build.add_ability`, where abilities
+    name their ``build_unit`` instead of referring to it.
+    """
+    units = list()
     unit_file = '{0}/{1}_units.csv'.format(expansion, version)
     for entry in pkgutil.get_data('sc2reader.data', unit_file).decode('utf8').split('\n'):
         if not entry:
@@ -303,10 +431,10 @@ def load_build(expansion, version):
                 values['race'] = race
                 break
 
-        build.add_unit_type(**values)
+        units.append(values)
 
+    abilities = [dict(ability_id=0, name='RightClick', title='Right Click', build_unit='')]
     abil_file = '{0}/{1}_abilities.csv'.format(expansion, version)
-    build.add_ability(ability_id=0, name='RightClick', title='Right Click')
     for entry in pkgutil.get_data('sc2reader.data', abil_file).decode('utf8').split('\n'):
         if not entry:
             continue
@@ -324,24 +452,135 @@ def load_build(expansion, version):
             if 'Hallucinated' in unit_name:  # Not really sure how to handle hallucinations
                 unit_name = unit_name[12:]
 
-            build.add_ability(
+            abilities.append(dict(
                 ability_id=int_id_base | index,
                 name=ability_name,
                 is_build=bool(unit_name),
-                build_unit=getattr(build, unit_name, None),
+                build_unit=unit_name,
                 build_time=build_time
-            )
+            ))
+
+    return units, abilities
+
+
+def load_build(expansion, version):
+    units, abilities = _snapshot_rows().get((expansion, version)) or build_rows(expansion, version)
+
+    build = Build(version, expansion)
+    for values in units:
+        build.add_unit_type(**values)
+
+    for values in abilities:
+        values = dict(values)
+        values['build_unit'] = getattr(build, values['build_unit'], None)
+        build.add_ability(**values)
 
     return build
 
-# Load the WoL Data
-wol_builds = dict()
-for version in ('16117', '17326', '18092', '19458', '22612', '24944'):
-    wol_builds[version] = load_build('WoL', version)
 
-# Load HotS Data
-hots_builds = dict()
-for version in ('base', '23925', '24247', '24764'):
-    hots_builds[version] = load_build('HotS', version)
+#: The default location of the datapack snapshot, see :func:`write_snapshot`
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datapacks.pickle')
+
+
+def _snapshot_stamp():
+    # A snapshot is only used with the data files it was made from
+    data_dir = os.path.dirname(SNAPSHOT_PATH)
+    stamp = [sys.version_info[0]]
+    for directory in ('', 'WoL', 'HotS'):
+        try:
+            names = sorted(os.listdir(os.path.join(data_dir, directory)))
+        except OSError:
+            continue  # Zipped installs don't have the files on disk
+        for name in names:
+            if name.endswith(('.csv', '.json')):
+                info = os.stat(os.path.join(data_dir, directory, name))
+                stamp.append((directory, name, info.st_size, int(info.st_mtime)))
+    return stamp
+
+
+def write_snapshot(path=SNAPSHOT_PATH):
+    """ Parses the data files of every built in datapack and saves them to
+    path, so that :func:`load_build` can skip reading the data files.
+
+    The snapshot isn't built or shipped by setup.py, it has to be written by
+    hand with ``python -m sc2reader.data`` after installing, by the python
+    that will read it. It is ignored by other python versions and once the
+    data files change. Without it the data files are read on first use.
+    """
+    rows = dict()
+    for expansion, versions in BUILD_VERSIONS.items():
+        for version in versions:
+            rows[(expansion, version)] = build_rows(expansion, version)
+
+    with open(path, 'wb') as snapshot_file:
+        pickle.dump((_snapshot_stamp(), rows), snapshot_file, pickle.HIGHEST_PROTOCOL)
+
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """ Returns the datapack rows saved to path by :func:`write_snapshot`
+    keyed by (expansion, version). None if there is no usable snapshot.
+    """
+    try:
+        with open(path, 'rb') as snapshot_file:
+            stamp, rows = pickle.load(snapshot_file)
+    except (IOError, OSError):
+        return None
+    except Exception:
+        return None  # Written by another python version, or corrupt
+
+    return rows if stamp == _snapshot_stamp() else None
+
+
+def _snapshot_rows():
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = read_snapshot() or dict()
+    return _snapshot
+
+_snapshot = None
+_builds_lock = threading.Lock()
+
+
+class Builds(Mapping):
+    """
+    :param expansion: The expansion the datapacks belong to.
+    :param versions: The versions of the datapacks.
+
+    The built in datapacks of an expansion, by version. Each datapack is
+    built the first time it is used, so importing sc2reader doesn't pay for
+    the ones that are never used.
+    """
+    def __init__(self, expansion, versions):
+        self.expansion = expansion
+        self.versions = versions
+        self._builds = dict()
+
+    def __getitem__(self, version):
+        build = self._builds.get(version)
+        if build is None:
+            if version not in self.versions:
+                raise KeyError(version)
+
+            # Types must only be created once, pickles refer to them
+            with _builds_lock:
+                build = self._builds.get(version)
+                if build is None:
+                    build = self._builds[version] = load_build(self.expansion, version)
+        return build
+
+    def __iter__(self):
+        return iter(self.versions)
+
+    def __len__(self):
+        return len(self.versions)
+
+
+BUILD_VERSIONS = OrderedDict([
+    ('WoL', ('16117', '17326', '18092', '19458', '22612', '24944')),
+    ('HotS', ('base', '23925', '24247', '24764')),
+])
+
+wol_builds = Builds('WoL', BUILD_VERSIONS['WoL'])
+hots_builds = Builds('HotS', BUILD_VERSIONS['HotS'])
 
 builds = {'WoL': wol_builds, 'HotS': hots_builds}
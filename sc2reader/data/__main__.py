@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import sys
+
+from sc2reader.data import write_snapshot, SNAPSHOT_PATH
+
+# Writes the datapack snapshot, to the given path or next to the data files.
+# Installs don't include one, run this after installing to use it.
+path = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH
+write_snapshot(path)
+print("Wrote the datapack snapshot to {0}".format(path))
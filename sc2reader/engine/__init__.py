@@ -2,7 +2,7 @@
 from __future__ import absolute_import, print_function, unicode_literals, division
 
 import sys
-from sc2reader.engine.engine import GameEngine
+from sc2reader.engine.engine import GameEngine, BatchReport, EngineStats, HandlerStats
 from sc2reader.engine.events import PluginExit
 from sc2reader.engine.utils import GameState
 from sc2reader.engine import plugins
@@ -11,6 +11,7 @@ from sc2reader.engine import plugins
 def setGameEngine(engine):
     module = sys.modules[__name__]
     module.run = engine.run
+    module.run_many = engine.run_many
     module.register_plugin = engine.register_plugin
     module.register_plugins = engine.register_plugins
 
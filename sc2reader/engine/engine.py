@@ -2,9 +2,187 @@
 from __future__ import absolute_import, print_function, unicode_literals, division
 
 import collections
+import inspect
+import itertools
+import pickle
+import time
+import traceback
+
+from sc2reader import utils
 from sc2reader.events import *
 from sc2reader.engine.events import InitGameEvent, EndGameEvent, PluginExit
 
+# The most precise clock available for timing handlers
+timer = getattr(time, 'perf_counter', time.time)
+
+class HandlerStats(object):
+    """
+    The calls made to one handler of one plugin while profiling, see
+    :class:`EngineStats`.
+    """
+    def __init__(self, plugin, handler):
+        #: The name of the plugin
+        self.plugin = plugin
+
+        #: The name of the handler method, like handleUnitBornEvent
+        self.handler = handler
+
+        #: The number of times the handler was called
+        self.calls = 0
+
+        #: The total time spent in the handler in seconds
+        self.total_time = 0.0
+
+        #: The longest single call to the handler in seconds
+        self.max_time = 0.0
+
+        #: The number of events the handler yielded
+        self.yielded = 0
+
+    def add(self, elapsed, yielded):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.yielded += yielded
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        self.yielded += other.yielded
+
+    def __repr__(self):
+        return 'HandlerStats({0}.{1}, calls={2}, total_time={3:.6f})'.format(self.plugin, self.handler, self.calls, self.total_time)
+
+
+class EngineStats(dict):
+    """
+    The time the plugins of a profiling :class:`GameEngine` spent on a
+    replay, as a dict of :class:`HandlerStats` by (plugin name, handler name).
+    A handler's time includes running it to the end when it is a generator,
+    but not handling the events it yields, which are counted for their own
+    handlers.
+    """
+    def get_stats(self, plugin, handler):
+        key = (plugin, handler)
+        if key not in self:
+            self[key] = HandlerStats(plugin, handler)
+        return self[key]
+
+    def merge(self, other):
+        """ Adds the stats of another replay to these """
+        for (plugin, handler), stats in other.items():
+            self.get_stats(plugin, handler).merge(stats)
+
+    def dump(self):
+        """ Returns the stats as a list of dicts, most total time first """
+        stats = sorted(self.values(), key=lambda stats: stats.total_time, reverse=True)
+        return [dict(
+            plugin=stats.plugin,
+            handler=stats.handler,
+            calls=stats.calls,
+            total_time=stats.total_time,
+            max_time=stats.max_time,
+            yielded=stats.yielded,
+        ) for stats in stats]
+
+
+def _ignore_result(handler):
+    def plain_handler(event, replay):
+        handler(event, replay)
+    return plain_handler
+
+
+def _profiled(handler, plugin_name, handler_name, yields):
+    def profiled_handler(event, replay):
+        start = timer()
+        new_events = handler(event, replay)
+        if yields and new_events is not None:
+            # Generators only run when they are read
+            new_events = list(new_events)
+        else:
+            new_events = None
+        elapsed = timer() - start
+        replay.engine_stats.get_stats(plugin_name, handler_name).add(elapsed, len(new_events or []))
+        return new_events
+    return profiled_handler
+
+
+class BatchReport(object):
+    """
+    The outcome of running a batch of replays through a :class:`GameEngine`
+    with :meth:`GameEngine.run_many`. Replays that fail are reported here
+    instead of stopping the whole batch.
+    """
+    def __init__(self):
+        #: The replays in the order they were given, None for the ones that
+        #: failed. Replays run in worker processes are the copies that were
+        #: sent back.
+        self.replays = list()
+
+        #: The number of replays each exit code was given for, by plugin name
+        self.exit_codes = dict()
+
+        #: A (filename, error, traceback) tuple for each replay that failed
+        self.errors = list()
+
+        #: The :class:`EngineStats` of all the replays added up, when the
+        #: engine was profiling
+        self.engine_stats = EngineStats()
+
+    @property
+    def ok(self):
+        """ True when every replay was run and every plugin exited with 0 """
+        return not self.errors and all(list(codes.keys()) == [0] for codes in self.exit_codes.values())
+
+    def add(self, replay, filename, error=None, error_traceback=None):
+        if error is not None:
+            self.replays.append(None)
+            self.errors.append((filename, error, error_traceback))
+            return
+
+        self.replays.append(replay)
+        for name, (code, details) in replay.plugins.items():
+            codes = self.exit_codes.setdefault(name, dict())
+            codes[code] = codes.get(code, 0) + 1
+        self.engine_stats.merge(getattr(replay, 'engine_stats', dict()))
+
+    def __repr__(self):
+        return 'BatchReport({0} replays, {1} errors, exit_codes={2!r})'.format(len(self.replays), len(self.errors), self.exit_codes)
+
+
+def _run_replays(engine, replays, plugins):
+    # The engines made for each replay share the handlers they look up, so
+    # plugins made by the same factories don't look theirs up again
+    handler_names = dict()
+    for replay in replays:
+        try:
+            if plugins is not None:
+                # Fresh plugins for every replay, so no state is carried over
+                engine = GameEngine(plugins=[make_plugin() for make_plugin in plugins], profile=engine.profile)
+                engine._handler_names = handler_names
+            engine.run(replay)
+            yield replay, None, None
+        except Exception as e:
+            yield replay, e, traceback.format_exc()
+
+
+def _run_chunk(engine, replays, plugins):
+    # Runs in the worker processes. Replays and errors are pickled here, one
+    # by one, so that one that can't be sent back only fails its own replay.
+    results = list()
+    for replay, error, error_traceback in _run_replays(engine, replays, plugins):
+        filename = getattr(replay, 'filename', None)
+        if error is None:
+            try:
+                results.append((filename, pickle.dumps(replay, pickle.HIGHEST_PROTOCOL), None, None))
+                continue
+            except Exception as e:
+                error, error_traceback = e, traceback.format_exc()
+        results.append((filename, None, utils.portable_error(error), error_traceback))
+    return results
+
+
 class GameEngine(object):
     """ GameEngine Specification
         --------------------------
@@ -60,6 +238,38 @@ class GameEngine(object):
             * handleAbilityEvent - called for all types of ability events
             * handleHotkeyEvent - called for all player hotkey events
 
+        The handlers for each event class are looked up once, the first time
+        an event of the class comes up, and kept for the next replays the
+        engine runs. Registering a plugin starts the lookups over.
+
+        Replays loaded with ``lazy_events=True`` only read the kinds of events
+        (game, tracker or message) that at least one plugin has a handler for.
+        Plugins can still use ``replay.game_events`` and friends directly, the
+        events are read the first time they are needed.
+
+        Replays loaded with ``stream_events=True`` are run over
+        :meth:`Replay.iter_events <sc2reader.resources.Replay.iter_events>`
+        instead. Each event is handed to the plugins as soon as it is read
+        and the next one isn't read until the plugins and the events they
+        yield are done with it, so the replay's events are never all in memory
+        at once. ``handleInitGame`` and ``handleEndGame`` are called before and
+        after them as usual. Plugins that use ``replay.game_events`` or
+        ``replay.tracker_events`` directly still read them all. Any iterable
+        of events can also be passed to :meth:`run` directly.
+
+        Plugins can declare what they use and make with optional attributes:
+
+          * requires - replay attributes the plugin needs. Plugins are run after
+            the plugins that provide them and are skipped when one is missing
+            or empty and no plugin provides it.
+
+          * provides - replay attributes the plugin fills in.
+
+          * consumes - event classes or class names the plugin uses. The plugin's
+            handlers are only called for these events. Without it, plugins
+            consume the events they have handlers for. Plugins that consume
+            ``Event`` consume every event. See :meth:`event_types`.
+
         Plugins may also handle optional ``InitGame`` and ``EndGame`` events generated
         by the GameEngine before and after processing all the events:
 
@@ -82,6 +292,18 @@ class GameEngine(object):
                     yield ExpansionEvent(event.frame, event.unit)
                 ....
 
+        Only handlers that are generators can add events this way, the return
+        value of other handlers is ignored.
+
+        Engines made with ``profile=True`` time every handler call and record the
+        calls, total and longest time and number of yielded events of each plugin
+        handler in ``replay.engine_stats``, see :class:`EngineStats`::
+
+            engine = GameEngine(plugins=[ContextLoader(), MyPlugin()], profile=True)
+            engine.run(replay)
+            for stats in replay.engine_stats.dump():
+                print(stats['plugin'], stats['handler'], stats['calls'], stats['total_time'])
+
         If a plugin wishes to stop processing a replay it can yield a PluginExit event before returning::
 
             def handleEvent(self, event, replay):
@@ -103,98 +325,348 @@ class GameEngine(object):
 
             code, details = replay.plugins['MyPlugin']
     """
-    def __init__(self, plugins=[]):
+    #: The parent event classes plugins can handle, from most general to most specific
+    GENERIC_EVENT_CLASSES = (Event, MessageEvent, GameEvent, TrackerEvent, PlayerActionEvent, AbilityEvent, HotkeyEvent)
+
+    def __init__(self, plugins=[], profile=False):
         self._plugins = list()
+        self._profile = profile
+
+        # The handlers of each plugin for each event class, by plugin id
+        self._plugin_handlers = dict()
+
+        # A handler table for each set of active plugins, by their ids. The
+        # tables map event classes to (handlers, yields) entries that are
+        # kept from replay to replay.
+        self._handler_tables = dict()
+
+        # The names of the handlers and whether they are generators, by plugin
+        # class, consumes and event class. Only set for engines that share
+        # them, see run_many.
+        self._handler_names = None
+
         self.register_plugins(*plugins)
 
     def register_plugin(self, plugin):
-        self._plugins.append(plugin)
+        self._plugins = self._order_plugins(self._plugins + [plugin])
+        self._plugin_handlers[id(plugin)] = dict()
+        self._handler_tables.clear()
 
     def register_plugins(self, *plugins):
         for plugin in plugins:
             self.register_plugin(plugin)
 
-    def run(self, replay):
-        # A map of [event.name] => event handlers in plugin registration order
-        # ranked from most generic to most specific
-        handlers = dict()
-
-        # Create a local copy of the plugins list. As plugins exit we can
-        # remove them from this list and regenerate event handlers.
-        plugins = list(self._plugins)
-
+    @property
+    def profile(self):
+        """ When True every handler call is timed into ``replay.engine_stats``.
+        Handlers are only wrapped for timing while profiling. """
+        return self._profile
+
+    @profile.setter
+    def profile(self, profile):
+        # The handlers are looked up again, with or without the timing
+        self._profile = profile
+        self._plugin_handlers = dict((id(plugin), dict()) for plugin in self._plugins)
+        self._handler_tables.clear()
+
+    def event_types(self):
+        """ Returns the event classes the registered plugins consume, or None
+        when a plugin consumes every event. Pass them to the ``event_types``
+        option of load_replay to skip decoding events no plugin uses. """
+        event_types = set()
+        for plugin in self._plugins:
+            consumes = self._get_consumed_event_types(plugin)
+            if consumes is None:
+                return None
+            event_types.update(consumes)
+        return sorted(event_types, key=lambda event_type: getattr(event_type, '__name__', event_type))
+
+    def run(self, replay, events=None):
+        """ Runs the plugins over the replay's events, or over ``events`` when
+        given. ``events`` can be any iterable and is only read as the plugins
+        get to each event, so generators like :meth:`Replay.iter_events
+        <sc2reader.resources.Replay.iter_events>` are never held in memory all
+        at once.
+        """
         # Create a dict for storing plugin exit codes and details
         replay.plugins = dict()
+        if self._profile:
+            replay.engine_stats = EngineStats()
 
-        # Fill event event queue with the replay events, bookmarked by Init and End events.
-        event_queue = collections.deque()
-        event_queue.append(InitGameEvent())
-        event_queue.extend(replay.events)
-        event_queue.append(EndGameEvent())
-
-        # Work through the events in the queue, pushing newly emitted events to
-        # the front of the line for immediate processing.
-        while len(event_queue) > 0:
-            event = event_queue.popleft()
-
-            if event.name == 'PluginExit':
-                # Remove the plugin and reset the handlers.
-                plugins.remove(event.plugin)
-                handlers.clear()
-                replay.plugins[event.plugin.name] = (event.code, event.details)
-                continue
-
-            # If we haven't compiled a list of handlers for this event yet, do so!
-            if event.name not in handlers:
-                event_handlers = self._get_event_handlers(event, plugins)
-                handlers[event.name] = event_handlers
-            else:
-                event_handlers = handlers[event.name]
+        # Create a local copy of the plugins list. As plugins exit we can
+        # remove them from this list and switch to their handler table.
+        plugins = self._get_runnable_plugins(replay)
+        handlers = self._get_handler_table(plugins)
 
-            # Events have the option of yielding one or more additional events
-            # which get processed after the current event finishes.
-            new_events = list()
-            for event_handler in event_handlers:
-                new_events.extend(event_handler(event, replay) or [])
+        # The replay events are taken one at a time, bookmarked by Init and End events.
+        if events is None:
+            events = self._get_replay_events(replay, plugins)
+        source_events = itertools.chain([InitGameEvent()], events, [EndGameEvent()])
 
-            # extendleft does a series of appendlefts and reverses the order so we
-            # need to reverse the list first to have them added in order.
-            event_queue.extendleft(new_events)
+        # Work through the events in the queue, pushing newly emitted events to
+        # the front of the line for immediate processing. The next replay event
+        # is only taken once the queue runs out.
+        event_queue = collections.deque()
+        popleft = event_queue.popleft
+        for source_event in source_events:
+            event_queue.append(source_event)
+            while event_queue:
+                event = popleft()
+
+                entry = handlers.get(event.__class__)
+                if entry is None:
+                    if event.name == 'PluginExit':
+                        # Remove the plugin and switch to the handlers without it
+                        plugins.remove(event.plugin)
+                        handlers = self._get_handler_table(plugins, handlers, event.plugin)
+                        replay.plugins[event.plugin.name] = (event.code, event.details)
+                        continue
+
+                    # If we haven't compiled a list of handlers for this event yet, do so!
+                    entry = self._get_event_handlers(event, plugins)
+                    handlers[event.__class__] = entry
+
+                event_handlers, yields = entry
+                if not yields:
+                    for event_handler in event_handlers:
+                        event_handler(event, replay)
+                    continue
+
+                # Events have the option of yielding one or more additional events
+                # which get processed after the current event finishes.
+                new_events = list()
+                for event_handler in event_handlers:
+                    new_events.extend(event_handler(event, replay) or [])
+
+                # extendleft does a series of appendlefts and reverses the order so we
+                # need to reverse the list first to have them added in order.
+                event_queue.extendleft(new_events)
 
         # For any plugins that didn't yield a PluginExit event, record a successful
         # completion.
         for plugin in plugins:
             replay.plugins[plugin.name] = (0, dict())
 
+    def run_many(self, replays, workers=0, plugins=None, chunksize=1):
+        """ Runs a batch of replays through the engine and returns a
+        :class:`BatchReport` with the exit codes of the plugins.
+
+        :param workers: When set, the number of worker processes to run the
+            replays in. The engine and the replays are pickled and sent to the
+            workers, and the report holds the copies that are sent back.
+        :param plugins: Functions that make a new plugin, such as plugin
+            classes. When given, each replay is run with new plugins made from
+            them instead of with the registered plugins, so plugins don't
+            carry state from one replay to the next or share it between
+            workers. They have to be picklable to be used with workers.
+        :param chunksize: The number of replays sent to a worker at a time.
+
+        Plugins registered on the engine keep their handler tables for the
+        whole batch, and in each worker for each chunk it is sent. New plugins
+        made from the same functions reuse the handlers looked up for the
+        first ones, so they should handle the same events.
+        """
+        report = BatchReport()
+        if workers:
+            for filename, replay, error, error_traceback in self._run_many_parallel(replays, workers, plugins, chunksize):
+                report.add(replay, filename, error, error_traceback)
+        else:
+            for replay, error, error_traceback in _run_replays(self, replays, plugins):
+                report.add(replay, getattr(replay, 'filename', None), error, error_traceback)
+        return report
+
+    def _run_many_parallel(self, replays, workers, plugins, chunksize):
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+        except ImportError:
+            raise ImportError("Running in parallel requires concurrent.futures, install the futures package on python 2")
+
+        replays = list(replays)
+        chunks = [replays[i:i+chunksize] for i in range(0, len(replays), max(1, chunksize))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_chunk, self, chunk, plugins) for chunk in chunks]
+            for future, chunk in zip(futures, chunks):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # The worker died or the chunk couldn't be sent to it
+                    results = [(getattr(replay, 'filename', None), None, utils.portable_error(e), traceback.format_exc()) for replay in chunk]
+
+                for filename, replay, error, error_traceback in results:
+                    if error is None:
+                        yield filename, pickle.loads(replay), None, None
+                    else:
+                        yield filename, None, pickle.loads(error), error_traceback
+
+    def _get_replay_events(self, replay, plugins):
+        # Replays with lazy events only need to read the kinds of events that
+        # the plugins have handlers for. Streamed replays read them as they go.
+        streamed = getattr(replay, 'stream_events', False)
+        if not (streamed or getattr(replay, 'lazy_events', False)):
+            return replay.events
+
+        if any(self._has_event_handler(plugin, Event) for plugin in plugins):
+            kinds = dict()
+        else:
+            kinds = dict(
+                game_events=self._has_any_event_handler(plugins, GameEvent),
+                tracker_events=self._has_any_event_handler(plugins, TrackerEvent),
+                message_events=self._has_any_event_handler(plugins, MessageEvent),
+            )
+
+        if streamed:
+            return replay.iter_events(**kinds)
+        return replay.merged_events(**kinds) if kinds else replay.events
+
+    def _has_any_event_handler(self, plugins, event_class):
+        event_classes = [event_class]
+        while event_classes:
+            event_class = event_classes.pop()
+            if any(self._has_event_handler(plugin, event_class) for plugin in plugins):
+                return True
+            event_classes.extend(event_class.__subclasses__())
+        return False
+
+    def _order_plugins(self, plugins):
+        # Plugins run after the plugins that provide what they require and
+        # otherwise in the order they were registered.
+        providers = dict()
+        for plugin in plugins:
+            for name in getattr(plugin, 'provides', ()):
+                providers.setdefault(name, list()).append(plugin)
+
+        ordered, placed, placing = list(), set(), list()
+
+        def place(plugin):
+            if id(plugin) in placed:
+                return
+            if any(other is plugin for other in placing):
+                cycle = placing[[id(other) for other in placing].index(id(plugin)):] + [plugin]
+                raise ValueError("Plugins require each other: " + " -> ".join(p.name for p in cycle))
+            placing.append(plugin)
+            for name in getattr(plugin, 'requires', ()):
+                for provider in providers.get(name, ()):
+                    if provider is not plugin:
+                        place(provider)
+            placing.pop()
+            placed.add(id(plugin))
+            ordered.append(plugin)
+
+        for plugin in plugins:
+            place(plugin)
+        return ordered
+
+    def _get_runnable_plugins(self, replay):
+        # Plugins are skipped when a replay attribute they require is missing
+        # or empty and no plugin before them provides it.
+        plugins, provided = list(), set()
+        for plugin in self._plugins:
+            missing = [name for name in getattr(plugin, 'requires', ()) if name not in provided and not self._has_attribute(replay, name)]
+            if missing:
+                replay.plugins[plugin.name] = (0, dict(missing=missing))
+            else:
+                plugins.append(plugin)
+                provided.update(getattr(plugin, 'provides', ()))
+        return plugins
+
+    def _has_attribute(self, replay, name):
+        # Replays check the events they haven't read yet without reading them
+        has_attribute = getattr(replay, 'has_attribute', None)
+        if has_attribute is not None:
+            return has_attribute(name)
+        return bool(getattr(replay, name, None))
+
+    def _get_consumed_event_types(self, plugin):
+        event_classes = self._get_event_classes()
+        consumes = getattr(plugin, 'consumes', None)
+        if consumes is not None:
+            # Consuming Event is consuming every event
+            if Event in consumes or 'Event' in consumes:
+                return None
+            return [event_classes.get(event_type, event_type) for event_type in consumes]
+
+        # Without a declaration plugins consume the events they have handlers for
+        if self._has_event_handler(plugin, Event):
+            return None
+        return [event_class for name, event_class in event_classes.items() if hasattr(plugin, 'handle'+name)]
+
+    def _get_event_classes(self):
+        # Every event class by name, except the Event base class
+        event_classes, subclasses = dict(), Event.__subclasses__()
+        while subclasses:
+            event_class = subclasses.pop()
+            event_classes[event_class.name] = event_class
+            subclasses.extend(event_class.__subclasses__())
+        return event_classes
+
+    def __getstate__(self):
+        # The handlers are bound to the plugins and are looked up again by
+        # the copy, the plugin ids change anyway.
+        return dict(plugins=self._plugins, profile=self._profile)
+
+    def __setstate__(self, state):
+        self.__init__(plugins=state['plugins'], profile=state.get('profile', False))
+
+    def _get_handler_table(self, plugins, table=None, exited=None):
+        key = tuple(id(plugin) for plugin in plugins)
+        if key not in self._handler_tables:
+            new_table = dict()
+            if table is not None:
+                # Only the entries the exited plugin has handlers in change,
+                # the rest are rebuilt the next time they are used.
+                exited_handlers = self._plugin_handlers[id(exited)]
+                for event_class, entry in table.items():
+                    if event_class in exited_handlers and not exited_handlers[event_class][0]:
+                        new_table[event_class] = entry
+            self._handler_tables[key] = new_table
+        return self._handler_tables[key]
+
     def _get_event_handlers(self, event, plugins):
-        return sum([self._get_plugin_event_handlers(plugin, event) for plugin in plugins], [])
+        handlers, handler_yields = tuple(), tuple()
+        for plugin in plugins:
+            plugin_handlers, plugin_yields = self._get_plugin_event_handlers(plugin, event)
+            handlers += plugin_handlers
+            handler_yields += plugin_yields
+
+        # When some of the handlers are generators the events they add are
+        # collected, the results of the other handlers are still ignored
+        yields = any(handler_yields)
+        if yields:
+            handlers = tuple(handler if handler_yield else _ignore_result(handler) for handler, handler_yield in zip(handlers, handler_yields))
+        return handlers, yields
 
     def _get_plugin_event_handlers(self, plugin, event):
-        handlers = list()
-        if isinstance(event, Event) and self._has_event_handler(plugin, Event):
-            handlers.append(self._get_event_handler(plugin, Event))
-        if isinstance(event, MessageEvent) and self._has_event_handler(plugin, MessageEvent):
-            handlers.append(self._get_event_handler(plugin, MessageEvent))
-        if isinstance(event, GameEvent) and self._has_event_handler(plugin, GameEvent):
-            handlers.append(self._get_event_handler(plugin, GameEvent))
-        if isinstance(event, TrackerEvent) and self._has_event_handler(plugin, TrackerEvent):
-            handlers.append(self._get_event_handler(plugin, TrackerEvent))
-        if isinstance(event, PlayerActionEvent) and self._has_event_handler(plugin, PlayerActionEvent):
-            handlers.append(self._get_event_handler(plugin, PlayerActionEvent))
-        if isinstance(event, AbilityEvent) and self._has_event_handler(plugin, AbilityEvent):
-            handlers.append(self._get_event_handler(plugin, AbilityEvent))
-        if isinstance(event, HotkeyEvent) and self._has_event_handler(plugin, HotkeyEvent):
-            handlers.append(self._get_event_handler(plugin, HotkeyEvent))
-        if self._has_event_handler(plugin, event):
-            handlers.append(self._get_event_handler(plugin, event))
-        return handlers
+        plugin_handlers = self._plugin_handlers[id(plugin)]
+        if event.__class__ not in plugin_handlers:
+            consumes = getattr(plugin, 'consumes', None)
+            key = (plugin.__class__, tuple(consumes) if consumes is not None else None, event.__class__)
+            if self._handler_names is not None and key in self._handler_names:
+                names, handler_yields = self._handler_names[key]
+                handlers = [(name, getattr(plugin, name)) for name in names]
+            else:
+                # Parent class handlers come first, from most general to most specific
+                mro = event.__class__.__mro__
+                event_classes = [event_class for event_class in self.GENERIC_EVENT_CLASSES if event_class in mro]
+                names = ['handle'+event_class.name for event_class in event_classes + [event]]
+
+                # Plugins that declare what they consume only get those events
+                if consumes is not None and isinstance(event, Event) and not EventFilter(consumes).keep(event.__class__):
+                    names = list()
+                handlers = [(name, getattr(plugin, name)) for name in names if hasattr(plugin, name)]
+
+                # Only generators can add events, the queue is left alone for the rest
+                handler_yields = tuple(not inspect.isroutine(handler) or inspect.isgeneratorfunction(handler) for name, handler in handlers)
+                if self._handler_names is not None:
+                    self._handler_names[key] = (tuple(name for name, handler in handlers), handler_yields)
+
+            if self._profile:
+                handlers = [(name, _profiled(handler, plugin.name, name, handler_yield)) for (name, handler), handler_yield in zip(handlers, handler_yields)]
+            plugin_handlers[event.__class__] = (tuple(handler for name, handler in handlers), handler_yields)
+        return plugin_handlers[event.__class__]
 
     def _has_event_handler(self, plugin, event):
         return hasattr(plugin, 'handle'+event.name)
 
-    def _get_event_handler(self, plugin, event):
-        return getattr(plugin, 'handle'+event.name, None)
-
 
 if __name__ == '__main__':
     from sc2reader.events import UserOptionsEvent, GameStartEvent, PlayerLeaveEvent
@@ -206,6 +678,7 @@ if __name__ == '__main__':
             self.source = source
 
     class TestPlugin(object):
+        name = 'TestPlugin'
         yields = TestEvent
 
         def handleInitGame(self, event, replay,):
@@ -221,7 +694,8 @@ if __name__ == '__main__':
             yield TestEvent(event.name)
 
     class TestReplay(object):
-        events = [UserOptionsEvent, UserOptionsEvent, GameStartEvent, PlayerLeaveEvent]
+        # Handlers are looked up by event class, the events don't need any data here
+        events = [cls.__new__(cls) for cls in (UserOptionsEvent, UserOptionsEvent, GameStartEvent, PlayerLeaveEvent)]
 
     engine = GameEngine()
     engine.register_plugin(TestPlugin())
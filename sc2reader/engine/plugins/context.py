@@ -9,6 +9,7 @@ from sc2reader.utils import Length
 @loggable
 class ContextLoader(object):
     name='ContextLoader'
+    provides = ('units', 'unit', 'objects', 'active_units')
 
     def handleInitGame(self, event, replay):
         replay.units = set()
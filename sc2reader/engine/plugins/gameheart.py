@@ -25,17 +25,19 @@ class GameHeartNormalizer(object):
     """
     name = 'GameHeartNormalizer'
 
+    # without tracker events game heart games can't be fixed, and every event
+    # in replay.events is moved back to the game start
+    requires = ('tracker_events',)
+    consumes = ('Event',)
+
     PRIMARY_BUILDINGS = dict(Hatchery="Zerg", Nexus="Protoss", CommandCenter="Terran")
 
     def handleInitGame(self, event, replay):
-        # without tracker events game heart games can't be fixed
-        if len(replay.tracker_events) == 0:
-            yield PluginExit(self, code=0, details=dict())
-            return
-
+        # Only the first tracker events are read to tell if this is a GameHeart
+        # game, the rest of the events are read when it is normalized
         start_frame = -1
         actual_players = {}
-        for event in replay.tracker_events:
+        for event in replay.iter_events(game_events=False, message_events=False):
             if start_frame != -1 and event.frame > start_frame + 5:  # fuzz it a little
                 break
             if event.name == 'UnitBornEvent' and event.control_pid and event.unit_type_name in self.PRIMARY_BUILDINGS:
@@ -47,6 +49,10 @@ class GameHeartNormalizer(object):
                     start_frame = event.frame
                     actual_players[event.control_pid] = self.PRIMARY_BUILDINGS[event.unit_type_name]
 
+        if start_frame == -1:
+            yield PluginExit(self, code=0, details=dict())
+            return
+
         self.fix_entities(replay, actual_players)
         self.fix_events(replay, start_frame)
 
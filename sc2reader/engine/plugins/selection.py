@@ -25,6 +25,9 @@ class SelectionTracker(object):
     """
     name = 'SelectionTracker'
 
+    # The selected units are loaded into replay.objects
+    requires = ('objects',)
+
     def handleInitGame(self, event, replay):
         for person in replay.entities:
             person.selection = dict()
@@ -4,3 +4,38 @@ from __future__ import absolute_import, print_function, unicode_literals, divisi
 
 class Event(object):
     name = 'Event'
+
+
+class EventFilter(object):
+    """
+    Decides which kinds of events are kept when reading a replay.
+
+    :param event_types: Event classes or class names to keep. All events are
+        kept when this isn't given.
+    :param exclude_event_types: Event classes or class names to leave out.
+
+    Subclasses of the given classes match as well so ``GameEvent`` stands for
+    all game events and ``AbilityEvent`` for all kinds of ability events.
+    """
+    def __init__(self, event_types=None, exclude_event_types=None):
+        self.event_types = self._split(event_types) if event_types is not None else None
+        self.exclude_event_types = self._split(exclude_event_types or [])
+        self._cache = dict()
+
+    def keep(self, event_class):
+        """ Returns True if events of the given class should be kept """
+        if event_class not in self._cache:
+            keep = self.event_types is None or self._matches(event_class, self.event_types)
+            self._cache[event_class] = keep and not self._matches(event_class, self.exclude_event_types)
+        return self._cache[event_class]
+
+    def _split(self, event_types):
+        if not isinstance(event_types, (list, tuple, set, frozenset)):
+            event_types = [event_types]
+        classes = set(event_type for event_type in event_types if isinstance(event_type, type))
+        names = set(event_type for event_type in event_types if not isinstance(event_type, type))
+        return classes, names
+
+    def _matches(self, event_class, event_types):
+        classes, names = event_types
+        return any(cls in classes or cls.__name__ in names for cls in event_class.__mro__)
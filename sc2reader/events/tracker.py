@@ -10,6 +10,8 @@ clamp = functools.partial(max, 0)
 
 
 class TrackerEvent(Event):
+    name = 'TrackerEvent'
+
     def __init__(self, frames):
         #: The frame of the game this event was applied
         self.frame = frames
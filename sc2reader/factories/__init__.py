@@ -1,6 +1,21 @@
 from __future__ import absolute_import
 
 from sc2reader.factories.sc2factory import SC2Factory
+from sc2reader.factories.sc2factory import LoadResult
+from sc2reader.factories.sc2factory import ParsedReplayCache
 from sc2reader.factories.sc2factory import FileCachedSC2Factory
 from sc2reader.factories.sc2factory import DictCachedSC2Factory
 from sc2reader.factories.sc2factory import DoubleCachedSC2Factory
+
+import sys
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # asyncio takes a while to import, so only import it when it is used
+        if name == 'AsyncSC2Factory':
+            from sc2reader.factories.asyncfactory import AsyncSC2Factory
+            return AsyncSC2Factory
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+elif sys.version_info >= (3, 5):
+    # Coroutines need the async syntax of python 3.5
+    from sc2reader.factories.asyncfactory import AsyncSC2Factory
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import re
+
+from sc2reader import utils
+from sc2reader import log_utils
+from sc2reader.factories.sc2factory import SC2Factory
+from sc2reader.resources import Replay, Map, GameSummary, Localization
+
+
+def _is_remote(source):
+    return isinstance(source, str) and re.match(r'https?://', source)
+
+
+class _LoopBridge(object):
+    """ Stands in for the wrapped factory while a resource is parsed in a
+    worker thread. Resources that load other resources, like replays with
+    ``load_map`` or game summaries with their localization sheets, go through
+    here so that their downloads are made by the event loop as well.
+    Everything else is looked up on the wrapped factory.
+    """
+    def __init__(self, owner, loop):
+        self.owner = owner
+        self.loop = loop
+
+    def __getattr__(self, name):
+        return getattr(self.owner.factory, name)
+
+    # The public loaders all come down to load and load_all below
+    load_replay = SC2Factory.load_replay
+    load_replays = SC2Factory.load_replays
+    load_map = SC2Factory.load_map
+    load_maps = SC2Factory.load_maps
+    load_game_summary = SC2Factory.load_game_summary
+    load_game_summaries = SC2Factory.load_game_summaries
+    load_localization = SC2Factory.load_localization
+    load_localizations = SC2Factory.load_localizations
+
+    def load(self, cls, source, options=None, **new_options):
+        options = options or self._get_options(cls, **new_options)
+        resource, filename = SC2Factory._load_resource(self, source, options=options)
+        return self.finish(SC2Factory._load(self, cls, resource, filename, options))
+
+    def load_all(self, cls, sources, options=None, **new_options):
+        options = options or self._get_options(cls, **new_options)
+        if isinstance(sources, str):
+            sources = utils.get_files(sources, **options)
+
+        # Start all the downloads before waiting on the first one
+        pending = list()
+        for source in sources:
+            url = source.url if isinstance(source, utils.DepotFile) else source
+            pending.append((source, self.fetch(url) if _is_remote(url) else None))
+
+        for source, fetch in pending:
+            if fetch is not None:
+                resource, filename = BytesIO(fetch.result()), str(source)
+            else:
+                resource, filename = SC2Factory._load_resource(self, source, options=options)
+            yield self.finish(SC2Factory._load(self, cls, resource, filename, options))
+
+    def load_remote_resource_contents(self, resource, **options):
+        return self.fetch(resource).result()
+
+    def fetch(self, url):
+        return asyncio.run_coroutine_threadsafe(self.owner.fetch(url), self.loop)
+
+    def finish(self, obj):
+        # Loaded resources keep the wrapped factory, the bridge only works
+        # while the event loop is waiting on it.
+        if getattr(obj, 'factory', None) is self:
+            obj.factory = self.owner.factory
+        return obj
+
+
+@log_utils.loggable
+class AsyncSC2Factory(object):
+    """
+    :param factory: The :class:`SC2Factory` to load resources with. Its
+        options, plugins and caches are used for every load. A new SC2Factory
+        is made when none is given.
+    :param max_connections: The max number of remote resources downloaded at
+        the same time.
+    :param executor: The :mod:`concurrent.futures` executor resources are
+        parsed in. Defaults to the default executor of the event loop.
+
+    Loads resources from a coroutine, downloading remote resources
+    concurrently. The load methods match those of :class:`SC2Factory` but
+    have to be awaited, and the plural ones return a list::
+
+        factory = AsyncSC2Factory(max_connections=4)
+        replay = await factory.load_replay(url, load_map=True)
+        summaries = await factory.load_game_summaries(urls)
+
+    Downloads are made by the ``load_remote_resource_contents`` method of the
+    wrapped factory in a pool of ``max_connections`` threads, so cached
+    factories are checked first. Requests for a url that is already being
+    downloaded wait on that download instead of starting another one. The
+    maps of replays loaded with ``load_map`` and the localization sheets of
+    game summaries are downloaded the same way.
+
+    Parsing runs in the ``executor`` and doesn't block the event loop. A
+    factory should only be used from one event loop at a time.
+    """
+    def __init__(self, factory=None, max_connections=8, executor=None):
+        #: The :class:`SC2Factory` resources are loaded with
+        self.factory = factory if factory is not None else SC2Factory()
+
+        #: The executor resources are parsed in, None for the default one
+        self.executor = executor
+
+        self.max_connections = max_connections
+        self._connections = ThreadPoolExecutor(max_workers=max_connections)
+
+        # The downloads in progress by url
+        self._fetches = dict()
+
+    # Primary Interface
+    async def load_replay(self, source, options=None, **new_options):
+        """Loads a single sc2replay file. Accepts file path, url, or file object."""
+        return await self.load(Replay, source, options, **new_options)
+
+    async def load_replays(self, sources, options=None, **new_options):
+        """Loads a collection of sc2replay files, returns a list."""
+        return await self.load_all(Replay, sources, options, extension='SC2Replay', **new_options)
+
+    async def load_localization(self, source, options=None, **new_options):
+        """Loads a single s2ml file. Accepts file path, url, or file object."""
+        return await self.load(Localization, source, options, **new_options)
+
+    async def load_localizations(self, sources, options=None, **new_options):
+        """Loads a collection of s2ml files, returns a list."""
+        return await self.load_all(Localization, sources, options, extension='s2ml', **new_options)
+
+    async def load_map(self, source, options=None, **new_options):
+        """Loads a single s2ma file. Accepts file path, url, or file object."""
+        return await self.load(Map, source, options, **new_options)
+
+    async def load_maps(self, sources, options=None, **new_options):
+        """Loads a collection of s2ma files, returns a list."""
+        return await self.load_all(Map, sources, options, extension='s2ma', **new_options)
+
+    async def load_game_summary(self, source, options=None, **new_options):
+        """Loads a single s2gs file. Accepts file path, url, or file object."""
+        return await self.load(GameSummary, source, options, **new_options)
+
+    async def load_game_summaries(self, sources, options=None, **new_options):
+        """Loads a collection of s2gs files, returns a list."""
+        return await self.load_all(GameSummary, sources, options, extension='s2gs', **new_options)
+
+    async def load(self, cls, source, options=None, **new_options):
+        options = options or self.factory._get_options(cls, **new_options)
+        loop = asyncio.get_event_loop()
+
+        # Download first so that waiting on the network doesn't hold a thread
+        contents = None
+        url = source.url if isinstance(source, utils.DepotFile) else source
+        if _is_remote(url):
+            contents = await self.fetch(url)
+
+        return await loop.run_in_executor(self.executor, self._load, cls, source, contents, options, loop)
+
+    async def load_all(self, cls, sources, options=None, **new_options):
+        options = options or self.factory._get_options(cls, **new_options)
+
+        # Path to a folder, retrieve all relevant files as the collection
+        if isinstance(sources, str):
+            sources = utils.get_files(sources, **options)
+
+        return await asyncio.gather(*[self.load(cls, source, options) for source in sources])
+
+    async def fetch(self, url):
+        """ Returns the contents of the remote resource at url. """
+        future = self._fetches.get(url)
+        if future is None:
+            self.logger.debug("Queueing download of "+url)
+            loop = asyncio.get_event_loop()
+            future = loop.run_in_executor(self._connections, self.factory.load_remote_resource_contents, url)
+            future.add_done_callback(lambda done: self._fetches.pop(url, None))
+            self._fetches[url] = future
+
+        # Callers that are cancelled mustn't cancel the download for the others
+        return await asyncio.shield(future)
+
+    def close(self):
+        """ Stops the download threads once the current downloads finish. """
+        self._connections.shutdown()
+
+    # Internal Functions
+    def _load(self, cls, source, contents, options, loop):
+        bridge = _LoopBridge(self, loop)
+        if contents is not None:
+            resource, filename = BytesIO(contents), str(source)
+        else:
+            resource, filename = SC2Factory._load_resource(bridge, source, options=options)
+        return bridge.finish(SC2Factory._load(bridge, cls, resource, filename, options))
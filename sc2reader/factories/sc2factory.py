@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals, division
 
-from collections import defaultdict
+from collections import defaultdict, deque
+import gc
+import hashlib
 from io import BytesIO
+import itertools
 import os
 import sys
+import threading
+import zlib
 
 try:
     unicode
@@ -12,20 +17,223 @@ except NameError:
     basestring = unicode = str
 
 if sys.version_info[0] < 3:
-    from urllib2 import urlopen
     from urlparse import urlparse
 else:
-    from urllib.request import urlopen
     from urllib.parse import urlparse
 
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+import pickle
 import re
 import time
+import traceback
+
+try:
+    import lzma
+except ImportError:
+    lzma = None  # Not available on python 2
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+import sc2reader
 from sc2reader import utils
 from sc2reader import log_utils
 from sc2reader.resources import Resource, Replay, Map, GameSummary, Localization
 
 
+class LoadResult(object):
+    """
+    The outcome of loading a single source in parallel, see
+    :meth:`SC2Factory.load_all`. Failed loads are reported here instead of
+    stopping the whole batch.
+    """
+    def __init__(self, source, value=None, error=None, traceback=None):
+        #: The source that was loaded
+        self.source = source
+
+        #: The loaded resource, or the result of the projection when one was
+        #: given. None when loading failed.
+        self.value = value
+
+        #: The exception raised while loading, None when loading succeeded
+        self.error = error
+
+        #: The formatted traceback of the error as a string
+        self.traceback = traceback
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return 'LoadResult({0!r})'.format(self.source)
+        return 'LoadResult({0!r}, error={1!r})'.format(self.source, self.error)
+
+
+def _load_chunk(factory, cls, sources, options, projection):
+    # Runs in the worker processes. Values and errors are pickled here, one
+    # by one, so that one that can't be sent back only fails its own source.
+    results = list()
+    for source in sources:
+        try:
+            value = factory.load(cls, source, options)
+            if projection is not None:
+                value = projection(value)
+            results.append((source, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), None, None))
+        except Exception as e:
+            results.append((source, None, utils.portable_error(e), traceback.format_exc()))
+    return results
+
+
+def _qualified_name(obj):
+    # Functions and classes are named by themselves, anything else by its class
+    if not hasattr(obj, '__name__'):
+        obj = type(obj)
+    return '{0}.{1}'.format(obj.__module__, obj.__name__)
+
+
+class _SharedLoad(object):
+    # A load in progress, or done, that several threads can wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def set(self, value=None, error=None):
+        self.value = value
+        self.error = error
+        self.done.set()
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+@log_utils.loggable
+class ParsedReplayCache(object):
+    """
+    :param cache_dir: Local directory to keep the parsed replays in.
+    :param compress: Compress the cached replays with zlib. Compressed
+        entries take about a quarter of the space and a little longer to load.
+
+    Keeps pickled copies of loaded replays on the file system so that loading
+    the same replay file again skips parsing it and running it through the
+    engine and plugins. Use it by passing it to a factory::
+
+        factory = SC2Factory(replay_cache=ParsedReplayCache('/path/to/cache'))
+
+    Entries are keyed by the sha256 of the replay file, the sc2reader version,
+    the replay class and the options that change what is loaded: the
+    ``load_level``, ``load_map``, ``event_types``, ``exclude_event_types``,
+    ``lazy_events``, ``stream_events`` and ``hash_algorithm`` options and the
+    engine and factory plugins. Lazy and streamed replays read the events the
+    engine didn't run over when they are cached, so they aren't shared with
+    other loads. The readers and datapacks are chosen from the replay's build
+    by the replay class, so they are covered by the file hash and class.
+    """
+
+    #: Replay options that change the loaded replay
+    key_options = ('load_level', 'load_map', 'event_types', 'exclude_event_types', 'lazy_events', 'stream_events', 'hash_algorithm')
+
+    def __init__(self, cache_dir, compress=True):
+        self.cache_dir = os.path.abspath(cache_dir)
+        if not os.path.isdir(self.cache_dir):
+            raise ValueError("cache_dir ({0}) must be an existing directory.".format(self.cache_dir))
+        self.compress = compress
+
+        #: The number of replays loaded from the cache
+        self.hits = 0
+
+        #: The number of replays that weren't in the cache
+        self.misses = 0
+
+    def key(self, cls, contents, options, plugins):
+        """ Returns the cache key for loading a replay with the given file
+        contents, options and factory plugins.
+        """
+        engine = options.get('engine', sc2reader.engine)
+        if engine is not None:
+            # The engine module runs a default GameEngine
+            engine = getattr(engine.run, '__self__', engine)
+            engine = [_qualified_name(plugin) for plugin in getattr(engine, '_plugins', [])]
+
+        selection = [sc2reader.__version__, _qualified_name(cls), engine, [_qualified_name(plugin) for plugin in plugins]]
+        for name in self.key_options:
+            value = options.get(name)
+            if isinstance(value, (list, tuple, set)):
+                value = sorted(getattr(item, '__name__', item) for item in value)
+            selection.append([name, value])
+
+        key = hashlib.sha256(contents)
+        key.update(repr(selection).encode('utf8'))
+        return key.hexdigest()
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.SC2Replay.pickle')
+
+    def get(self, key):
+        """ Returns the cached replay for the key, or None when it isn't cached """
+        cache_path = self.cache_path(key)
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                data = cache_file.read()
+        except IOError:
+            self.misses += 1
+            return None
+
+        # Unpickling creates a lot of objects that the garbage collector would
+        # otherwise scan over and over while the replay is being rebuilt
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if self.compress:
+                data = zlib.decompress(data)
+            replay = pickle.loads(data)
+        except Exception as e:
+            self.logger.warning("Discarding unreadable cached replay {0}: {1}".format(cache_path, e))
+            self.discard(key)
+            self.misses += 1
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        self.hits += 1
+        return replay
+
+    def set(self, key, replay):
+        """ Stores the replay under the key. Replays that can't be pickled,
+        for instance because a plugin left something unpicklable on them, are
+        logged and not cached.
+        """
+        try:
+            data = pickle.dumps(replay, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self.logger.warning("Unable to cache replay {0}: {1}".format(replay.filename, e))
+            return
+
+        if self.compress:
+            data = zlib.compress(data, 1)
+
+        utils.write_file_atomic(self.cache_path(key), data)
+
+    def discard(self, key):
+        """ Removes the cached replay for the key, if there is one """
+        try:
+            os.remove(self.cache_path(key))
+        except OSError:
+            pass
+
+
 @log_utils.loggable
 class SC2Factory(object):
     """The SC2Factory class acts as a generic loader interface for all
@@ -47,6 +255,18 @@ class SC2Factory(object):
     See the :meth:`configure` method for more details on configuration
     options.
 
+    Loaded replays can be kept in a :class:`ParsedReplayCache` given as
+    ``replay_cache``. Replays found in the cache are returned without parsing
+    them again.
+
+    Maps loaded from the depot, like the maps of replays loaded with
+    ``load_map``, are loaded once per map hash and shared. The last
+    ``map_cache_size`` of them are kept, 0 turns sharing off. Threads that
+    want a map that is already being loaded wait for it instead of loading it
+    again. The plural loaders also take a ``prefetch_maps`` option, the number
+    of upcoming replays to load the maps of in a background thread while the
+    current replay is parsed. It should be less than ``map_cache_size``.
+
     Resources can be loaded in the singular context from the following inputs:
 
     * URLs - Uses the built-in package ``urllib``
@@ -64,13 +284,23 @@ class SC2Factory(object):
     _resource_name_map = dict(replay=Replay, map=Map)
 
     default_options = {
-        Resource: {'debug': False},
-        Replay: {'load_level': 4, 'load_map': False},
+        Resource: {'debug': False, 'mmap': False, 'hash_algorithm': 'sha256', 'lazy_hash': False},
+        Replay: {'load_level': 4, 'load_map': False, 'lazy_events': False, 'event_types': None, 'exclude_event_types': None},
     }
 
-    def __init__(self, **options):
+    def __init__(self, replay_cache=None, map_cache_size=16, **options):
         self.plugins = list()
 
+        #: The :class:`ParsedReplayCache` loaded replays are kept in, if any
+        self.replay_cache = replay_cache
+
+        #: The max number of depot maps kept to share between loads
+        self.map_cache_size = int(map_cache_size or 0)
+
+        # Map loads by map hash, in least to most recently used order
+        self._maps = OrderedDict()
+        self._maps_lock = threading.Lock()
+
         # Bootstrap with the default options
         self.options = defaultdict(dict)
         for cls, options in self.default_options.items():
@@ -88,6 +318,25 @@ class SC2Factory(object):
         """Loads a collection of sc2replay files, returns a generator."""
         return self.load_all(Replay, sources, options, extension='SC2Replay', **new_options)
 
+    def peek_header(self, source, options=None, **new_options):
+        """ Reads only the header of a sc2replay file. Accepts file path, url,
+        or file object.
+
+        Returns a :class:`Replay` loaded with ``load_level=-1`` that has the
+        ``versions``, ``build``, ``base_build``, ``release_string``, ``frames``
+        and lengths of the replay. Local files are opened and only the header
+        bytes are read. The archive isn't opened, the file isn't hashed and the
+        replay isn't run through the engine or the factory plugins.
+        """
+        options = utils.AttributeDict(options or self._get_options(Replay, **new_options))
+        options.update(load_level=-1, engine=None)
+        if isinstance(source, basestring) and not re.match(r'https?://', source):
+            with open(os.path.join(options.get('directory', ''), source), 'rb') as replay_file:
+                return Replay(replay_file, filename=source, factory=self, **options)
+
+        resource, filename = self._load_resource(source, options=options)
+        return Replay(resource, filename=filename, factory=self, **options)
+
     def load_localization(self, source, options=None, **new_options):
         """Loads a single s2ml file. Accepts file path, url, or file object."""
         return self.load(Localization, source, options, **new_options)
@@ -97,7 +346,10 @@ class SC2Factory(object):
         return self.load_all(Localization, sources, options, extension='s2ml', **new_options)
 
     def load_map(self, source, options=None, **new_options):
-        """Loads a single s2ma file. Accepts file path, url, or file object."""
+        """Loads a single s2ma file. Accepts file path, url, file object, or
+        DepotFile. Maps loaded from a DepotFile are shared, see ``map_cache_size``."""
+        if self.map_cache_size and isinstance(source, utils.DepotFile):
+            return self._load_shared_map(source.hash, lambda: self.load(Map, source, options, **new_options))
         return self.load(Map, source, options, **new_options)
 
     def load_maps(self, sources, options=None, **new_options):
@@ -124,6 +376,11 @@ class SC2Factory(object):
         "Resets the options to factory defaults"
         self.options = defaultdict(dict)
 
+    def clear_maps(self):
+        "Drops the shared maps"
+        with self._maps_lock:
+            self._maps.clear()
+
     def register_plugin(self, cls, plugin):
         "Registers the given Plugin to be run on classes of the supplied name."
         if isinstance(cls, basestring):
@@ -136,16 +393,196 @@ class SC2Factory(object):
         resource, filename = self._load_resource(source, options=options)
         return self._load(cls, resource, filename=filename, options=options)
 
-    def load_all(self, cls, sources, options=None, **new_options):
+    def load_all(self, cls, sources, options=None, parallel=0, chunksize=1, ordered=True, projection=None, **new_options):
+        """ Loads a collection of resources, returns a generator.
+
+        :param parallel: When set, the number of worker processes to load the
+            resources with. Each resource is loaded and run through the
+            registered plugins in a worker and the generator yields a
+            :class:`LoadResult` for every source instead of the resource itself.
+        :param chunksize: The number of sources sent to a worker at a time.
+        :param ordered: When False parallel results are yielded as soon as
+            they are ready instead of in the order of the sources.
+        :param projection: A picklable function called with each loaded
+            resource in the worker. Its return value is sent back instead of
+            the resource, which saves pickling resources that are only needed
+            for a few values.
+        """
         options = options or self._get_options(cls, **new_options)
-        for resource, filename in self._load_resources(sources, options=options):
+        if parallel:
+            return self._load_all_parallel(cls, sources, options, parallel, chunksize, ordered, projection)
+        return self._load_all(cls, sources, options)
+
+    def _load_all(self, cls, sources, options):
+        resources = self._load_resources(sources, options=options)
+        if issubclass(cls, Replay) and options.get('load_map', False) and options.get('prefetch_maps', 0) and self.map_cache_size:
+            resources = self._prefetch_maps(resources, options)
+
+        for resource, filename in resources:
             yield self._load(cls, resource, filename=filename, options=options)
 
+    def _prefetch_maps(self, resources, options):
+        # Reads prefetch_maps resources ahead of the one being loaded and
+        # hands their map files to a thread that loads them into the shared
+        # maps. The replays then find their maps loaded or being loaded.
+        map_files = Queue()
+        prefetcher = threading.Thread(target=self._prefetch_map_files, args=(map_files, options))
+        prefetcher.daemon = True
+        prefetcher.start()
+
+        pending = deque()
+        try:
+            for resource, filename in resources:
+                pending.append((resource, filename))
+                map_file = self._peek_map_file(resource, options)
+                if map_file is not None:
+                    map_files.put(map_file)
+                if len(pending) > int(options['prefetch_maps']):
+                    yield pending.popleft()
+
+            while pending:
+                yield pending.popleft()
+        finally:
+            map_files.put(None)
+
+    def _prefetch_map_files(self, map_files, options):
+        for map_file in iter(map_files.get, None):
+            try:
+                self.load_map(map_file, **options)
+            except Exception as e:
+                # The replay tries again and raises the error itself
+                self.logger.info("Unable to prefetch {0}: {1}".format(map_file, e))
+
+    def _peek_map_file(self, resource, options):
+        # Only the details are needed for the map file
+        peek_options = dict(options, load_level=1, load_map=False, engine=None, hash_algorithm=None)
+        try:
+            return Replay(resource, factory=self, **peek_options).map_file
+        except Exception:
+            return None  # Let the real load report the problem
+        finally:
+            resource.seek(0)
+
+    def _load_shared_map(self, map_hash, load):
+        with self._maps_lock:
+            shared = self._maps.pop(map_hash, None)
+            loading = shared is None
+            if loading:
+                shared = _SharedLoad()
+
+            # Put it at the most recently used end
+            self._maps[map_hash] = shared
+            while len(self._maps) > self.map_cache_size:
+                self._maps.popitem(last=False)
+
+        if loading:
+            try:
+                shared.set(value=load())
+            except Exception as e:
+                # Don't keep the failure around, the next load tries again
+                with self._maps_lock:
+                    if self._maps.get(map_hash) is shared:
+                        del self._maps[map_hash]
+                shared.set(error=e)
+        return shared.result()
+
+    def _load_all_parallel(self, cls, sources, options, workers, chunksize, ordered, projection):
+        try:
+            from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        except ImportError:
+            raise ImportError("Loading in parallel requires concurrent.futures, install the futures package on python 2")
+
+        # Path to a folder, retrieve all relevant files as the collection
+        if isinstance(sources, basestring):
+            sources = utils.get_files(sources, **options)
+
+        # Only a few chunks are sent ahead of the results being read so that
+        # large collections aren't read into memory, or queued, all at once
+        chunks = self._iter_chunks(sources, chunksize)
+        window = max(1, workers) * 2
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            try:
+                while True:
+                    for chunk in itertools.islice(chunks, window - len(pending)):
+                        pending.append((executor.submit(_load_chunk, self, cls, chunk, options, projection), chunk))
+                    if not pending:
+                        break
+
+                    if ordered:
+                        future, chunk = pending.popleft()
+                    else:
+                        wait([future for future, chunk in pending], return_when=FIRST_COMPLETED)
+                        future, chunk = next(item for item in pending if item[0].done())
+                        pending.remove((future, chunk))
+
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # The worker died or the chunk couldn't be sent to it
+                        results = [(source, None, utils.portable_error(e), traceback.format_exc()) for source in chunk]
+
+                    for source, value, error, error_traceback in results:
+                        if error is None:
+                            yield LoadResult(source, value=pickle.loads(value))
+                        else:
+                            yield LoadResult(source, error=pickle.loads(error), traceback=error_traceback)
+            finally:
+                # Don't wait on the rest of the batch if the caller stops early
+                for future, chunk in pending:
+                    future.cancel()
+
+    def _iter_chunks(self, sources, chunksize):
+        chunk = list()
+        for source in sources:
+            # Only names can be sent to the workers, file objects are read
+            # here as their chunk is sent
+            if not isinstance(source, (basestring, utils.DepotFile)):
+                source = BytesIO(source.read())
+            chunk.append(source)
+            if len(chunk) >= max(1, chunksize):
+                yield chunk
+                chunk = list()
+        if chunk:
+            yield chunk
+
     # Internal Functions
     def _load(self, cls, resource, filename, options):
-        obj = cls(resource, filename=filename, factory=self, **options)
-        for plugin in options.get('plugins', self._get_plugins(cls)):
-            obj = plugin(obj)
+        plugins = options.get('plugins', self._get_plugins(cls))
+
+        cache_key = None
+        if self.replay_cache is not None and issubclass(cls, Replay):
+            if hasattr(resource, 'getbuffer'):
+                contents = resource.getbuffer()
+            else:
+                resource.seek(0)
+                contents = resource.read()
+                resource.seek(0)
+            cache_key = self.replay_cache.key(cls, contents, options, plugins)
+            del contents  # Don't keep the buffer exported while loading
+            obj = self.replay_cache.get(cache_key)
+            if obj is not None:
+                obj.factory = self
+                obj.filename = filename or getattr(resource, 'name', 'Unavailable')
+                return obj
+
+        loaded = None
+        try:
+            obj = loaded = cls(resource, filename=filename, factory=self, **options)
+            for plugin in plugins:
+                obj = plugin(obj)
+
+            if cache_key is not None:
+                self.replay_cache.set(cache_key, obj)
+        finally:
+            if isinstance(resource, utils.MappedFile):
+                # Maps hold a file descriptor, so they aren't kept past the
+                # load. Resources that still read the file get a copy of it.
+                if loaded is not None and loaded._reads_file():
+                    resource.detach()
+                else:
+                    resource.close()
         return obj
 
     def _get_plugins(self, cls):
@@ -174,7 +611,25 @@ class SC2Factory(object):
         for resource in resources:
             yield self._load_resource(resource, options=options)
 
+    def __getstate__(self):
+        # Locks and maps being loaded can't be pickled, which parallel
+        # loading needs. Each process shares its own maps.
+        state = self.__dict__.copy()
+        del state['_maps_lock']
+        state['_maps'] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._maps_lock = threading.Lock()
+
     def load_remote_resource_contents(self, resource, **options):
+        # urllib takes a while to import, so only import it when it is used
+        if sys.version_info[0] < 3:
+            from urllib2 import urlopen
+        else:
+            from urllib.request import urlopen
+
         self.logger.info("Fetching remote resource: "+resource)
         return urlopen(resource).read()
 
@@ -183,6 +638,10 @@ class SC2Factory(object):
         with open(location, 'rb') as resource_file:
             return resource_file.read()
 
+    def map_local_resource(self, location, **options):
+        """ Memory maps a local file instead of reading it, see :class:`~sc2reader.utils.MappedFile` """
+        return utils.MappedFile(location)
+
     def _load_resource(self, resource, options=None, **new_options):
         """http links, filesystem locations, and file-like objects"""
         options = options or self._get_options(Resource, **new_options)
@@ -191,17 +650,18 @@ class SC2Factory(object):
             resource = resource.url
 
         if isinstance(resource, basestring):
+            resource_name = resource
             if re.match(r'https?://', resource):
-                contents = self.load_remote_resource_contents(resource, **options)
+                # BytesIO implements a fuller file-like object
+                resource = BytesIO(self.load_remote_resource_contents(resource, **options))
 
             else:
                 directory = options.get('directory', '')
                 location = os.path.join(directory, resource)
-                contents = self.load_local_resource_contents(location, **options)
-
-            # BytesIO implements a fuller file-like object
-            resource_name = resource
-            resource = BytesIO(contents)
+                if options.get('mmap', False):
+                    resource = self.map_local_resource(location, **options)
+                else:
+                    resource = BytesIO(self.load_local_resource_contents(location, **options))
 
         else:
             # Totally not designed for large files!!
@@ -229,13 +689,21 @@ class CachedSC2Factory(SC2Factory):
 
     def load_remote_resource_contents(self, remote_resource, **options):
         cache_key = self.get_remote_cache_key(remote_resource)
-        if not self.cache_has(cache_key):
+        resource = self.cache_lookup(cache_key)
+        if resource is None:
             resource = super(CachedSC2Factory, self).load_remote_resource_contents(remote_resource, **options)
             self.cache_set(cache_key, resource)
-        else:
-            resource = self.cache_get(cache_key)
         return resource
 
+    def cache_lookup(self, cache_key):
+        """ Returns the cached value for the key, or None when it isn't
+        cached. Caches that can change between :meth:`cache_has` and
+        :meth:`cache_get` override this to do both at once.
+        """
+        if self.cache_has(cache_key):
+            return self.cache_get(cache_key)
+        return None
+
     def cache_has(self, cache_key):
         raise NotImplemented()
 
@@ -249,12 +717,32 @@ class CachedSC2Factory(SC2Factory):
 class FileCachedSC2Factory(CachedSC2Factory):
     """
     :param cache_dir: Local directory to cache files in.
+    :param cache_compression: Compress the cached files with ``'zlib'`` or
+        ``'lzma'``. Not compressed by default.
+    :param cache_dir_max_bytes: The max total size in bytes of the cached
+        files. Not limited by default.
 
     Extends :class:`SC2Factory`.
 
     Caches remote depot resources on the file system in the ``cache_dir``.
+    Files are stored as ``<cache_dir>/<server>/<xx>/<name>`` where ``xx`` is
+    the start of the depot file name, which keeps directories small.
+
+    Several processes can share one cache directory. Files are written to a
+    temporary file and renamed into place so they are never seen half
+    written. When the cache grows past ``cache_dir_max_bytes`` the least
+    recently used files, by access time, are removed until it is back under
+    90% of the limit.
     """
-    def __init__(self, cache_dir, **options):
+
+    #: The file name suffixes used for each kind of compression
+    compression_suffixes = {None: '', 'zlib': '.zlib', 'lzma': '.xz'}
+
+    #: Temporary files left behind by writers that died are removed by the
+    #: eviction sweep once they are this many seconds old
+    stale_temp_age = 3600
+
+    def __init__(self, cache_dir, cache_compression=None, cache_dir_max_bytes=0, **options):
         super(FileCachedSC2Factory, self).__init__(**options)
         self.cache_dir = os.path.abspath(cache_dir)
         if not os.path.isdir(self.cache_dir):
@@ -262,80 +750,224 @@ class FileCachedSC2Factory(CachedSC2Factory):
         elif not os.access(self.cache_dir, os.F_OK | os.W_OK | os.R_OK):
             raise ValueError("Must have read/write access to {0} for local file caching.".format(self.cache_dir))
 
+        if cache_compression not in self.compression_suffixes:
+            raise ValueError("Unknown cache_compression {0!r}, use one of zlib or lzma.".format(cache_compression))
+        elif cache_compression == 'lzma' and lzma is None:
+            raise ValueError("lzma cache_compression needs the lzma module, which isn't available.")
+        self.cache_compression = cache_compression
+        self.cache_dir_max_bytes = int(cache_dir_max_bytes or 0)
+
+        # The size of the cache as of the last sweep plus what has been written
+        # since. Other processes write to the cache as well, so the sweep
+        # measures it again before removing anything.
+        self._cache_dir_bytes = None
+
     def cache_has(self, cache_key):
         return os.path.exists(self.cache_path(cache_key))
 
     def cache_get(self, cache_key, **options):
-        return self.load_local_resource_contents(self.cache_path(cache_key), **options)
-
-    def cache_set(self, cache_key, value):
         cache_path = self.cache_path(cache_key)
-        bucket_dir = os.path.dirname(cache_path)
-        if not os.path.exists(bucket_dir):
-            os.makedirs(bucket_dir)
+        data = self.load_local_resource_contents(cache_path, **options)
+
+        # Mark the file as used for the eviction sweep. Many file systems
+        # don't keep access times up to date by themselves.
+        try:
+            os.utime(cache_path, None)
+        except OSError:
+            pass
+
+        if self.cache_compression == 'zlib':
+            return zlib.decompress(data)
+        elif self.cache_compression == 'lzma':
+            return lzma.decompress(data)
+        return data
+
+    def cache_lookup(self, cache_key):
+        # The file can be removed by another process's sweep at any time
+        try:
+            return self.cache_get(cache_key)
+        except (IOError, OSError):
+            return None
 
-        with open(cache_path, 'w') as out:
-            out.write(value)
+    def cache_set(self, cache_key, value):
+        if self.cache_compression == 'zlib':
+            value = zlib.compress(value)
+        elif self.cache_compression == 'lzma':
+            value = lzma.compress(value)
+        utils.write_file_atomic(self.cache_path(cache_key), value)
+
+        if self.cache_dir_max_bytes:
+            if self._cache_dir_bytes is None:
+                self._cache_dir_bytes = self.cache_sweep()
+            else:
+                self._cache_dir_bytes += len(value)
+                if self._cache_dir_bytes > self.cache_dir_max_bytes:
+                    self._cache_dir_bytes = self.cache_sweep()
 
     def cache_path(self, cache_key):
-        return os.path.join(self.cache_dir, *(cache_key))
+        bucket, key = cache_key
+        name = os.path.basename(key) + self.compression_suffixes[self.cache_compression]
+        return os.path.join(self.cache_dir, bucket, name[:2], name)
+
+    def cache_sweep(self):
+        """ Removes the least recently used files until the cache is under 90%
+        of ``cache_dir_max_bytes``, along with stale temporary files. Returns
+        the size of the cache in bytes afterwards.
+        """
+        now = time.time()
+        entries = list()
+        for root, directories, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Removed by someone else
+
+                if name.endswith('.tmp'):
+                    if now - stat.st_mtime > self.stale_temp_age:
+                        self._cache_remove(path)
+                else:
+                    entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+
+        total = sum(size for used, size, path in entries)
+        if self.cache_dir_max_bytes and total > self.cache_dir_max_bytes:
+            target = self.cache_dir_max_bytes * 0.9
+            for used, size, path in sorted(entries):
+                if total <= target:
+                    break
+                self._cache_remove(path)
+                total -= size
+        return total
+
+    def _cache_remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
 
 class DictCachedSC2Factory(CachedSC2Factory):
     """
     :param cache_max_size: The max number of cache entries to hold in memory.
+    :param cache_max_bytes: The max total size in bytes of the cache entries
+        held in memory.
 
     Extends :class:`SC2Factory`.
 
     Caches remote depot resources in memory. Does not write to the file system.
     The cache is effectively cleared when the process exits.
+
+    When either limit is reached the least recently used entries are dropped.
+    Entries bigger than ``cache_max_bytes`` aren't cached at all. A zero limit
+    means no limit. The cache can be shared by several threads.
     """
-    def __init__(self, cache_max_size=0, **options):
+    def __init__(self, cache_max_size=0, cache_max_bytes=0, **options):
         super(DictCachedSC2Factory, self).__init__(**options)
-        self.cache_dict = dict()
-        self.cache_used = dict()
-        self.cache_max_size = cache_max_size
+        # Entries are kept in least to most recently used order
+        self.cache_dict = OrderedDict()
+        self.cache_max_size = int(cache_max_size or 0)
+        self.cache_max_bytes = int(cache_max_bytes or 0)
+
+        #: The total size in bytes of the cached entries
+        self.cache_bytes = 0
+
+        #: The number of lookups that were found in the cache
+        self.cache_hits = 0
+
+        #: The number of lookups that weren't in the cache
+        self.cache_misses = 0
+
+        #: The number of entries dropped to stay within the limits
+        self.cache_evictions = 0
+
+        self._cache_lock = threading.RLock()
 
     def cache_set(self, cache_key, value):
-        if self.cache_max_size and len(self.cache_dict) >= self.cache_max_size:
-            oldest_cache_key = min(self.cache_used.items(), key=lambda e: e[1])[0]
-            del self.cache_used[oldest_cache_key]
-            del self.cache_dict[oldest_cache_key]
-        self.cache_dict[cache_key] = value
-        self.cache_used[cache_key] = time.time()
+        size = len(value)
+        with self._cache_lock:
+            if cache_key in self.cache_dict:
+                self.cache_bytes -= len(self.cache_dict.pop(cache_key))
+            if self.cache_max_bytes and size > self.cache_max_bytes:
+                return
+
+            self.cache_dict[cache_key] = value
+            self.cache_bytes += size
+            while (self.cache_max_size and len(self.cache_dict) > self.cache_max_size) or (self.cache_max_bytes and self.cache_bytes > self.cache_max_bytes):
+                oldest_cache_key, oldest_value = self.cache_dict.popitem(last=False)
+                self.cache_bytes -= len(oldest_value)
+                self.cache_evictions += 1
+
+    def cache_lookup(self, cache_key):
+        with self._cache_lock:
+            value = self.cache_dict.pop(cache_key, None)
+            if value is None:
+                self.cache_misses += 1
+                return None
+
+            # Put it back at the most recently used end
+            self.cache_dict[cache_key] = value
+            self.cache_hits += 1
+            return value
 
     def cache_get(self, cache_key):
-        self.cache_used[cache_key] = time.time()
-        return self.cache_dict[cache_key]
+        value = self.cache_lookup(cache_key)
+        if value is None:
+            raise KeyError(cache_key)
+        return value
 
     def cache_has(self, cache_key):
         return cache_key in self.cache_dict
 
+    def cache_stats(self):
+        """ Returns a dict with the cache counters, size and limits """
+        with self._cache_lock:
+            return dict(
+                hits=self.cache_hits,
+                misses=self.cache_misses,
+                evictions=self.cache_evictions,
+                entries=len(self.cache_dict),
+                bytes=self.cache_bytes,
+                max_size=self.cache_max_size,
+                max_bytes=self.cache_max_bytes,
+            )
+
+    def __getstate__(self):
+        state = super(DictCachedSC2Factory, self).__getstate__()
+        del state['_cache_lock']
+        return state
+
+    def __setstate__(self, state):
+        super(DictCachedSC2Factory, self).__setstate__(state)
+        self._cache_lock = threading.RLock()
+
 
 class DoubleCachedSC2Factory(DictCachedSC2Factory, FileCachedSC2Factory):
     """
     :param cache_dir: Local directory to cache files in.
     :param cache_max_size: The max number of cache entries to hold in memory.
+    :param cache_max_bytes: The max total size in bytes of the cache entries
+        held in memory.
 
     Extends :class:`SC2Factory`.
 
     Caches remote depot resources to the file system AND holds a subset of them
     in memory for more efficient access.
     """
-    def __init__(self, cache_dir, cache_max_size=0, **options):
-        super(DoubleCachedSC2Factory, self).__init__(cache_max_size, cache_dir=cache_dir, **options)
+    def __init__(self, cache_dir, cache_max_size=0, cache_max_bytes=0, **options):
+        super(DoubleCachedSC2Factory, self).__init__(cache_max_size, cache_max_bytes, cache_dir=cache_dir, **options)
 
     def load_remote_resource_contents(self, remote_resource, **options):
         cache_key = self.get_remote_cache_key(remote_resource)
 
-        if DictCachedSC2Factory.cache_has(self, cache_key):
-            return DictCachedSC2Factory.cache_get(self, cache_key)
+        resource = DictCachedSC2Factory.cache_lookup(self, cache_key)
+        if resource is not None:
+            return resource
 
-        if not FileCachedSC2Factory.cache_has(self, cache_key):
+        resource = FileCachedSC2Factory.cache_lookup(self, cache_key)
+        if resource is None:
             resource = SC2Factory.load_remote_resource_contents(self, remote_resource, **options)
             FileCachedSC2Factory.cache_set(self, cache_key, resource)
-        else:
-            resource = FileCachedSC2Factory.cache_get(self, cache_key)
 
         DictCachedSC2Factory.cache_set(self, cache_key, resource)
         return resource
@@ -2,6 +2,7 @@
 from __future__ import absolute_import, print_function, unicode_literals, division
 
 import struct
+from collections import deque
 
 from sc2reader.exceptions import ParseError, ReadError
 from sc2reader.objects import *
@@ -10,6 +11,7 @@ from sc2reader.events.message import *
 from sc2reader.events.tracker import *
 from sc2reader.utils import AttributeDict, DepotFile
 from sc2reader.decoders import BitPackedDecoder, ByteDecoder
+from sc2reader.schema import compile_parser, compile_skipper, Struct, Array, Optional, Choice, Named, Null, Bool, Bits, Bytes, String, Blob, SelectionMask, Uint8, Uint16, Uint32, Int8, Int32
 
 
 class Reader(object):
@@ -23,7 +25,7 @@ class Reader(object):
 class InitDataReader_Base(Reader):
 
     def __call__(self, data, replay):
-        data = BitPackedDecoder(data)
+        data = replay.decoder(data)
         return dict(
             player_init_data=[dict(
                 name=data.read_aligned_bytes(data.read_uint8()),
@@ -120,7 +122,7 @@ class InitDataReader_Base(Reader):
 class InitDataReader_16561(InitDataReader_Base):
 
     def __call__(self, data, replay):
-        data = BitPackedDecoder(data)
+        data = replay.decoder(data)
         return dict(
             player_init_data=[dict(
                 name=data.read_aligned_string(data.read_uint8()),
@@ -217,7 +219,7 @@ class InitDataReader_16561(InitDataReader_Base):
 class InitDataReader_17326(InitDataReader_16561):
 
     def __call__(self, data, replay):
-        data = BitPackedDecoder(data)
+        data = replay.decoder(data)
         return dict(
             player_init_data=[dict(
                 name=data.read_aligned_string(data.read_uint8()),
@@ -314,7 +316,7 @@ class InitDataReader_17326(InitDataReader_16561):
 class InitDataReader_19132(InitDataReader_17326):
 
     def __call__(self, data, replay):
-        data = BitPackedDecoder(data)
+        data = replay.decoder(data)
         return dict(
             player_init_data=[dict(
                 name=data.read_aligned_string(data.read_uint8()),
@@ -411,7 +413,7 @@ class InitDataReader_19132(InitDataReader_17326):
 class InitDataReader_22612(InitDataReader_19132):
 
     def __call__(self, data, replay):
-        data = BitPackedDecoder(data)
+        data = replay.decoder(data)
         return dict(
             player_init_data=[dict(
                 name=data.read_aligned_string(data.read_uint8()),
@@ -508,7 +510,7 @@ class InitDataReader_22612(InitDataReader_19132):
 class InitDataReader_23925(InitDataReader_22612):
 
     def __call__(self, data, replay):
-        data = BitPackedDecoder(data)
+        data = replay.decoder(data)
         return dict(
             player_init_data=[dict(
                 name=data.read_aligned_string(data.read_uint8()),
@@ -605,7 +607,7 @@ class InitDataReader_23925(InitDataReader_22612):
 class InitDataReader_24764(InitDataReader_22612):
 
     def __call__(self, data, replay):
-        data = BitPackedDecoder(data)
+        data = replay.decoder(data)
         return dict(
             player_init_data=[dict(
                 name=data.read_aligned_string(data.read_uint8()),
@@ -743,7 +745,7 @@ class AttributesEventsReader_17326(AttributesEventsReader_Base):
 class DetailsReader(Reader):
 
     def __call__(self, data, replay):
-        details = BitPackedDecoder(data).read_struct()
+        details = replay.decoder(data).read_struct()
         return dict(
             players=[dict(
                 name=p[0].decode('utf8'),
@@ -794,11 +796,16 @@ class MessageEventsReader_Base(Reader):
         # The replay.message.events file is a single long list containing three
         # different element types (minimap pings, player messages, and some sort
         # of network packets); each differentiated by flags.
-        data = BitPackedDecoder(data)
+        data = replay.decoder(data)
         pings = list()
         messages = list()
         packets = list()
 
+        event_filter = replay.event_filter
+        keep_pings = event_filter is None or event_filter.keep(PingEvent)
+        keep_packets = event_filter is None or event_filter.keep(PacketEvent)
+        keep_messages = event_filter is None or event_filter.keep(ChatEvent)
+
         frame = 0
         while not data.done():
             # All the element types share the same time, pid, flags header.
@@ -811,11 +818,13 @@ class MessageEventsReader_Base(Reader):
                 # We need some tests for this, probably not right
                 x = data.read_uint32()
                 y = data.read_uint32()
-                pings.append(PingEvent(frame, pid, flags, x, y))
+                if keep_pings:
+                    pings.append(PingEvent(frame, pid, flags, x, y))
 
             elif flags == 0x80:
                 info = data.read_bytes(4)
-                packets.append(PacketEvent(frame, pid, flags, info))
+                if keep_packets:
+                    packets.append(PacketEvent(frame, pid, flags, info))
 
             elif flags & 0x80 == 0:
                 lo_mask = 2**self.TARGET_BITS-1
@@ -824,7 +833,8 @@ class MessageEventsReader_Base(Reader):
                 extension = (flags & hi_mask) << 3
                 length = data.read_uint8()
                 text = data.read_aligned_string(length + extension)
-                messages.append(ChatEvent(frame, pid, flags, target, text, (flags, lo_mask, hi_mask, length, extension)))
+                if keep_messages:
+                    messages.append(ChatEvent(frame, pid, flags, target, text, (flags, lo_mask, hi_mask, length, extension)))
 
         return AttributeDict(pings=pings, messages=messages, packets=packets)
 
@@ -833,9 +843,27 @@ class MessageEventsReader_Beta_24247(MessageEventsReader_Base):
     TARGET_BITS = 4
 
 
+#: The event classes that the event factory functions in the game event
+#: dispatch tables can create
+EVENT_FACTORY_CLASSES = {
+    create_command_event: [AbilityEvent, LocationAbilityEvent, TargetAbilityEvent, SelfAbilityEvent],
+    create_control_group_event: [HotkeyEvent, SetToHotkeyEvent, AddToHotkeyEvent, GetFromHotkeyEvent],
+}
+
+
 class GameEventsReader_Base(Reader):
 
+    #: Maps event parser names to schemas describing the event data. Each
+    #: subclass only needs to list the events that changed in its build. The
+    #: schemas are compiled into parsers once per class, see
+    #: :meth:`compile_schemas`, and take the place of parser methods.
+    EVENT_SCHEMAS = dict()
+
     def __init__(self):
+        # Compiled parsers are installed over any inherited parser methods
+        for name, parser in self.compile_schemas().items():
+            setattr(self, name, parser)
+
         self.EVENT_DISPATCH = {
             0: (None, self.unknown_event),
             5: (None, self.finished_loading_sync_event),
@@ -914,18 +942,87 @@ class GameEventsReader_Base(Reader):
             96: (None, self.trigger_game_credits_finished_event),
         }
 
+    @classmethod
+    def compile_schemas(cls):
+        """ Returns a dict of parser functions compiled from the schemas that
+        apply to this class. A schema in a subclass overrides both schemas
+        and parser methods from its parents and vice versa.
+        """
+        if '_compiled_schemas' not in cls.__dict__:
+            cls._compiled_schemas = dict((name, compile_parser(name, schema)) for name, schema in cls._get_schemas().items())
+        return cls._compiled_schemas
+
+    @classmethod
+    def compile_skippers(cls):
+        """ Returns a dict of functions compiled from the same schemas as
+        :meth:`compile_schemas` that move past an event without building it.
+        """
+        if '_compiled_skippers' not in cls.__dict__:
+            cls._compiled_skippers = dict((name, compile_skipper(name, schema)) for name, schema in cls._get_schemas().items())
+        return cls._compiled_skippers
+
+    @classmethod
+    def _get_schemas(cls):
+        schemas = dict()
+        names = set(name for klass in cls.__mro__ for name in klass.__dict__.get('EVENT_SCHEMAS', ()))
+        for name in names:
+            for klass in cls.__mro__:
+                schema = klass.__dict__.get('EVENT_SCHEMAS', {}).get(name)
+                if schema is not None:
+                    schemas[name] = schema
+                    break
+                elif name in klass.__dict__:
+                    break  # A hand written parser method
+        return schemas
+
+    def get_dispatch(self, event_filter=None):
+        """ Returns the event dispatch table to use with the given
+        :class:`~sc2reader.events.base.EventFilter`. Events that are never
+        kept, including the ones sc2reader doesn't use, are skipped over
+        without building their data. Returns the table and a flag that is True
+        when some kinds of events still need to be filtered once built.
+        """
+        skippers = self.compile_skippers()
+        dispatch = dict()
+        filter_built = False
+        for event_type, (event_class, event_parser) in self.EVENT_DISPATCH.items():
+            if event_class is not None and event_filter is not None:
+                keep = [event_filter.keep(cls) for cls in EVENT_FACTORY_CLASSES.get(event_class, [event_class])]
+                if not any(keep):
+                    event_class = None
+                elif not all(keep):
+                    filter_built = True
+
+            if event_class is None and event_parser is not None:
+                event_parser = skippers.get(event_parser.__name__, event_parser)
+            dispatch[event_type] = (event_class, event_parser)
+        return dispatch, filter_built
+
     def __call__(self, data, replay):
-        data = BitPackedDecoder(data)
         game_events = list()
+        try:
+            game_events.extend(self.iter_events(data, replay))
+        except ReadError as e:
+            # Include everything read up to the error
+            e.game_events = game_events
+            raise
+        return game_events
+
+    def iter_events(self, data, replay):
+        """ Yields the game events as they are read. Only the last few events
+        are kept for the ReadError raised when the data can't be read. """
+        data = replay.decoder(data)
+        recent_events = deque(maxlen=5)
+        event_filter = replay.event_filter
+        EVENT_DISPATCH, filter_built = self.get_dispatch(event_filter)
 
         # method short cuts, avoid dict lookups
-        EVENT_DISPATCH = self.EVENT_DISPATCH
         debug = replay.opt.debug
         tell = data.tell
         read_frames = data.read_frames
         read_bits = data.read_bits
         byte_align = data.byte_align
-        append = game_events.append
+        remember = recent_events.append
 
         try:
             fstamp = 0
@@ -940,137 +1037,333 @@ class GameEventsReader_Base(Reader):
                     event_data = event_parser(data)
                     if event_class is not None:
                         event = event_class(fstamp, pid, event_data)
-                        append(event)
                         if debug:
                             event.bytes = data.read_range(event_start, tell())
+                        if not filter_built or event_filter.keep(type(event)):
+                            remember(event)
+                            yield event
                     else:
-                        pass  # Skipping unused events
+                        pass  # Skipping unused or filtered events
 
                 # Otherwise throw a read error
                 else:
-                    raise ReadError("Event type {0} unknown at position {1}.".format(hex(event_type), hex(event_start)), event_type, event_start, replay, game_events, data)
+                    raise ReadError("Event type {0} unknown at position {1}.".format(hex(event_type), hex(event_start)), event_type, event_start, replay, list(recent_events), data)
 
                 byte_align()
                 event_start = tell()
 
-            return game_events
         except ParseError as e:
-            raise ReadError("Parse error '{0}' unknown at position {1}.".format(e.msg, hex(event_start)), event_type, event_start, replay, game_events, data)
+            raise ReadError("Parse error '{0}' unknown at position {1}.".format(e.msg, hex(event_start)), event_type, event_start, replay, list(recent_events), data)
         except EOFError as e:
-            raise ReadError("EOFError error '{0}' unknown at position {1}.".format(e.msg, hex(event_start)), event_type, event_start, replay, game_events, data)
-
-    # Don't want to do this more than once
-    SINGLE_BIT_MASKS = [0x1 << i for i in range(2**9)]
-
-    def read_selection_bitmask(self, data, mask_length):
-        bits_left = mask_length
-        bits = data.read_bits(mask_length)
-        mask = list()
-        shift_diff = (mask_length+data._bit_shift) % 8 - data._bit_shift
-        if shift_diff > 0:
-            mask = [bits & data._lo_masks[shift_diff]]
-            bits = bits >> shift_diff
-            bits_left -= shift_diff
-        elif shift_diff < 0:
-            mask = [bits & data._lo_masks[8+shift_diff]]
-            bits = bits >> (8+shift_diff)
-            bits_left -= 8+shift_diff
-
-        # Now shift the rest of the bits off into the mask in byte-sized
-        # chunks in reverse order. No idea why it'd be stored like this.
-        while bits_left != 0:
-            mask.insert(0, bits & 0xFF)
-            bits = bits >> 8
-            bits_left -= 8
-
-        # Compile the finished mask into a large integer for bit checks
-        bit_mask = sum([c << (i*8) for i, c in enumerate(mask)])
-
-        # Change mask representation from an int to a bit array with
-        # True => Deselect, False => Keep
-        return [(bit_mask & bit != 0) for bit in self.SINGLE_BIT_MASKS[:mask_length]]
+            raise ReadError("EOFError error '{0}' unknown at position {1}.".format(e.msg, hex(event_start)), event_type, event_start, replay, list(recent_events), data)
+
+
+# Schema pieces shared by several builds of the game events
+_POINT = Struct(('x', Int32), ('y', Int32), ('z', Int32))
+_MAP_POINT = Struct(('x', Bits(20)), ('y', Bits(20)), ('z', Int32))
+
+
+def _remove_mask_schema(count):
+    return Choice(Bits(2), {
+        0: ('None', Null),
+        1: ('Mask', SelectionMask(count)),
+        2: ('OneIndices', Array(count, count)),
+        3: ('ZeroIndices', Array(count, count)),
+    })
+
+
+def _command_event_schema(flag_bits, control_player_id):
+    return Struct(
+        ('flags', Bits(flag_bits)),
+        ('ability', Optional(Struct(
+            ('ability_link', Uint16),
+            ('ability_command_index', Bits(5)),
+            ('ability_command_data', Optional(Uint8)),
+        ))),
+        ('data', Choice(Bits(2), {
+            0: ('None', Null),
+            1: ('TargetPoint', Struct(
+                ('point', _MAP_POINT),
+            )),
+            2: ('TargetUnit', Struct(
+                ('flags', Uint8),
+                ('timer', Uint8),
+                ('unit_tag', Uint32),
+                ('unit_link', Uint16),
+                ('control_player_id', control_player_id),
+                ('upkeep_player_id', Optional(Bits(4))),
+                ('point', _MAP_POINT),
+            )),
+            3: ('Data', Struct(('data', Uint32))),
+        })),
+        ('other_unit_tag', Optional(Uint32)),
+    )
 
 
 class GameEventsReader_15405(GameEventsReader_Base):
 
-    def unknown_event(self, data):
-        return dict(
-            unknown=data.read_bytes(2)
-        )
-
-    def finished_loading_sync_event(self, data):
-        return None
-
-    def bank_file_event(self, data):
-        return dict(
-            name=data.read_aligned_string(data.read_bits(7)),
-        )
-
-    def bank_section_event(self, data):
-        return dict(
-            name=data.read_aligned_string(data.read_bits(6)),
-        )
-
-    def bank_key_event(self, data):
-        return dict(
-            name=data.read_aligned_string(data.read_bits(6)),
-            type=data.read_uint32(),
-            data=data.read_aligned_bytes(data.read_bits(7)),
-        )
-
-    def bank_value_event(self, data):
-        return dict(
-            type=data.read_uint32(),
-            name=data.read_aligned_string(data.read_bits(6)),
-            data=data.read_aligned_bytes(data.read_bits(12)),
-        )
-
-    def bank_signature_event(self, data):
-        return dict(
-            signature=[data.read_uint8() for i in range(data.read_bits(4))],
-            toon_handle=None,
-        )
-
-    def user_options_event(self, data):
-        return dict(
+    EVENT_SCHEMAS = dict(
+        unknown_event=Struct(
+            ('unknown', Bytes(2)),
+        ),
+        finished_loading_sync_event=Null,
+        bank_file_event=Struct(
+            ('name', String(Bits(7))),
+        ),
+        bank_section_event=Struct(
+            ('name', String(Bits(6))),
+        ),
+        bank_key_event=Struct(
+            ('name', String(Bits(6))),
+            ('type', Uint32),
+            ('data', Blob(Bits(7))),
+        ),
+        bank_value_event=Struct(
+            ('type', Uint32),
+            ('name', String(Bits(6))),
+            ('data', Blob(Bits(12))),
+        ),
+        bank_signature_event=Struct(
+            ('signature', Array(Bits(4), Uint8)),
+            ('toon_handle', Null),
+        ),
+        user_options_event=Struct(
             # I'm just guessing which flags are available here
-            game_fully_downloaded=None,
-            development_cheats_enabled=data.read_bool(),
-            multiplayer_cheats_enabled=data.read_bool(),
-            sync_checksumming_enabled=data.read_bool(),
-            is_map_to_map_transition=data.read_bool(),
-            use_ai_beacons=None,
-            debug_pause_enabled=None,
-            base_build_num=None,
-            starting_rally=None,
-        )
-
-    def save_game_event(self, data):
-        return dict(
-            file_name=data.read_aligned_string(data.read_bits(11)),
-            automatic=data.read_bool(),
-            overwrite=data.read_bool(),
-            name=data.read_aligned_string(data.read_uint8()),
-            description=data.read_aligned_string(data.read_bits(10)),
-        )
-
-    def save_game_done_event(self, data):
-        return None
-
-    def player_leave_event(self, data):
-        return None
-
-    def game_cheat_event(self, data):
-        return dict(
-            point=dict(
-                x=data.read_uint32()-2147483648,
-                y=data.read_uint32()-2147483648,
-            ),
-            time=data.read_uint32()-2147483648,
-            verb=data.read_aligned_string(data.read_bits(10)),
-            arguments=data.read_aligned_string(data.read_bits(10)),
-        )
-
+            ('game_fully_downloaded', Null),
+            ('development_cheats_enabled', Bool),
+            ('multiplayer_cheats_enabled', Bool),
+            ('sync_checksumming_enabled', Bool),
+            ('is_map_to_map_transition', Bool),
+            ('use_ai_beacons', Null),
+            ('debug_pause_enabled', Null),
+            ('base_build_num', Null),
+            ('starting_rally', Null),
+        ),
+        save_game_event=Struct(
+            ('file_name', String(Bits(11))),
+            ('automatic', Bool),
+            ('overwrite', Bool),
+            ('name', String(Uint8)),
+            ('description', String(Bits(10))),
+        ),
+        save_game_done_event=Null,
+        player_leave_event=Null,
+        game_cheat_event=Struct(
+            ('point', Struct(('x', Int32), ('y', Int32))),
+            ('time', Int32),
+            ('verb', String(Bits(10))),
+            ('arguments', String(Bits(10))),
+        ),
+        selection_delta_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('subgroup_index', Uint8),
+            ('remove_mask', Named('Mask', SelectionMask(Uint8))),
+            ('add_subgroups', Array(Uint8, Struct(
+                ('unit_link', Uint16),
+                ('subgroup_priority', Null),
+                ('intra_subgroup_priority', Uint8),
+                ('count', Uint8),
+            ))),
+            ('add_unit_tags', Array(Uint8, Uint32)),
+        ),
+        control_group_update_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('control_group_update', Bits(2)),
+            ('remove_mask', Choice(Bool, {
+                0: ('None', Null),
+                1: ('Mask', SelectionMask(Uint8)),
+            })),
+        ),
+        selection_sync_check_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('selection_sync_data', Struct(
+                ('count', Uint8),
+                ('subgroup_count', Uint8),
+                ('active_subgroup_index', Uint8),
+                ('unit_tags_checksum', Uint32),
+                ('subgroup_indices_checksum', Uint32),
+                ('subgroups_checksum', Uint32),
+            )),
+        ),
+        resource_trade_event=Struct(
+            ('recipient_id', Bits(4)),
+            ('resources', Array(Bits(3), Int32)),
+        ),
+        trigger_chat_message_event=Struct(
+            ('message', String(Bits(10))),
+        ),
+        ai_communicate_event=Struct(
+            ('beacon', Int8),
+            ('ally', Int8),
+            ('flags', Int8),
+            ('build', Null),
+            ('target_unit_tag', Uint32),
+            ('target_unit_link', Uint16),
+            ('target_upkeep_player_id', Optional(Bits(4))),
+            ('target_control_player_id', Null),
+            ('target_point', _POINT),
+        ),
+        set_absolute_game_speed_event=Struct(
+            ('speed', Bits(3)),
+        ),
+        add_absolute_game_speed_event=Struct(
+            ('delta', Int8),
+        ),
+        broadcast_cheat_event=Struct(
+            ('verb', String(Bits(10))),
+            ('arguments', String(Bits(10))),
+        ),
+        alliance_event=Struct(
+            ('alliance', Uint32),
+            ('control', Uint32),
+        ),
+        unit_click_event=Struct(
+            ('unit_tag', Uint32),
+        ),
+        unit_highlight_event=Struct(
+            ('unit_tag', Uint32),
+            ('flags', Uint8),
+        ),
+        trigger_reply_selected_event=Struct(
+            ('conversation_id', Int32),
+            ('reply_id', Int32),
+        ),
+        trigger_skipped_event=Null,
+        trigger_sound_length_query_event=Struct(
+            ('sound_hash', Uint32),
+            ('length', Uint32),
+        ),
+        trigger_sound_offset_event=Struct(
+            ('sound', Uint32),
+        ),
+        trigger_transmission_offset_event=Struct(
+            ('transmission_id', Int32),
+        ),
+        trigger_transmission_complete_event=Struct(
+            ('transmission_id', Int32),
+        ),
+        camera_update_event=Struct(
+            ('target', Struct(('x', Uint16), ('y', Uint16))),
+            ('distance', Optional(Uint16)),
+            ('pitch', Optional(Uint16)),
+            ('yaw', Optional(Uint16)),
+        ),
+        trigger_abort_mission_event=Null,
+        trigger_purchase_made_event=Struct(
+            ('purchase_item_id', Int32),
+        ),
+        trigger_purchase_exit_event=Null,
+        trigger_planet_mission_launched_event=Struct(
+            ('difficulty_level', Int32),
+        ),
+        trigger_planet_panel_canceled_event=Null,
+        trigger_dialog_control_event=Struct(
+            ('control_id', Int32),
+            ('event_type', Int32),
+            ('event_data', Choice(Bits(3), {
+                0: ('None', Null),
+                1: ('Checked', Bool),
+                2: ('ValueChanged', Uint32),
+                3: ('SelectionChanged', Int32),
+                4: ('TextChanged', String(Bits(11))),
+            })),
+        ),
+        trigger_sound_length_sync_event=Struct(
+            ('sync_info', Struct(
+                ('sound_hash', Array(Uint8, Uint32)),
+                ('length', Array(Uint8, Uint32)),
+            )),
+        ),
+        trigger_mouse_clicked_event=Struct(
+            ('button', Uint32),
+            ('down', Bool),
+            ('position_ui', Struct(('x', Uint32), ('y', Uint32))),
+            ('position_world', _POINT),
+        ),
+        trigger_planet_panel_replay_event=Null,
+        trigger_soundtrack_done_event=Struct(
+            ('soundtrack', Uint32),
+        ),
+        trigger_planet_mission_selected_event=Struct(
+            ('planet_id', Int32),
+        ),
+        trigger_key_pressed_event=Struct(
+            ('key', Int8),
+            ('flags', Int8),
+        ),
+        trigger_movie_function_event=Struct(
+            ('function_name', String(Bits(7))),
+        ),
+        trigger_planet_panel_birth_complete_event=Null,
+        trigger_planet_panel_death_complete_event=Null,
+        resource_request_event=Struct(
+            ('resources', Array(Bits(3), Int32)),
+        ),
+        resource_request_fulfill_event=Struct(
+            ('request_id', Int32),
+        ),
+        resource_request_cancel_event=Struct(
+            ('request_id', Int32),
+        ),
+        trigger_research_panel_exit_event=Null,
+        trigger_research_panel_purchase_event=Null,
+        trigger_research_panel_selection_changed_event=Struct(
+            ('item_id', Int32),
+        ),
+        lag_message_event=Struct(
+            ('player_id', Bits(4)),
+        ),
+        trigger_mercenary_panel_exit_event=Null,
+        trigger_mercenary_panel_purchase_event=Null,
+        trigger_mercenary_panel_selection_changed_event=Struct(
+            ('item_id', Int32),
+        ),
+        trigger_victory_panel_exit_event=Null,
+        trigger_battle_report_panel_exit_event=Null,
+        trigger_battle_report_panel_play_mission_event=Struct(
+            ('battle_report_id', Int32),
+            ('difficulty_level', Int32),
+        ),
+        trigger_battle_report_panel_play_scene_event=Struct(
+            ('battle_report_id', Int32),
+        ),
+        trigger_battle_report_panel_selection_changed_event=Struct(
+            ('battle_report_id', Int32),
+        ),
+        trigger_victory_panel_play_mission_again_event=Struct(
+            ('difficulty_level', Int32),
+        ),
+        trigger_movie_started_event=Null,
+        trigger_movie_finished_event=Null,
+        decrement_game_time_remaining_event=Struct(
+            ('decrement_ms', Uint32),
+        ),
+        trigger_portrait_loaded_event=Struct(
+            ('portrait_id', Int32),
+        ),
+        trigger_custom_dialog_dismissed_event=Struct(
+            ('result', Int32),
+        ),
+        trigger_game_menu_item_selected_event=Struct(
+            ('game_menu_item_index', Int32),
+        ),
+        trigger_camera_move_event=Struct(
+            ('reason', Int8),
+        ),
+        trigger_purchase_panel_selected_purchase_item_changed_event=Struct(
+            ('item_id', Int32),
+        ),
+        trigger_purchase_panel_selected_purchase_category_changed_event=Struct(
+            ('category_id', Int32),
+        ),
+        trigger_button_pressed_event=Struct(
+            ('button', Uint16),
+        ),
+        trigger_game_credits_finished_event=Null,
+    )
+
+    # The target unit is read before the other unit tag but stored inside
+    # the target data so this can't be described with a schema.
     def command_event(self, data):
         flags = data.read_uint32()
         ability = dict(
@@ -1102,423 +1395,37 @@ class GameEventsReader_15405(GameEventsReader_Base):
             other_unit_tag=other_unit_tag,
         )
 
-    def selection_delta_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            subgroup_index=data.read_uint8(),
-            remove_mask=('Mask', self.read_selection_bitmask(data, data.read_uint8())),
-            add_subgroups=[dict(
-                unit_link=data.read_uint16(),
-                subgroup_priority=None,
-                intra_subgroup_priority=data.read_uint8(),
-                count=data.read_uint8(),
-            ) for i in range(data.read_uint8())],
-            add_unit_tags=[data.read_uint32() for i in range(data.read_uint8())],
-        )
-
-    def control_group_update_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            control_group_update=data.read_bits(2),
-            remove_mask=('Mask', self.read_selection_bitmask(data, data.read_uint8())) if data.read_bool() else ('None', None),
-        )
-
-    def selection_sync_check_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            selection_sync_data=dict(
-                count=data.read_uint8(),
-                subgroup_count=data.read_uint8(),
-                active_subgroup_index=data.read_uint8(),
-                unit_tags_checksum=data.read_uint32(),
-                subgroup_indices_checksum=data.read_uint32(),
-                subgroups_checksum=data.read_uint32(),
-            )
-        )
-
-    def resource_trade_event(self, data):
-        return dict(
-            recipient_id=data.read_bits(4),
-            resources=[data.read_uint32()-2147483648 for i in range(data.read_bits(3))],
-        )
-
-    def trigger_chat_message_event(self, data):
-        return dict(
-            message=data.read_aligned_string(data.read_bits(10)),
-        )
-
-    def ai_communicate_event(self, data):
-        return dict(
-            beacon=data.read_uint8()-128,
-            ally=data.read_uint8()-128,
-            flags=data.read_uint8()-128,
-            build=None,
-            target_unit_tag=data.read_uint32(),
-            target_unit_link=data.read_uint16(),
-            target_upkeep_player_id=data.read_bits(4) if data.read_bool() else None,
-            target_control_player_id=None,
-            target_point=dict(
-                x=data.read_uint32()-2147483648,
-                y=data.read_uint32()-2147483648,
-                z=data.read_uint32()-2147483648,
-            ),
-        )
-
-    def set_absolute_game_speed_event(self, data):
-        return dict(
-            speed=data.read_bits(3),
-        )
-
-    def add_absolute_game_speed_event(self, data):
-        return dict(
-            delta=data.read_uint8()-128,
-        )
-
-    def broadcast_cheat_event(self, data):
-        return dict(
-            verb=data.read_aligned_string(data.read_bits(10)),
-            arguments=data.read_aligned_string(data.read_bits(10)),
-        )
-
-    def alliance_event(self, data):
-        return dict(
-            alliance=data.read_uint32(),
-            control=data.read_uint32(),
-        )
-
-    def unit_click_event(self, data):
-        return dict(
-            unit_tag=data.read_uint32(),
-        )
-
-    def unit_highlight_event(self, data):
-        return dict(
-            unit_tag=data.read_uint32(),
-            flags=data.read_uint8(),
-        )
-
-    def trigger_reply_selected_event(self, data):
-        return dict(
-            conversation_id=data.read_uint32()-2147483648,
-            reply_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_skipped_event(self, data):
-        return None
-
-    def trigger_sound_length_query_event(self, data):
-        return dict(
-            sound_hash=data.read_uint32(),
-            length=data.read_uint32(),
-        )
-
-    def trigger_sound_offset_event(self, data):
-        return dict(
-            sound=data.read_uint32(),
-        )
-
-    def trigger_transmission_offset_event(self, data):
-        return dict(
-            transmission_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_transmission_complete_event(self, data):
-        return dict(
-            transmission_id=data.read_uint32()-2147483648,
-        )
-
-    def camera_update_event(self, data):
-        return dict(
-            target=dict(
-                x=data.read_uint16(),
-                y=data.read_uint16(),
-            ),
-            distance=data.read_uint16() if data.read_bool() else None,
-            pitch=data.read_uint16() if data.read_bool() else None,
-            yaw=data.read_uint16() if data.read_bool() else None,
-        )
-
-    def trigger_abort_mission_event(self, data):
-        return None
-
-    def trigger_purchase_made_event(self, data):
-        return dict(
-            purchase_item_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_purchase_exit_event(self, data):
-        return None
-
-    def trigger_planet_mission_launched_event(self, data):
-        return dict(
-            difficulty_level=data.read_uint32()-2147483648,
-        )
-
-    def trigger_planet_panel_canceled_event(self, data):
-        return None
-
-    def trigger_dialog_control_event(self, data):
-        return dict(
-            control_id=data.read_uint32()-2147483648,
-            event_type=data.read_uint32()-2147483648,
-            event_data={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('Checked', data.read_bool()),
-                2: lambda: ('ValueChanged', data.read_uint32()),
-                3: lambda: ('SelectionChanged', data.read_uint32()-2147483648),
-                4: lambda: ('TextChanged', data.read_aligned_string(data.read_bits(11))),
-            }[data.read_bits(3)](),
-        )
-
-    def trigger_sound_length_sync_event(self, data):
-        return dict(
-            sync_info=dict(
-                sound_hash=[data.read_uint32() for i in range(data.read_uint8())],
-                length=[data.read_uint32() for i in range(data.read_uint8())],
-            )
-        )
-
     def trigger_conversation_skipped_event(self, data):
         return dict(
             skip_type=data.read_int(1),
         )
 
-    def trigger_mouse_clicked_event(self, data):
-        return dict(
-            button=data.read_uint32(),
-            down=data.read_bool(),
-            position_ui=dict(
-                x=data.read_uint32(),
-                y=data.read_uint32(),
-            ),
-            position_world=dict(
-                x=data.read_uint32()-2147483648,
-                y=data.read_uint32()-2147483648,
-                z=data.read_uint32()-2147483648,
-            ),
-        )
-
-    def trigger_planet_panel_replay_event(self, data):
-        return None
-
-    def trigger_soundtrack_done_event(self, data):
-        return dict(
-            soundtrack=data.read_uint32(),
-        )
-
-    def trigger_planet_mission_selected_event(self, data):
-        return dict(
-            planet_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_key_pressed_event(self, data):
-        return dict(
-            key=data.read_uint8()-128,
-            flags=data.read_uint8()-128,
-        )
-
-    def trigger_movie_function_event(self, data):
-        return dict(
-            function_name=data.read_aligned_string(data.read_bits(7)),
-        )
-
-    def trigger_planet_panel_birth_complete_event(self, data):
-        return None
-
-    def trigger_planet_panel_death_complete_event(self, data):
-        return None
-
-    def resource_request_event(self, data):
-        return dict(
-            resources=[data.read_uint32()-2147483648 for i in range(data.read_bits(3))],
-        )
-
-    def resource_request_fulfill_event(self, data):
-        return dict(
-            request_id=data.read_uint32()-2147483648,
-        )
-
-    def resource_request_cancel_event(self, data):
-        return dict(
-            request_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_research_panel_exit_event(self, data):
-        return None
-
-    def trigger_research_panel_purchase_event(self, data):
-        return None
-
-    def trigger_research_panel_selection_changed_event(self, data):
-        return dict(
-            item_id=data.read_uint32()-2147483648,
-        )
-
-    def lag_message_event(self, data):
-        return dict(
-            player_id=data.read_bits(4),
-        )
-
-    def trigger_mercenary_panel_exit_event(self, data):
-        return None
-
-    def trigger_mercenary_panel_purchase_event(self, data):
-        return None
-
-    def trigger_mercenary_panel_selection_changed_event(self, data):
-        return dict(
-            item_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_victory_panel_exit_event(self, data):
-        return None
-
-    def trigger_battle_report_panel_exit_event(self, data):
-        return None
-
-    def trigger_battle_report_panel_play_mission_event(self, data):
-        return dict(
-            battle_report_id=data.read_uint32()-2147483648,
-            difficulty_level=data.read_uint32()-2147483648,
-        )
-
-    def trigger_battle_report_panel_play_scene_event(self, data):
-        return dict(
-            battle_report_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_battle_report_panel_selection_changed_event(self, data):
-        return dict(
-            battle_report_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_victory_panel_play_mission_again_event(self, data):
-        return dict(
-            difficulty_level=data.read_uint32()-2147483648,
-        )
-
-    def trigger_movie_started_event(self, data):
-        return None
-
-    def trigger_movie_finished_event(self, data):
-        return None
-
-    def decrement_game_time_remaining_event(self, data):
-        return dict(
-            decrement_ms=data.read_uint32(),
-        )
-
-    def trigger_portrait_loaded_event(self, data):
-        return dict(
-            portrait_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_custom_dialog_dismissed_event(self, data):
-        return dict(
-            result=data.read_uint32()-2147483648,
-        )
-
-    def trigger_game_menu_item_selected_event(self, data):
-        return dict(
-            game_menu_item_index=data.read_uint32()-2147483648,
-        )
-
-    def trigger_camera_move_event(self, data):
-        return dict(
-            reason=data.read_uint8()-128,
-        )
-
-    def trigger_purchase_panel_selected_purchase_item_changed_event(self, data):
-        return dict(
-            item_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_purchase_panel_selected_purchase_category_changed_event(self, data):
-        return dict(
-            category_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_button_pressed_event(self, data):
-        return dict(
-            button=data.read_uint16(),
-        )
-
-    def trigger_game_credits_finished_event(self, data):
-        return None
-
 
 class GameEventsReader_16561(GameEventsReader_15405):
 
-    def command_event(self, data):
-        return dict(
-            flags=data.read_bits(17),
-            ability=dict(
-                ability_link=data.read_uint16(),
-                ability_command_index=data.read_bits(5),
-                ability_command_data=data.read_uint8() if data.read_bool() else None,
-            ) if data.read_bool() else None,
-            data={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('TargetPoint', dict(
-                    point=dict(
-                        x=data.read_bits(20),
-                        y=data.read_bits(20),
-                        z=data.read_uint32()-2147483648,
-                    )
-                )),
-                2: lambda: ('TargetUnit', dict(
-                    flags=data.read_uint8(),
-                    timer=data.read_uint8(),
-                    unit_tag=data.read_uint32(),
-                    unit_link=data.read_uint16(),
-                    control_player_id=None,
-                    upkeep_player_id=data.read_bits(4) if data.read_bool() else None,
-                    point=dict(
-                        x=data.read_bits(20),
-                        y=data.read_bits(20),
-                        z=data.read_uint32()-2147483648,
-                    ),
-                )),
-                3: lambda: ('Data', dict(data=data.read_uint32())),
-            }[data.read_bits(2)](),
-            other_unit_tag=data.read_uint32() if data.read_bool() else None
-        )
-
-    def selection_delta_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            subgroup_index=data.read_uint8(),
-            remove_mask={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('Mask', self.read_selection_bitmask(data, data.read_uint8())),
-                2: lambda: ('OneIndices', [data.read_uint8() for i in range(data.read_uint8())]),
-                3: lambda: ('ZeroIndices', [data.read_uint8() for i in range(data.read_uint8())]),
-            }[data.read_bits(2)](),
-            add_subgroups=[dict(
-                unit_link=data.read_uint16(),
-                subgroup_priority=None,
-                intra_subgroup_priority=data.read_uint8(),
-                count=data.read_uint8(),
-            ) for i in range(data.read_uint8())],
-            add_unit_tags=[data.read_uint32() for i in range(data.read_uint8())],
-        )
-
-    def control_group_update_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            control_group_update=data.read_bits(2),
-            remove_mask={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('Mask', self.read_selection_bitmask(data, data.read_uint8())),
-                2: lambda: ('OneIndices', [data.read_uint8() for i in range(data.read_uint8())]),
-                3: lambda: ('ZeroIndices', [data.read_uint8() for i in range(data.read_uint8())]),
-            }[data.read_bits(2)](),
-        )
-
-    def decrement_game_time_remaining_event(self, data):
-        return dict(
-            decrement_ms=data.read_bits(19)
-        )
+    EVENT_SCHEMAS = dict(
+        command_event=_command_event_schema(17, Null),
+        selection_delta_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('subgroup_index', Uint8),
+            ('remove_mask', _remove_mask_schema(Uint8)),
+            ('add_subgroups', Array(Uint8, Struct(
+                ('unit_link', Uint16),
+                ('subgroup_priority', Null),
+                ('intra_subgroup_priority', Uint8),
+                ('count', Uint8),
+            ))),
+            ('add_unit_tags', Array(Uint8, Uint32)),
+        ),
+        control_group_update_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('control_group_update', Bits(2)),
+            ('remove_mask', _remove_mask_schema(Uint8)),
+        ),
+        decrement_game_time_remaining_event=Struct(
+            ('decrement_ms', Bits(19)),
+        ),
+    )
 
 
 class GameEventsReader_16605(GameEventsReader_16561):
@@ -1535,6 +1442,23 @@ class GameEventsReader_16939(GameEventsReader_16755):
 
 class GameEventsReader_17326(GameEventsReader_16939):
 
+    EVENT_SCHEMAS = dict(
+        bank_signature_event=Struct(
+            ('signature', Array(Bits(5), Uint8)),
+            ('toon_handle', Null),
+        ),
+        trigger_mouse_clicked_event=Struct(
+            ('button', Uint32),
+            ('down', Bool),
+            ('position_ui', Struct(('x', Bits(11)), ('y', Bits(11)))),
+            ('position_world', _MAP_POINT),
+        ),
+        trigger_mouse_moved_event=Struct(
+            ('position_ui', Struct(('x', Bits(11)), ('y', Bits(11)))),
+            ('position_world', _MAP_POINT),
+        ),
+    )
+
     def __init__(self):
         super(GameEventsReader_17326, self).__init__()
 
@@ -1542,40 +1466,6 @@ class GameEventsReader_17326(GameEventsReader_16939):
             59: (None, self.trigger_mouse_moved_event),
         })
 
-    def bank_signature_event(self, data):
-        return dict(
-            signature=[data.read_uint8() for i in range(data.read_bits(5))],
-            toon_handle=None,
-        )
-
-    def trigger_mouse_clicked_event(self, data):
-        return dict(
-            button=data.read_uint32(),
-            down=data.read_bool(),
-            position_ui=dict(
-                x=data.read_bits(11),
-                y=data.read_bits(11),
-            ),
-            position_world=dict(
-                x=data.read_bits(20),
-                y=data.read_bits(20),
-                z=data.read_uint32()-2147483648,
-            ),
-        )
-
-    def trigger_mouse_moved_event(self, data):
-        return dict(
-            position_ui=dict(
-                x=data.read_bits(11),
-                y=data.read_bits(11),
-            ),
-            position_world=dict(
-                x=data.read_bits(20),
-                y=data.read_bits(20),
-                z=data.read_uint32()-2147483648,
-            ),
-        )
-
 
 class GameEventsReader_18092(GameEventsReader_17326):
     pass
@@ -1583,40 +1473,9 @@ class GameEventsReader_18092(GameEventsReader_17326):
 
 class GameEventsReader_18574(GameEventsReader_18092):
 
-    def command_event(self, data):
-        return dict(
-            flags=data.read_bits(18),
-            ability=dict(
-                ability_link=data.read_uint16(),
-                ability_command_index=data.read_bits(5),
-                ability_command_data=data.read_uint8() if data.read_bool() else None,
-            ) if data.read_bool() else None,
-            data={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('TargetPoint', dict(
-                    point=dict(
-                        x=data.read_bits(20),
-                        y=data.read_bits(20),
-                        z=data.read_uint32()-2147483648,
-                    )
-                )),
-                2: lambda: ('TargetUnit', dict(
-                    flags=data.read_uint8(),
-                    timer=data.read_uint8(),
-                    unit_tag=data.read_uint32(),
-                    unit_link=data.read_uint16(),
-                    control_player_id=None,
-                    upkeep_player_id=data.read_bits(4) if data.read_bool() else None,
-                    point=dict(
-                        x=data.read_bits(20),
-                        y=data.read_bits(20),
-                        z=data.read_uint32()-2147483648,
-                    ),
-                )),
-                3: lambda: ('Data', dict(data=data.read_uint32())),
-            }[data.read_bits(2)](),
-            other_unit_tag=data.read_uint32() if data.read_bool() else None
-        )
+    EVENT_SCHEMAS = dict(
+        command_event=_command_event_schema(18, Null),
+    )
 
 
 class GameEventsReader_19132(GameEventsReader_18574):
@@ -1625,57 +1484,20 @@ class GameEventsReader_19132(GameEventsReader_18574):
 
 class GameEventsReader_19595(GameEventsReader_19132):
 
-    def command_event(self, data):
-        return dict(
-            flags=data.read_bits(18),
-            ability=dict(
-                ability_link=data.read_uint16(),
-                ability_command_index=data.read_bits(5),
-                ability_command_data=data.read_uint8() if data.read_bool() else None,
-            ) if data.read_bool() else None,
-            data={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('TargetPoint', dict(
-                    point=dict(
-                        x=data.read_bits(20),
-                        y=data.read_bits(20),
-                        z=data.read_uint32()-2147483648,
-                    )
-                )),
-                2: lambda: ('TargetUnit', dict(
-                    flags=data.read_uint8(),
-                    timer=data.read_uint8(),
-                    unit_tag=data.read_uint32(),
-                    unit_link=data.read_uint16(),
-                    control_player_id=data.read_bits(4) if data.read_bool() else None,
-                    upkeep_player_id=data.read_bits(4) if data.read_bool() else None,
-                    point=dict(
-                        x=data.read_bits(20),
-                        y=data.read_bits(20),
-                        z=data.read_uint32()-2147483648,
-                    ),
-                )),
-                3: lambda: ('Data', dict(data=data.read_uint32())),
-            }[data.read_bits(2)](),
-            other_unit_tag=data.read_uint32() if data.read_bool() else None
-        )
-
-    def ai_communicate_event(self, data):
-        return dict(
-            beacon=data.read_uint8()-128,
-            ally=data.read_uint8()-128,
-            flags=data.read_uint8()-128,  # autocast??
-            build=None,
-            target_unit_tag=data.read_uint32(),
-            target_unit_link=data.read_uint16(),
-            target_upkeep_player_id=data.read_bits(4) if data.read_bool() else None,
-            target_control_player_id=data.read_bits(4) if data.read_bool() else None,
-            target_point=dict(
-                x=data.read_uint32()-2147483648,
-                y=data.read_uint32()-2147483648,
-                z=data.read_uint32()-2147483648,
-            ),
-        )
+    EVENT_SCHEMAS = dict(
+        command_event=_command_event_schema(18, Optional(Bits(4))),
+        ai_communicate_event=Struct(
+            ('beacon', Int8),
+            ('ally', Int8),
+            ('flags', Int8),  # autocast??
+            ('build', Null),
+            ('target_unit_tag', Uint32),
+            ('target_unit_link', Uint16),
+            ('target_upkeep_player_id', Optional(Bits(4))),
+            ('target_control_player_id', Optional(Bits(4))),
+            ('target_point', _POINT),
+        ),
+    )
 
 
 class GameEventsReader_21029(GameEventsReader_19595):
@@ -1684,6 +1506,89 @@ class GameEventsReader_21029(GameEventsReader_19595):
 
 class GameEventsReader_22612(GameEventsReader_21029):
 
+    EVENT_SCHEMAS = dict(
+        user_options_event=Struct(
+            ('game_fully_downloaded', Bool),
+            ('development_cheats_enabled', Bool),
+            ('multiplayer_cheats_enabled', Bool),
+            ('sync_checksumming_enabled', Bool),
+            ('is_map_to_map_transition', Bool),
+            ('use_ai_beacons', Bool),
+            ('debug_pause_enabled', Null),
+            ('base_build_num', Null),
+            ('starting_rally', Null),
+        ),
+        command_event=_command_event_schema(20, Optional(Bits(4))),
+        selection_delta_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('subgroup_index', Bits(9)),
+            ('remove_mask', _remove_mask_schema(Bits(9))),
+            ('add_subgroups', Array(Bits(9), Struct(
+                ('unit_link', Uint16),
+                ('subgroup_priority', Null),
+                ('intra_subgroup_priority', Uint8),
+                ('count', Bits(9)),
+            ))),
+            ('add_unit_tags', Array(Bits(9), Uint32)),
+        ),
+        control_group_update_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('control_group_update', Bits(2)),
+            ('remove_mask', _remove_mask_schema(Bits(9))),
+        ),
+        selection_sync_check_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('selection_sync_data', Struct(
+                ('count', Bits(9)),
+                ('subgroup_count', Bits(9)),
+                ('active_subgroup_index', Bits(9)),
+                ('unit_tags_checksum', Uint32),
+                ('subgroup_indices_checksum', Uint32),
+                ('subgroups_checksum', Uint32),
+            )),
+        ),
+        ai_communicate_event=Struct(
+            ('beacon', Int8),
+            ('ally', Int8),
+            ('flags', Int8),
+            ('build', Int8),
+            ('target_unit_tag', Uint32),
+            ('target_unit_link', Uint16),
+            ('target_upkeep_player_id', Uint8),
+            ('target_control_player_id', Uint8),
+            ('target_point', _POINT),
+        ),
+        trigger_ping_event=Struct(
+            ('point', Struct(('x', Int32), ('y', Int32))),
+            ('unit_tag', Uint32),
+            ('pinged_minimap', Bool),
+        ),
+        trigger_transmission_offset_event=Struct(
+            # I'm not actually sure when this second int is introduced..
+            ('transmission_id', Int32),
+            ('thread', Uint32),
+        ),
+        achievement_awarded_event=Struct(
+            ('achievement_link', Uint16),
+        ),
+        trigger_cutscene_bookmark_fired_event=Struct(
+            ('cutscene_id', Int32),
+            ('bookmark_name', String(Bits(7))),
+        ),
+        trigger_cutscene_end_scene_fired_event=Struct(
+            ('cutscene_id', Int32),
+        ),
+        trigger_cutscene_conversation_line_event=Struct(
+            ('cutscene_id', Int32),
+            ('conversation_line', String(Bits(7))),
+            ('alt_conversation_line', String(Bits(7))),
+        ),
+        trigger_cutscene_conversation_line_missing_event=Struct(
+            ('cutscene_id', Int32),
+            ('conversation_line', String(Bits(7))),
+        ),
+    )
+
     def __init__(self):
         super(GameEventsReader_22612, self).__init__()
 
@@ -1696,248 +1601,113 @@ class GameEventsReader_22612(GameEventsReader_21029):
             100: (None, self.trigger_cutscene_conversation_line_missing_event),
         })
 
-    def user_options_event(self, data):
-        return dict(
-            game_fully_downloaded=data.read_bool(),
-            development_cheats_enabled=data.read_bool(),
-            multiplayer_cheats_enabled=data.read_bool(),
-            sync_checksumming_enabled=data.read_bool(),
-            is_map_to_map_transition=data.read_bool(),
-            use_ai_beacons=data.read_bool(),
-            debug_pause_enabled=None,
-            base_build_num=None,
-            starting_rally=None,
-        )
-
-    def command_event(self, data):
-        return dict(
-            flags=data.read_bits(20),
-            ability=dict(
-                ability_link=data.read_uint16(),
-                ability_command_index=data.read_bits(5),
-                ability_command_data=data.read_uint8() if data.read_bool() else None,
-            ) if data.read_bool() else None,
-            data={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('TargetPoint', dict(
-                    point=dict(
-                        x=data.read_bits(20),
-                        y=data.read_bits(20),
-                        z=data.read_uint32()-2147483648,
-                    )
-                )),
-                2: lambda: ('TargetUnit', dict(
-                    flags=data.read_uint8(),
-                    timer=data.read_uint8(),
-                    unit_tag=data.read_uint32(),
-                    unit_link=data.read_uint16(),
-                    control_player_id=data.read_bits(4) if data.read_bool() else None,
-                    upkeep_player_id=data.read_bits(4) if data.read_bool() else None,
-                    point=dict(
-                        x=data.read_bits(20),
-                        y=data.read_bits(20),
-                        z=data.read_uint32()-2147483648,
-                    ),
-                )),
-                3: lambda: ('Data', dict(data=data.read_uint32())),
-            }[data.read_bits(2)](),
-            other_unit_tag=data.read_uint32() if data.read_bool() else None
-        )
-
-    def selection_delta_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            subgroup_index=data.read_bits(9),
-            remove_mask={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('Mask', self.read_selection_bitmask(data, data.read_bits(9))),
-                2: lambda: ('OneIndices', [data.read_bits(9) for i in range(data.read_bits(9))]),
-                3: lambda: ('ZeroIndices', [data.read_bits(9) for i in range(data.read_bits(9))]),
-            }[data.read_bits(2)](),
-            add_subgroups=[dict(
-                unit_link=data.read_uint16(),
-                subgroup_priority=None,
-                intra_subgroup_priority=data.read_uint8(),
-                count=data.read_bits(9),
-            ) for i in range(data.read_bits(9))],
-            add_unit_tags=[data.read_uint32() for i in range(data.read_bits(9))],
-        )
-
-    def control_group_update_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            control_group_update=data.read_bits(2),
-            remove_mask={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('Mask', self.read_selection_bitmask(data, data.read_bits(9))),
-                2: lambda: ('OneIndices', [data.read_bits(9) for i in range(data.read_bits(9))]),
-                3: lambda: ('ZeroIndices', [data.read_bits(9) for i in range(data.read_bits(9))]),
-            }[data.read_bits(2)](),
-        )
-
-    def selection_sync_check_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            selection_sync_data=dict(
-                count=data.read_bits(9),
-                subgroup_count=data.read_bits(9),
-                active_subgroup_index=data.read_bits(9),
-                unit_tags_checksum=data.read_uint32(),
-                subgroup_indices_checksum=data.read_uint32(),
-                subgroups_checksum=data.read_uint32(),
-            )
-        )
-
-    def ai_communicate_event(self, data):
-        return dict(
-            beacon=data.read_uint8()-128,
-            ally=data.read_uint8()-128,
-            flags=data.read_uint8()-128,
-            build=data.read_uint8()-128,
-            target_unit_tag=data.read_uint32(),
-            target_unit_link=data.read_uint16(),
-            target_upkeep_player_id=data.read_uint8(),
-            target_control_player_id=data.read_uint8(),
-            target_point=dict(
-                x=data.read_uint32()-2147483648,
-                y=data.read_uint32()-2147483648,
-                z=data.read_uint32()-2147483648,
-            ),
-        )
-
-    def trigger_ping_event(self, data):
-        return dict(
-            point=dict(
-                x=data.read_uint32()-2147483648,
-                y=data.read_uint32()-2147483648,
-            ),
-            unit_tag=data.read_uint32(),
-            pinged_minimap=data.read_bool(),
-        )
-
-    def trigger_transmission_offset_event(self, data):
-        # I'm not actually sure when this second int is introduced..
-        return dict(
-            transmission_id=data.read_uint32()-2147483648,
-            thread=data.read_uint32(),
-        )
-
-    def achievement_awarded_event(self, data):
-        return dict(
-            achievement_link=data.read_uint16(),
-        )
-
-    def trigger_cutscene_bookmark_fired_event(self, data):
-        return dict(
-            cutscene_id=data.read_uint32()-2147483648,
-            bookmark_name=data.read_aligned_string(data.read_bits(7)),
-        )
-
-    def trigger_cutscene_end_scene_fired_event(self, data):
-        return dict(
-            cutscene_id=data.read_uint32()-2147483648,
-        )
-
-    def trigger_cutscene_conversation_line_event(self, data):
-        return dict(
-            cutscene_id=data.read_uint32()-2147483648,
-            conversation_line=data.read_aligned_string(data.read_bits(7)),
-            alt_conversation_line=data.read_aligned_string(data.read_bits(7)),
-        )
-
-    def trigger_cutscene_conversation_line_missing_event(self, data):
-        return dict(
-            cutscene_id=data.read_uint32()-2147483648,
-            conversation_line=data.read_aligned_string(data.read_bits(7)),
-        )
-
 
 class GameEventsReader_23260(GameEventsReader_22612):
 
-    def trigger_sound_length_sync_event(self, data):
-        return dict(
-            sync_info=dict(
-                sound_hash=[data.read_uint32() for i in range(data.read_bits(7))],
-                length=[data.read_uint32() for i in range(data.read_bits(7))],
-            )
-        )
-
-    def user_options_event(self, data):
-        return dict(
-            game_fully_downloaded=data.read_bool(),
-            development_cheats_enabled=data.read_bool(),
-            multiplayer_cheats_enabled=data.read_bool(),
-            sync_checksumming_enabled=data.read_bool(),
-            is_map_to_map_transition=data.read_bool(),
-            starting_rally=data.read_bool(),
-            use_ai_beacons=data.read_bool(),
-            debug_pause_enabled=None,
-            base_build_num=None,
-        )
+    EVENT_SCHEMAS = dict(
+        trigger_sound_length_sync_event=Struct(
+            ('sync_info', Struct(
+                ('sound_hash', Array(Bits(7), Uint32)),
+                ('length', Array(Bits(7), Uint32)),
+            )),
+        ),
+        user_options_event=Struct(
+            ('game_fully_downloaded', Bool),
+            ('development_cheats_enabled', Bool),
+            ('multiplayer_cheats_enabled', Bool),
+            ('sync_checksumming_enabled', Bool),
+            ('is_map_to_map_transition', Bool),
+            ('starting_rally', Bool),
+            ('use_ai_beacons', Bool),
+            ('debug_pause_enabled', Null),
+            ('base_build_num', Null),
+        ),
+    )
 
 
 class GameEventsReader_HotSBeta(GameEventsReader_23260):
 
-    def user_options_event(self, data):
-        return dict(
-            game_fully_downloaded=data.read_bool(),
-            development_cheats_enabled=data.read_bool(),
-            multiplayer_cheats_enabled=data.read_bool(),
-            sync_checksumming_enabled=data.read_bool(),
-            is_map_to_map_transition=data.read_bool(),
-            starting_rally=data.read_bool(),
-            debug_pause_enabled=None,
-            base_build_num=data.read_uint32(),
-            use_ai_beacons=None,
-        )
-
-    def selection_delta_event(self, data):
-        return dict(
-            control_group_index=data.read_bits(4),
-            subgroup_index=data.read_bits(9),
-            remove_mask={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('Mask', self.read_selection_bitmask(data, data.read_bits(9))),
-                2: lambda: ('OneIndices', [data.read_bits(9) for i in range(data.read_bits(9))]),
-                3: lambda: ('ZeroIndices', [data.read_bits(9) for i in range(data.read_bits(9))]),
-            }[data.read_bits(2)](),
-            add_subgroups=[dict(
-                unit_link=data.read_uint16(),
-                subgroup_priority=data.read_uint8(),
-                intra_subgroup_priority=data.read_uint8(),
-                count=data.read_bits(9),
-            ) for i in range(data.read_bits(9))],
-            add_unit_tags=[data.read_uint32() for i in range(data.read_bits(9))],
-        )
-
-    def camera_update_event(self, data):
-        return dict(
-            target=dict(
-                x=data.read_uint16(),
-                y=data.read_uint16(),
-            ) if data.read_bool() else None,
-            distance=data.read_uint16() if data.read_bool() else None,
-            pitch=data.read_uint16() if data.read_bool() else None,
-            yaw=data.read_uint16() if data.read_bool() else None,
-        )
-
-    def trigger_dialog_control_event(self, data):
-        return dict(
-            control_id=data.read_uint32()-2147483648,
-            event_type=data.read_uint32()-2147483648,
-            event_data={  # Choice
-                0: lambda: ('None', None),
-                1: lambda: ('Checked', data.read_bool()),
-                2: lambda: ('ValueChanged', data.read_uint32()),
-                3: lambda: ('SelectionChanged', data.read_uint32()-2147483648),
-                4: lambda: ('TextChanged', data.read_aligned_string(data.read_bits(11))),
-                5: lambda: ('MouseButton', data.read_uint32())
-            }[data.read_bits(3)](),
-        )
+    EVENT_SCHEMAS = dict(
+        user_options_event=Struct(
+            ('game_fully_downloaded', Bool),
+            ('development_cheats_enabled', Bool),
+            ('multiplayer_cheats_enabled', Bool),
+            ('sync_checksumming_enabled', Bool),
+            ('is_map_to_map_transition', Bool),
+            ('starting_rally', Bool),
+            ('debug_pause_enabled', Null),
+            ('base_build_num', Uint32),
+            ('use_ai_beacons', Null),
+        ),
+        selection_delta_event=Struct(
+            ('control_group_index', Bits(4)),
+            ('subgroup_index', Bits(9)),
+            ('remove_mask', _remove_mask_schema(Bits(9))),
+            ('add_subgroups', Array(Bits(9), Struct(
+                ('unit_link', Uint16),
+                ('subgroup_priority', Uint8),
+                ('intra_subgroup_priority', Uint8),
+                ('count', Bits(9)),
+            ))),
+            ('add_unit_tags', Array(Bits(9), Uint32)),
+        ),
+        camera_update_event=Struct(
+            ('target', Optional(Struct(('x', Uint16), ('y', Uint16)))),
+            ('distance', Optional(Uint16)),
+            ('pitch', Optional(Uint16)),
+            ('yaw', Optional(Uint16)),
+        ),
+        trigger_dialog_control_event=Struct(
+            ('control_id', Int32),
+            ('event_type', Int32),
+            ('event_data', Choice(Bits(3), {
+                0: ('None', Null),
+                1: ('Checked', Bool),
+                2: ('ValueChanged', Uint32),
+                3: ('SelectionChanged', Int32),
+                4: ('TextChanged', String(Bits(11))),
+                5: ('MouseButton', Uint32),
+            })),
+        ),
+    )
 
 
 class GameEventsReader_24247(GameEventsReader_HotSBeta):
 
+    EVENT_SCHEMAS = dict(
+        bank_signature_event=Struct(
+            ('signature', Array(Bits(5), Uint8)),
+            ('toon_handle', String(Bits(7))),
+        ),
+        camera_save_event=Struct(
+            ('which', Bits(3)),
+            ('target', Struct(('x', Uint16), ('y', Uint16))),
+        ),
+        load_game_done_event=Null,
+        hijack_replay_game_event=Struct(
+            ('user_infos', Array(Bits(5), Struct(
+                ('game_unit_id', Bits(4)),
+                ('observe', Bits(2)),
+                ('name', String(Uint8)),
+                ('toon_handle', Optional(String(Bits(7)))),
+                ('clan_tag', Optional(String(Uint8))),
+            ))),
+            ('method', Bits(1)),
+        ),
+        trigger_target_mode_update_event=Struct(
+            ('ability_link', Uint16),
+            ('ability_command_index', Bits(5)),
+            ('state', Int8),
+        ),
+        game_user_leave_event=Null,
+        game_user_join_event=Struct(
+            ('observe', Bits(2)),
+            ('name', String(Bits(8))),
+            ('toon_handle', Optional(String(Bits(7)))),
+            ('clan_tag', Optional(String(Uint8))),
+        ),
+    )
+
     def __init__(self):
         super(GameEventsReader_24247, self).__init__()
 
@@ -1961,99 +1731,23 @@ class GameEventsReader_24247(GameEventsReader_HotSBeta):
         del self.EVENT_DISPATCH[25]
         del self.EVENT_DISPATCH[76]
 
-    def bank_signature_event(self, data):
-        return dict(
-            signature=[data.read_uint8() for i in range(data.read_bits(5))],
-            toon_handle=data.read_aligned_string(data.read_bits(7))
-        )
-
-    def camera_save_event(self, data):
-        return dict(
-            which=data.read_bits(3),
-            target=dict(
-                x=data.read_uint16(),
-                y=data.read_uint16(),
-            )
-        )
-
-    def load_game_done_event(self, data):
-        return None
-
-    def hijack_replay_game_event(self, data):
-        return dict(
-            user_infos=[dict(
-                game_unit_id=data.read_bits(4),
-                observe=data.read_bits(2),
-                name=data.read_aligned_string(data.read_uint8()),
-                toon_handle=data.read_aligned_string(data.read_bits(7)) if data.read_bool() else None,
-                clan_tag=data.read_aligned_string(data.read_uint8()) if data.read_bool() else None,
-            ) for i in range(data.read_bits(5))],
-            method=data.read_bits(1),
-        )
-
-    def trigger_target_mode_update_event(self, data):
-        return dict(
-            ability_link=data.read_uint16(),
-            ability_command_index=data.read_bits(5),
-            state=data.read_uint8()-128,
-        )
-
-    def game_user_leave_event(self, data):
-        return None
-
-    def game_user_join_event(self, data):
-        return dict(
-            observe=data.read_bits(2),
-            name=data.read_aligned_string(data.read_bits(8)),
-            toon_handle=data.read_aligned_string(data.read_bits(7)) if data.read_bool() else None,
-            clan_tag=data.read_aligned_string(data.read_uint8()) if data.read_bool() else None,
-        )
-
 
 class GameEventsReader_26490(GameEventsReader_24247):
 
-    def user_options_event(self, data):
-        return dict(
-            game_fully_downloaded=data.read_bool(),
-            development_cheats_enabled=data.read_bool(),
-            multiplayer_cheats_enabled=data.read_bool(),
-            sync_checksumming_enabled=data.read_bool(),
-            is_map_to_map_transition=data.read_bool(),
-            starting_rally=data.read_bool(),
-            debug_pause_enabled=None,
-            base_build_num=data.read_uint32(),
-            use_ai_beacons=None,
-        )
-
-    def trigger_mouse_clicked_event(self, data):
-        return dict(
-            button=data.read_uint32(),
-            down=data.read_bool(),
-            position_ui=dict(
-                x=data.read_uint32(),
-                y=data.read_uint32(),
-            ),
-            position_world=dict(
-                x=data.read_uint32()-2147483648,
-                y=data.read_uint32()-2147483648,
-                z=data.read_uint32()-2147483648,
-            ),
-            flags=data.read_uint8()-128,
-        )
-
-    def trigger_mouse_moved_event(self, data):
-        return dict(
-            position_ui=dict(
-                x=data.read_bits(11),
-                y=data.read_bits(11),
-            ),
-            position_world=dict(
-                x=data.read_bits(20),
-                y=data.read_bits(20),
-                z=data.read_uint32()-2147483648,
-            ),
-            flags=data.read_uint8()-128,
-        )
+    EVENT_SCHEMAS = dict(
+        trigger_mouse_clicked_event=Struct(
+            ('button', Uint32),
+            ('down', Bool),
+            ('position_ui', Struct(('x', Uint32), ('y', Uint32))),
+            ('position_world', _POINT),
+            ('flags', Int8),
+        ),
+        trigger_mouse_moved_event=Struct(
+            ('position_ui', Struct(('x', Bits(11)), ('y', Bits(11)))),
+            ('position_world', _MAP_POINT),
+            ('flags', Int8),
+        ),
+    )
 
 
 class TrackerEventsReader_Base(Reader):
@@ -2072,15 +1766,23 @@ class TrackerEventsReader_Base(Reader):
         }
 
     def __call__(self, data, replay):
-        decoder = BitPackedDecoder(data)
+        return list(self.iter_events(data, replay))
+
+    def iter_events(self, data, replay):
+        """ Yields the tracker events as they are read """
+        decoder = replay.decoder(data)
+
+        # Event types that are filtered out are skipped over without being built
+        skipped = set()
+        if replay.event_filter is not None:
+            skipped = set(etype for etype, event_class in self.EVENT_DISPATCH.items() if not replay.event_filter.keep(event_class))
 
         frames = 0
-        events = list()
         while not decoder.done():
             frames += decoder.read_struct()
             etype = decoder.read_struct()
+            if etype in skipped:
+                decoder.skip_struct()
+                continue
             event_data = decoder.read_struct()
-            event = self.EVENT_DISPATCH[etype](frames, event_data, replay.build)
-            events.append(event)
-
-        return events
+            yield self.EVENT_DISPATCH[etype](frames, event_data, replay.build)
@@ -4,6 +4,10 @@ from __future__ import absolute_import, print_function, unicode_literals, divisi
 from collections import defaultdict, namedtuple
 from datetime import datetime
 import hashlib
+import heapq
+import io
+from operator import attrgetter
+import pickle
 import sys
 from xml.etree import ElementTree
 import zlib
@@ -11,27 +15,74 @@ import zlib
 import mpyq
 import sc2reader
 from sc2reader import utils
-from sc2reader.decoders import BitPackedDecoder
+from sc2reader.decoders import DefaultBitPackedDecoder
 from sc2reader import log_utils
-from sc2reader import readers
 from sc2reader import exceptions
 from sc2reader.data import builds as datapacks
 from sc2reader.exceptions import SC2ReaderLocalizationError
 from sc2reader.objects import Participant, Observer, Computer, Team, PlayerSummary, Graph, BuildEntry, MapInfo
 from sc2reader.constants import REGIONS, GAME_SPEED_FACTOR, LOBBY_PROPERTIES
 
+try:
+    unicode
+except NameError:
+    unicode = str
+
 
 class Resource(object):
-    def __init__(self, file_object, filename=None, factory=None, **options):
+    def __init__(self, file_object, filename=None, factory=None, hash_file=True, **options):
         self.factory = factory
         self.opt = utils.AttributeDict(options)
         self.logger = log_utils.get_logger(self.__class__)
         self.filename = filename or getattr(file_object, 'name', 'Unavailable')
 
-        if hasattr(file_object, 'seek'):
-            file_object.seek(0)
-            self.filehash = hashlib.sha256(file_object.read()).hexdigest()
-            file_object.seek(0)
+        #: The :mod:`hashlib` algorithm :attr:`filehash` is computed with, set
+        #: with the ``hash_algorithm`` option. None when the file isn't hashed.
+        self.hash_algorithm = self.opt.get('hash_algorithm', 'sha256') if hash_file else None
+
+        # With the lazy_hash option the file is kept and hashed the first time
+        # filehash is used instead
+        self._filehash = None
+        self._hash_source = None
+        if self.hash_algorithm and hasattr(file_object, 'seek'):
+            if self.opt.get('lazy_hash', False):
+                self._hash_source = file_object
+            else:
+                self._filehash = self._hash_file(file_object)
+                file_object.seek(0)
+
+    def _reads_file(self):
+        # True while something is still to be read from the file
+        return self._hash_source is not None
+
+    @property
+    def filehash(self):
+        """ The hex digest of the file contents, None when the file wasn't hashed """
+        if self._hash_source is not None:
+            self._filehash = self._hash_file(self._hash_source)
+            self._hash_source = None
+        return self._filehash
+
+    @filehash.setter
+    def filehash(self, value):
+        self._filehash = value
+        self._hash_source = None
+
+    def _hash_file(self, file_object):
+        if hasattr(file_object, 'getbuffer'):
+            # BytesIO and mapped files can be hashed without copying them
+            return hashlib.new(self.hash_algorithm, file_object.getbuffer()).hexdigest()
+
+        position = file_object.tell()
+        file_object.seek(0)
+        filehash = hashlib.new(self.hash_algorithm, file_object.read()).hexdigest()
+        file_object.seek(position)
+        return filehash
+
+
+#: Stands for sc2reader.engine as the default engine of replays. The engine
+#: is only imported once a replay is run through it.
+DEFAULT_ENGINE = object()
 
 
 class Replay(Resource):
@@ -44,7 +95,10 @@ class Replay(Resource):
     #: Fully qualified filename of the replay file represented.
     filename = str()
 
-    #: Total number of frames in this game at 16 frames per second.
+    #: Total number of frames in this game at 16 frames per second. Raised to
+    #: the last game or message event when the game events are read, for
+    #: replays with events after the frames in the header. Lazy replays keep
+    #: the frames in the header until their game events are read.
     frames = int()
 
     #: The SCII client build number
@@ -124,9 +178,6 @@ class Replay(Resource):
     #: The gateway the game was played on: us, eu, sea, etc
     gateway = str()
 
-    #: An integrated list of all the game events
-    events = list()
-
     #: A list of :class:`Team` objects from the game
     teams = list()
 
@@ -184,11 +235,39 @@ class Replay(Resource):
     #: SC2 Expansion. One of 'WoL', 'HotS'
     expasion = str()
 
-    def __init__(self, replay_file, filename=None, load_level=4, engine=sc2reader.engine, **options):
-        super(Replay, self).__init__(replay_file, filename, **options)
+    def __init__(self, replay_file, filename=None, load_level=4, engine=DEFAULT_ENGINE, decoder=DefaultBitPackedDecoder, **options):
+        # Header only replays are for quick checks, the whole file isn't read
+        super(Replay, self).__init__(replay_file, filename, hash_file=load_level >= 0, **options)
         self.datapack = None
         self.raw_data = dict()
 
+        #: The bit packed decoder class used to read the replay's data files.
+        #: Defaults to the compiled decoder when it is available, see
+        #: :data:`~sc2reader.decoders.DefaultBitPackedDecoder`.
+        self.decoder = decoder
+
+        #: When True the game and tracker events are only read from the archive
+        #: the first time they are used instead of while the replay loads.
+        self.lazy_events = self.opt.get('lazy_events', False) or self.opt.get('stream_events', False)
+        self._pending_events = dict()
+
+        # Set once the frames have been checked against the last event
+        self._frames_checked = False
+
+        #: When True the engine runs over :meth:`iter_events`, so the game and
+        #: tracker events are handed to the plugins as they are read and aren't
+        #: kept on the replay. Implies ``lazy_events``.
+        self.stream_events = self.opt.get('stream_events', False)
+
+        #: The :class:`~sc2reader.events.base.EventFilter` built from the
+        #: ``event_types`` and ``exclude_event_types`` options. Events that
+        #: aren't kept are skipped over by the readers. None when all events
+        #: are read.
+        self.event_filter = None
+        if self.opt.get('event_types') is not None or self.opt.get('exclude_event_types'):
+            from sc2reader.events.base import EventFilter
+            self.event_filter = EventFilter(self.opt.get('event_types'), self.opt.get('exclude_event_types'))
+
         #default values, filled in during file read
         self.player_names = list()
         self.other_people = set()
@@ -222,6 +301,8 @@ class Replay(Resource):
         self.messages = list()
         self.recorder = None  # Player object
         self.packets = list()
+        self.pings = list()
+        self.message_events = list()
         self.objects = {}
         self.active_units = {}
         self.game_fps = 16.0
@@ -229,31 +310,38 @@ class Replay(Resource):
         self.tracker_events = list()
         self.game_events = list()
 
-        # Bootstrap the readers.
+        # Bootstrap the readers. Header only replays never read any data files
+        # and building the readers would take most of their load time.
         self.registered_readers = defaultdict(list)
-        self.register_default_readers()
+        if load_level >= 0:
+            self.register_default_readers()
 
         # Bootstrap the datapacks.
         self.registered_datapacks = list()
         self.register_default_datapacks()
 
-        # Unpack the MPQ and read header data if requested
+        # Unpack the MPQ and read header data if requested. Load level -1 reads
+        # the header straight from the file without opening the archive.
         # Since the underlying traceback isn't important to most people, don't expose it in python2 anymore
-        if load_level >= 0:
+        if load_level < 0:
+            self.archive = None
+            header_content = utils.read_user_data_header(replay_file)
+        else:
             try:
                 self.archive = mpyq.MPQArchive(replay_file, listfile=False)
             except Exception as e:
                 raise exceptions.MPQError("Unable to construct the MPQArchive", e)
 
             header_content = self.archive.header['user_data_header']['content']
-            header_data = BitPackedDecoder(header_content).read_struct()
-            self.versions = list(header_data[1].values())
-            self.frames = header_data[3]
-            self.build = self.versions[4]
-            self.base_build = self.versions[5]
-            self.release_string = "{0}.{1}.{2}.{3}".format(*self.versions[1:5])
-            self.game_length = utils.Length(seconds=self.frames/16)
-            self.length = self.real_length = utils.Length(seconds=int(self.frames/self.game_fps))
+
+        header_data = self.decoder(header_content).read_struct()
+        self.versions = list(header_data[1].values())
+        self.frames = header_data[3]
+        self.build = self.versions[4]
+        self.base_build = self.versions[5]
+        self.release_string = "{0}.{1}.{2}.{3}".format(*self.versions[1:5])
+        self.game_length = utils.Length(seconds=self.frames/16)
+        self.length = self.real_length = utils.Length(seconds=int(self.frames/self.game_fps))
 
         # Load basic details if requested
         if load_level >= 1:
@@ -275,18 +363,16 @@ class Replay(Resource):
 
         # Load events if requested
         if load_level >= 3:
-            for data_file in ['replay.game.events']:
-                self._read_data(data_file, self._get_reader(data_file))
-            self.load_game_events()
+            self._load_events('replay.game.events', self.load_game_events)
 
         # Load tracker events if requested
         if load_level >= 4:
-            for data_file in ['replay.tracker.events']:
-                self._read_data(data_file, self._get_reader(data_file))
-            self.load_tracker_events()
+            self._load_events('replay.tracker.events', self.load_tracker_events)
 
         # Run this replay through the engine as indicated
-        if engine:
+        if engine is DEFAULT_ENGINE:
+            engine = sc2reader.engine
+        if engine and load_level >= 0:
             engine.run(self)
 
     def load_details(self):
@@ -456,6 +542,90 @@ class Replay(Resource):
         if len(self.observers) > 0 or len(self.humans) != len(self.players):
             self.is_ladder = False
 
+    @property
+    def events(self):
+        """ An integrated list of all the events in frame order, see :meth:`merged_events` """
+        if self._events is None:
+            self._events = self.merged_events()
+        return self._events
+
+    @events.setter
+    def events(self, events):
+        self._events = events
+
+    @property
+    def game_events(self):
+        """ A list of all the game events. Lazy replays read them the first time they are used. """
+        self._load_pending_events('replay.game.events')
+        return self._game_events
+
+    @game_events.setter
+    def game_events(self, events):
+        self._game_events = events
+
+    @property
+    def tracker_events(self):
+        """ A list of all the tracker events. Lazy replays read them the first time they are used. """
+        self._load_pending_events('replay.tracker.events')
+        return self._tracker_events
+
+    @tracker_events.setter
+    def tracker_events(self, events):
+        self._tracker_events = events
+
+    def merged_events(self, game_events=True, tracker_events=True, message_events=True):
+        """ Returns the selected kinds of events merged into a single list in
+        frame order. Events that share a frame are ordered tracker events first,
+        then game events, then message events. Lazy replays only read the
+        events that were selected.
+        """
+        # Each source is already in frame order, so one stable sort of them laid
+        # end to end is a k-way merge that keeps the source order for ties. The
+        # sort finds the ordered runs and merges them in a single pass, which
+        # is quicker than merging with heapq.merge in python.
+        events = list()
+        if tracker_events:
+            events.extend(self.tracker_events)
+        if game_events:
+            events.extend(self.game_events)
+        if message_events:
+            events.extend(self.messages)
+            events.extend(self.pings)
+            events.extend(self.packets)
+        events.sort(key=attrgetter('frame'))
+        return events
+
+    def iter_events(self, game_events=True, tracker_events=True, message_events=True):
+        """ Yields the selected kinds of events in the same order as
+        :meth:`merged_events`. Game and tracker events that haven't been read
+        yet are read as they are yielded and aren't kept, so only a few events
+        are held in memory at a time.
+        """
+        sources = list()
+        if tracker_events:
+            sources.append(self._iter_data_events('replay.tracker.events', '_tracker_events'))
+        if game_events:
+            sources.append(self._iter_game_events())
+        if message_events:
+            sources.append(sorted(self.messages+self.pings+self.packets, key=attrgetter('frame')))
+        return _merge_events(sources)
+
+    def _reads_file(self):
+        return bool(self._pending_events) or super(Replay, self)._reads_file()
+
+    def has_attribute(self, name):
+        """ Returns True when the replay has the attribute and it isn't empty.
+        Game and tracker events that haven't been read yet are looked up in
+        the archive instead, so checking for them doesn't read them. The game
+        engine uses this for the ``requires`` of its plugins.
+        """
+        data_files = dict(game_events='replay.game.events', tracker_events='replay.tracker.events')
+        if name == 'events' and self._events is None:
+            return bool(self.messages or self.pings or self.packets) or self.has_attribute('game_events') or self.has_attribute('tracker_events')
+        if data_files.get(name) in self._pending_events:
+            return self._has_data_file(data_files[name])
+        return bool(getattr(self, name, None))
+
     def load_message_events(self):
         if 'replay.message.events' not in self.raw_data:
             return
@@ -465,7 +635,7 @@ class Replay(Resource):
         self.packets = self.raw_data['replay.message.events'].packets
 
         self.message_events = self.messages+self.pings+self.packets
-        self.events = sorted(self.events + self.message_events, key=lambda e: e.frame)
+        self._events = None
 
     def load_game_events(self):
         # Copy the events over
@@ -473,20 +643,17 @@ class Replay(Resource):
         if 'replay.game.events' not in self.raw_data:
             return
 
-        self.game_events = self.raw_data['replay.game.events']
-        self.events = sorted(self.game_events+self.events, key=lambda e: e.frame)
+        self._game_events = self.raw_data['replay.game.events']
+        self._events = None
 
-        # hideous hack for HotS 2.0.0.23925, see https://github.com/GraylinKim/sc2reader/issues/87
-        if self.events and self.events[-1].frame > self.frames:
-            self.frames = self.events[-1].frame
-            self.length = utils.Length(seconds=int(self.frames/self.game_fps))
+        self._fix_frames(self._game_events[-1].frame if self._game_events else 0)
 
     def load_tracker_events(self):
         if 'replay.tracker.events' not in self.raw_data:
             return
 
-        self.tracker_events = self.raw_data['replay.tracker.events']
-        self.events = sorted(self.tracker_events + self.events, key=lambda e: e.frame)
+        self._tracker_events = self.raw_data['replay.tracker.events']
+        self._events = None
 
     def register_reader(self, data_file, reader, filterfunc=lambda r: True):
         """
@@ -519,7 +686,8 @@ class Replay(Resource):
         This is how you would add mappings for your favorite custom map.
 
         :param datapack: A :class:`BaseData` object to use for mapping unit
-            types and ability codes to their corresponding classes.
+            types and ability codes to their corresponding classes, or a
+            function that returns one when the datapack is used.
 
         :param filterfunc: A function that accepts a partially loaded
             :class:`Replay` object as an argument and returns true if the
@@ -530,6 +698,7 @@ class Replay(Resource):
     # Override points
     def register_default_readers(self):
         """Registers factory default readers."""
+        from sc2reader import readers
         self.register_reader('replay.details', readers.DetailsReader(), lambda r: True)
         self.register_reader('replay.initData', readers.InitDataReader_Base(), lambda r: 15405 <= r.base_build < 16561)
         self.register_reader('replay.initData', readers.InitDataReader_16561(), lambda r: 16561 <= r.base_build < 17326)
@@ -556,17 +725,73 @@ class Replay(Resource):
         self.register_reader('replay.tracker.events', readers.TrackerEventsReader_Base(), lambda r: True)
 
     def register_default_datapacks(self):
-        """Registers factory default datapacks."""
-        self.register_datapack(datapacks['WoL']['16117'], lambda r: r.expansion == 'WoL' and 16117 <= r.build < 17326)
-        self.register_datapack(datapacks['WoL']['17326'], lambda r: r.expansion == 'WoL' and 17326 <= r.build < 18092)
-        self.register_datapack(datapacks['WoL']['18092'], lambda r: r.expansion == 'WoL' and 18092 <= r.build < 19458)
-        self.register_datapack(datapacks['WoL']['19458'], lambda r: r.expansion == 'WoL' and 19458 <= r.build < 22612)
-        self.register_datapack(datapacks['WoL']['22612'], lambda r: r.expansion == 'WoL' and 22612 <= r.build < 24944)
-        self.register_datapack(datapacks['WoL']['24944'], lambda r: r.expansion == 'WoL' and 24944 <= r.build)
-        self.register_datapack(datapacks['HotS']['base'], lambda r: r.expansion == 'HotS' and r.build < 23925)
-        self.register_datapack(datapacks['HotS']['23925'], lambda r: r.expansion == 'HotS' and 23925 <= r.build < 24247)
-        self.register_datapack(datapacks['HotS']['24247'], lambda r: r.expansion == 'HotS' and 24247 <= r.build <= 24764)
-        self.register_datapack(datapacks['HotS']['24764'], lambda r: r.expansion == 'HotS' and 24764 <= r.build)
+        """Registers factory default datapacks. They are built on first use."""
+        self.register_datapack(lambda: datapacks['WoL']['16117'], lambda r: r.expansion == 'WoL' and 16117 <= r.build < 17326)
+        self.register_datapack(lambda: datapacks['WoL']['17326'], lambda r: r.expansion == 'WoL' and 17326 <= r.build < 18092)
+        self.register_datapack(lambda: datapacks['WoL']['18092'], lambda r: r.expansion == 'WoL' and 18092 <= r.build < 19458)
+        self.register_datapack(lambda: datapacks['WoL']['19458'], lambda r: r.expansion == 'WoL' and 19458 <= r.build < 22612)
+        self.register_datapack(lambda: datapacks['WoL']['22612'], lambda r: r.expansion == 'WoL' and 22612 <= r.build < 24944)
+        self.register_datapack(lambda: datapacks['WoL']['24944'], lambda r: r.expansion == 'WoL' and 24944 <= r.build)
+        self.register_datapack(lambda: datapacks['HotS']['base'], lambda r: r.expansion == 'HotS' and r.build < 23925)
+        self.register_datapack(lambda: datapacks['HotS']['23925'], lambda r: r.expansion == 'HotS' and 23925 <= r.build < 24247)
+        self.register_datapack(lambda: datapacks['HotS']['24247'], lambda r: r.expansion == 'HotS' and 24247 <= r.build <= 24764)
+        self.register_datapack(lambda: datapacks['HotS']['24764'], lambda r: r.expansion == 'HotS' and 24764 <= r.build)
+
+    def __getstate__(self):
+        # Lazy events and hashes need the file, which isn't kept, so finish them now
+        for data_file in list(self._pending_events):
+            self._load_pending_events(data_file)
+        self.filehash
+
+        state = self.__dict__.copy()
+        for name in ('archive', 'factory', 'logger', 'registered_readers', 'registered_datapacks', '_pending_events', '_hash_source'):
+            state.pop(name, None)
+
+        # Events make up most of a replay. Each event is saved as a row of
+        # attribute values, with the attribute names kept once per layout, and
+        # everything else refers to the events by their position in the table.
+        events = self.merged_events()
+        layouts, kinds, rows = dict(), list(), list()
+        strings = dict()
+        for event in events:
+            attributes = event.__dict__
+            kinds.append(layouts.setdefault((event.__class__, tuple(attributes)), len(layouts)))
+            rows.append(tuple(strings.setdefault(value, value) if isinstance(value, unicode) else value for value in attributes.values()))
+
+        buf = io.BytesIO()
+        _EventPickler(buf, events).dump((rows, state))
+        return dict(
+            version=_PICKLE_VERSION,
+            layouts=sorted(layouts, key=layouts.get),
+            kinds=kinds,
+            data=buf.getvalue(),
+        )
+
+    def __setstate__(self, state):
+        if state.get('version') != _PICKLE_VERSION:
+            raise pickle.UnpicklingError("Unsupported replay pickle version {0}".format(state.get('version')))
+
+        # Create the events first so that references to them can be resolved
+        # while the rest of the replay is loaded.
+        layouts = state['layouts']
+        events = [layouts[kind][0].__new__(layouts[kind][0]) for kind in state['kinds']]
+        unpickler = pickle.Unpickler(io.BytesIO(state['data']))
+        unpickler.persistent_load = events.__getitem__
+        rows, replay_state = unpickler.load()
+        for event, kind, row in zip(events, state['kinds'], rows):
+            event.__dict__.update(zip(layouts[kind][1], row))
+
+        self.__dict__.update(replay_state)
+        self.archive = None
+        self.factory = None
+        self.logger = log_utils.get_logger(self.__class__)
+        self._pending_events = dict()
+        self._hash_source = None
+
+        self.registered_readers = defaultdict(list)
+        self.register_default_readers()
+        self.registered_datapacks = list()
+        self.register_default_datapacks()
 
     # Internal Methods
     def _get_reader(self, data_file):
@@ -579,10 +804,72 @@ class Replay(Resource):
     def _get_datapack(self):
         for callback, datapack in self.registered_datapacks:
             if callback(self):
-                return datapack
+                return datapack() if callable(datapack) else datapack
         else:
             return None
 
+    def _load_events(self, data_file, load):
+        if self.lazy_events:
+            self._pending_events[data_file] = load
+            self._events = None
+        else:
+            self._read_data(data_file, self._get_reader(data_file))
+            load()
+
+    def _load_pending_events(self, data_file):
+        load = self._pending_events.pop(data_file, None)
+        if load is not None:
+            self._read_data(data_file, self._get_reader(data_file))
+            load()
+
+    def _iter_game_events(self):
+        # Streamed game events fix the frames once the last one is read. The
+        # frames don't read the game events again while they are streamed.
+        if self._frames_checked:
+            for event in self._iter_data_events('replay.game.events', '_game_events'):
+                yield event
+            return
+
+        self._frames_checked = True
+        last_frame, done = 0, False
+        try:
+            for event in self._iter_data_events('replay.game.events', '_game_events'):
+                last_frame = event.frame
+                yield event
+            done = True
+        finally:
+            if not done:
+                self._frames_checked = False
+        self._fix_frames(last_frame)
+
+    def _iter_data_events(self, data_file, attr):
+        # Checked when the first event is taken, so events that were read in
+        # the meantime, and maybe changed by plugins, are the ones used
+        if data_file not in self._pending_events:
+            events = getattr(self, attr, None) or ()
+        else:
+            data = utils.extract_data_file(data_file, self.archive)
+            if not data:
+                return
+            reader = self._get_reader(data_file)
+            events = reader.iter_events(data, self) if hasattr(reader, 'iter_events') else reader(data, self)
+
+        for event in events:
+            yield event
+
+    def _has_data_file(self, data_file):
+        # Looks the file up in the archive without reading it
+        entry = self.archive.get_hash_table_entry(data_file) if self.archive is not None else None
+        return entry is not None and self.archive.block_table[entry.block_table_index].size > 0
+
+    def _fix_frames(self, last_frame):
+        # hideous hack for HotS 2.0.0.23925, see https://github.com/GraylinKim/sc2reader/issues/87
+        self._frames_checked = True
+        last_frame = max([last_frame] + [events[-1].frame for events in (self.messages, self.pings, self.packets) if events])
+        if last_frame > self.frames:
+            self.frames = last_frame
+            self.length = utils.Length(seconds=int(self.frames/self.game_fps))
+
     def _read_data(self, data_file, reader):
         data = utils.extract_data_file(data_file, self.archive)
         if data:
@@ -591,17 +878,41 @@ class Replay(Resource):
             raise ValueError("{0} not found in archive".format(data_file))
 
 
-class Map(Resource):
-    url_template = 'http://{0}.depot.battle.net:1119/{1}.s2ma'
+def _merge_events(sources):
+    # Events that share a frame keep the order of their sources, like the
+    # stable sort in Replay.merged_events.
+    def keyed(source, events):
+        for index, event in enumerate(events):
+            yield (event.frame, source, index), event
 
-    #: The localized (only enUS supported right now) map name
-    name = str()
+    for key, event in heapq.merge(*[keyed(source, events) for source, events in enumerate(sources)]):
+        yield event
+
+
+#: Bumped whenever the layout of a pickled replay changes
+_PICKLE_VERSION = 3
+
+
+class _EventPickler(pickle.Pickler):
+    """ Pickles references to the given events as their index """
 
-    #: The map's author
-    author = str()
+    def __init__(self, file, events):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.event_index = dict((id(event), index) for index, event in enumerate(events))
 
-    #: The map description as written by author
-    description = str()
+    def persistent_id(self, obj):
+        return self.event_index.get(id(obj))
+
+
+class Map(Resource):
+    """ A map from the battle.net depots.
+
+    Only the archive is opened when the map is loaded. The game strings,
+    :class:`~sc2reader.objects.MapInfo`, document info, minimap and icon are
+    read from it the first time they are used, so loading a map for its name
+    only reads the game strings.
+    """
+    url_template = 'http://{0}.depot.battle.net:1119/{1}.s2ma'
 
     def __init__(self, map_file, filename=None, gateway=None, map_hash=None, **options):
         super(Map, self).__init__(map_file, filename, **options)
@@ -618,45 +929,97 @@ class Map(Resource):
         #: The opened MPQArchive for this map
         self.archive = mpyq.MPQArchive(map_file)
 
-        #: A byte string representing the minimap in tga format.
-        self.minimap = self.archive.read_file('Minimap.tga')
-
+        # Filled in on first use
+        self._game_strings = None
+        self._map_info = None
+        self._document_info = None
+        self._minimap = None
+        self._icon = None
+
+    def _reads_file(self):
+        # The map contents are read from the archive whenever they are used
+        return True
+
+    @property
+    def name(self):
+        """ The localized (only enUS supported right now) map name """
+        return self.game_strings.get('DocInfo/Name', str())
+
+    @property
+    def author(self):
+        """ The map's author """
+        return self.game_strings.get('DocInfo/Author', str())
+
+    @property
+    def description(self):
+        """ The map description as written by author """
+        return self.game_strings.get('DocInfo/DescLong', str())
+
+    @property
+    def website(self):
+        """ The map's website, None if it doesn't have one """
+        return self.game_strings.get('DocInfo/Website')
+
+    @property
+    def game_strings(self):
+        """ A dict of the enUS game strings of the map """
         # This will only populate the fields for maps with enUS localizations.
         # Clearly this isn't a great solution but we can't be throwing exceptions
         # just because US English wasn't a concern of the map author.
         # TODO: Make this work regardless of the localizations available.
-        game_strings = self.archive.read_file('enUS.SC2Data\LocalizedData\GameStrings.txt').decode('utf8')
-        if game_strings:
-            for line in game_strings.split('\r\n'):
-                if len(line) == 0:
-                    continue
-
-                key, value = line.split('=', 1)
-                if key == 'DocInfo/Name':
-                    self.name = value
-                elif key == 'DocInfo/Author':
-                    self.author = value
-                elif key == 'DocInfo/DescLong':
-                    self.description = value
-                elif key == 'DocInfo/Website':
-                    self.website = value
-
-        #: A reference to the map's :class:`~sc2reader.objects.MapInfo` object
-        self.map_info = MapInfo(self.archive.read_file('MapInfo'))
-
-        doc_info = ElementTree.fromstring(self.archive.read_file('DocumentInfo').decode('utf8'))
-
-        icon_path_node = doc_info.find('Icon/Value')
-        #: (Optional) The path to the icon for the map, relative to the archive root
-        self.icon_path = icon_path_node.text if icon_path_node is not None else None
-
-        #: (Optional) The icon image for the map in tga format
-        self.icon = self.archive.read_file(self.icon_path) if self.icon_path is not None else None
-
-        #: A list of module names this map depends on
-        self.dependencies = list()
-        for dependency_node in doc_info.findall('Dependencies/Value'):
-            self.dependencies.append(dependency_node.text)
+        if self._game_strings is None:
+            self._game_strings = dict()
+            game_strings = self.archive.read_file('enUS.SC2Data\\LocalizedData\\GameStrings.txt')
+            if game_strings:
+                for line in game_strings.decode('utf8').split('\r\n'):
+                    if len(line) == 0:
+                        continue
+
+                    key, value = line.split('=', 1)
+                    self._game_strings[key] = value
+        return self._game_strings
+
+    @property
+    def map_info(self):
+        """ A reference to the map's :class:`~sc2reader.objects.MapInfo` object """
+        if self._map_info is None:
+            self._map_info = MapInfo(self.archive.read_file('MapInfo'))
+        return self._map_info
+
+    @property
+    def minimap(self):
+        """ A byte string representing the minimap in tga format. """
+        if self._minimap is None:
+            self._minimap = self.archive.read_file('Minimap.tga')
+        return self._minimap
+
+    @property
+    def icon_path(self):
+        """ (Optional) The path to the icon for the map, relative to the archive root """
+        return self.document_info[0]
+
+    @property
+    def icon(self):
+        """ (Optional) The icon image for the map in tga format """
+        if self._icon is None and self.icon_path is not None:
+            self._icon = self.archive.read_file(self.icon_path)
+        return self._icon
+
+    @property
+    def dependencies(self):
+        """ A list of module names this map depends on """
+        return self.document_info[1]
+
+    @property
+    def document_info(self):
+        """ The icon path and dependencies from the DocumentInfo file """
+        if self._document_info is None:
+            doc_info = ElementTree.fromstring(self.archive.read_file('DocumentInfo').decode('utf8'))
+            icon_path_node = doc_info.find('Icon/Value')
+            icon_path = icon_path_node.text if icon_path_node is not None else None
+            dependencies = [dependency_node.text for dependency_node in doc_info.findall('Dependencies/Value')]
+            self._document_info = (icon_path, dependencies)
+        return self._document_info
 
     @classmethod
     def get_url(cls, gateway, map_hash):
@@ -741,7 +1104,7 @@ class GameSummary(Resource):
         self.real_type = str()
 
         # The first 16 bytes appear to be some sort of compression header
-        buffer = BitPackedDecoder(zlib.decompress(summary_file.read()[16:]))
+        buffer = DefaultBitPackedDecoder(zlib.decompress(summary_file.read()[16:]))
 
         # TODO: Is there a fixed number of entries?
         # TODO: Maybe the # of parts is recorded somewhere?
@@ -839,9 +1202,8 @@ class GameSummary(Resource):
             if lang != self.opt.lang:
                 continue
 
-            sheets = list()
-            for depot_file in files:
-                sheets.append(self.factory.load_localization(depot_file, **self.opt))
+            # Load the sheets as one batch so factories can fetch them together
+            sheets = list(self.factory.load_all(Localization, files, **self.opt))
 
             translation = dict()
             for uid, (sheet, item) in self.id_map.items():
@@ -1106,7 +1468,7 @@ class MapHeader(Resource):
 
     def __init__(self, header_file, filename=None, **options):
         super(MapHeader, self).__init__(header_file, filename, **options)
-        self.data = BitPackedDecoder(header_file).read_struct()
+        self.data = DefaultBitPackedDecoder(header_file).read_struct()
 
         # Name
         self.name = self.data[0][1]
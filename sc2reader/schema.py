@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+Declarative descriptions of bit packed data structures.
+
+A schema is built out of the field types below and describes exactly which
+decoder calls are needed to read a value and how the results are arranged::
+
+    Struct(
+        ('control_group_index', Bits(4)),
+        ('remove_mask', Choice(Bits(2), {
+            0: ('None', Null),
+            1: ('Mask', SelectionMask(Bits(9))),
+        })),
+        ('add_unit_tags', Array(Bits(9), Uint32)),
+    )
+
+:func:`compile_parser` turns a schema into a plain python function that takes
+a decoder and returns the value. The generated function is straight line code
+that reads every field in order into local variables and builds the result
+with dict and list displays, avoiding the method lookups and nested lambdas a
+hand written parser would need. Identical schemas compile to the same function
+so the many builds that share a layout share the compiled code as well.
+
+:func:`compile_skipper` turns a schema into a function that moves the decoder
+past a value without building it. Only the lengths, tags and flags needed to
+find the end of the value are read.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import linecache
+import threading
+
+
+class Type(object):
+    """ Base class for all schema field types. """
+
+    #: True when the type can be read with a single expression. Composite
+    #: types made up of simple types are simple themselves.
+    simple = True
+
+    #: The number of bits the value always takes up, or None when it varies
+    size = None
+
+    def emit(self, compiler):
+        """ Returns an expression that reads the value. Types that aren't
+        simple write the statements they need to the compiler first and
+        return the name of the variable holding the result.
+        """
+        raise NotImplementedError()
+
+    def skip(self, compiler):
+        """ Writes the statements needed to move past the value without
+        building it. Types are read and thrown away by default.
+        """
+        compiler.line(self.emit(compiler))
+
+
+class Read(Type):
+    """ Reads a value with a single call to the named decoder method """
+
+    def __init__(self, method, *args, **kwargs):
+        self.method = method
+        self.args = args
+        self.offset = kwargs.get('offset', 0)
+        self.skip_method = kwargs.get('skip', method)
+        self.size = kwargs.get('size', None)
+
+    def emit(self, compiler):
+        args = [arg if isinstance(arg, int) else arg.emit(compiler) for arg in self.args]
+        expression = compiler.call(self.method, *args)
+        if self.offset:
+            return '({0} - {1})'.format(expression, self.offset)
+        return expression
+
+    def skip(self, compiler):
+        if self.size is not None:
+            compiler.skip_bits(self.size)
+        else:
+            args = [arg if isinstance(arg, int) else arg.emit(compiler) for arg in self.args]
+            compiler.line(compiler.call(self.skip_method, *args))
+
+    def __repr__(self):
+        return 'Read({0!r}, {1})'.format(self.method, ', '.join(repr(arg) for arg in self.args))
+
+
+class _Null(Type):
+    """ Doesn't read anything, the value is always None """
+
+    size = 0
+
+    def emit(self, compiler):
+        return 'None'
+
+    def skip(self, compiler):
+        pass
+
+    def __repr__(self):
+        return 'Null'
+
+
+def Bits(count):
+    """ An unsigned integer ``count`` bits long """
+    return Read('read_bits', count, size=count)
+
+
+def Bytes(count):
+    """ A string of ``count`` bytes, not byte aligned """
+    return Read('read_bytes', count, size=count*8)
+
+
+def String(length):
+    """ A byte aligned utf8 string, its length is read first as ``length`` """
+    return Read('read_aligned_string', length, skip='read_aligned_bytes')
+
+
+def Blob(length):
+    """ A byte aligned byte string, its length is read first as ``length`` """
+    return Read('read_aligned_bytes', length)
+
+
+def SelectionMask(length):
+    """ A selection bit mask, its length is read first as ``length`` """
+    return Read('read_selection_bitmask', length, skip='skip_bits')
+
+
+#: Always None, used for fields that aren't present in a particular build
+Null = _Null()
+
+#: A single bit
+Bool = Read('read_bool', size=1)
+
+#: Unsigned integers of the given size
+Uint8 = Read('read_uint8', size=8)
+Uint16 = Read('read_uint16', size=16)
+Uint32 = Read('read_uint32', size=32)
+
+#: Signed integers stored with an offset rather than as two's complement
+Int8 = Read('read_uint8', offset=128, size=8)
+Int32 = Read('read_uint32', offset=2147483648, size=32)
+
+
+class Optional(Type):
+    """ A value preceded by a bit flagging whether it is present or not. Absent
+    values are None.
+    """
+
+    def __init__(self, type):
+        self.type = type
+        self.simple = type.simple
+
+    def emit(self, compiler):
+        exists = compiler.call('read_bool')
+        if self.simple:
+            return '({0} if {1} else None)'.format(self.type.emit(compiler), exists)
+
+        result = compiler.variable()
+        compiler.line('if {0}:'.format(exists))
+        with compiler.block():
+            compiler.line('{0} = {1}'.format(result, self.type.emit(compiler)))
+        compiler.line('else:')
+        with compiler.block():
+            compiler.line('{0} = None'.format(result))
+        return result
+
+    def skip(self, compiler):
+        compiler.line('if {0}:'.format(compiler.call('read_bool')))
+        with compiler.block():
+            self.type.skip(compiler)
+
+
+class Array(Type):
+    """ A list of values preceded by its length """
+
+    def __init__(self, length, type):
+        self.length = length
+        self.type = type
+        self.simple = length.simple and type.simple
+
+    def emit(self, compiler):
+        length = self.length.emit(compiler)
+        if self.simple:
+            return '[{0} for _ in range({1})]'.format(self.type.emit(compiler), length)
+
+        result = compiler.variable()
+        compiler.line('{0} = []'.format(result))
+        compiler.line('for _ in range({0}):'.format(length))
+        with compiler.block():
+            compiler.line('{0}.append({1})'.format(result, self.type.emit(compiler)))
+        return result
+
+    def skip(self, compiler):
+        length = self.length.emit(compiler)
+        if self.type.size is not None:
+            compiler.skip_bits('{0} * {1}'.format(length, self.type.size))
+            return
+
+        compiler.line('for _ in range({0}):'.format(length))
+        with compiler.block():
+            self.type.skip(compiler)
+
+
+class Struct(Type):
+    """ A dict of named values read in the order given. Each field is given
+    as a ``(name, type)`` pair.
+    """
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self.simple = all(type.simple for name, type in fields)
+        if all(type.size is not None for name, type in fields):
+            self.size = sum(type.size for name, type in fields)
+
+    def emit(self, compiler):
+        # Values that come before a field that needs statements have to be
+        # read into variables first to keep everything in order.
+        last = max([i for i, (name, type) in enumerate(self.fields) if not type.simple] or [-1])
+
+        items = list()
+        for i, (name, type) in enumerate(self.fields):
+            value = type.emit(compiler)
+            if i < last and type is not Null:
+                value = compiler.assign(value)
+            items.append("'{0}': {1}".format(name, value))
+        return '{{{0}}}'.format(', '.join(items))
+
+    def skip(self, compiler):
+        # Runs of fixed size fields are skipped all at once
+        size = 0
+        for name, type in self.fields:
+            if type.size is not None:
+                size += type.size
+            else:
+                compiler.skip_bits(size)
+                size = 0
+                type.skip(compiler)
+        compiler.skip_bits(size)
+
+
+class Named(Type):
+    """ A ``(name, value)`` tuple, with the same layout as a choice. """
+
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+        self.simple = type.simple
+        self.size = type.size
+
+    def emit(self, compiler):
+        return "('{0}', {1})".format(self.name, self.type.emit(compiler))
+
+    def skip(self, compiler):
+        self.type.skip(compiler)
+
+
+class Choice(Type):
+    """ One of several alternatives, chosen by reading ``tag`` first. The
+    options map each tag to a ``(name, type)`` pair and the value is read as
+    a ``(name, value)`` tuple. Unknown tags raise a KeyError.
+    """
+
+    simple = False
+
+    def __init__(self, tag, options):
+        self.tag = tag
+        self.options = options
+
+    def emit(self, compiler):
+        tag = compiler.assign(self.tag.emit(compiler))
+        result = compiler.variable()
+        for i, (value, (name, type)) in enumerate(sorted(self.options.items())):
+            compiler.line('{0} {1} == {2}:'.format('elif' if i else 'if', tag, value))
+            with compiler.block():
+                compiler.line("{0} = ('{1}', {2})".format(result, name, type.emit(compiler)))
+        compiler.line('else:')
+        with compiler.block():
+            compiler.line('raise KeyError({0})'.format(tag))
+        return result
+
+    def skip(self, compiler):
+        tag = compiler.assign(self.tag.emit(compiler))
+        for i, (value, (name, type)) in enumerate(sorted(self.options.items())):
+            compiler.line('{0} {1} == {2}:'.format('elif' if i else 'if', tag, value))
+            with compiler.block():
+                type.skip(compiler)
+        compiler.line('else:')
+        with compiler.block():
+            compiler.line('raise KeyError({0})'.format(tag))
+
+
+class _Block(object):
+    def __init__(self, compiler):
+        self.compiler = compiler
+
+    def __enter__(self):
+        self.compiler.depth += 1
+        self.start = len(self.compiler.lines)
+
+    def __exit__(self, *exc_info):
+        # Blocks need at least one statement
+        if len(self.compiler.lines) == self.start:
+            self.compiler.line('pass')
+        self.compiler.depth -= 1
+
+
+class Compiler(object):
+    """ Collects the generated source for a single parser function """
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = list()
+        self.methods = set()
+        self.variables = 0
+        self.depth = 1
+
+    def line(self, text):
+        self.lines.append('    ' * self.depth + text)
+
+    def block(self):
+        return _Block(self)
+
+    def call(self, method, *args):
+        """ Returns a call to a decoder method. Decoder methods are bound to
+        local variables of the same name at the start of the function.
+        """
+        self.methods.add(method)
+        return '{0}({1})'.format(method, ', '.join(str(arg) for arg in args))
+
+    def skip_bits(self, count):
+        if count:
+            self.line(self.call('skip_bits', count))
+
+    def variable(self):
+        self.variables += 1
+        return '_{0}'.format(self.variables)
+
+    def assign(self, expression):
+        """ Reads the expression into a new variable, unless it already is one """
+        if expression.startswith('_') or expression == 'None':
+            return expression
+        variable = self.variable()
+        self.line('{0} = {1}'.format(variable, expression))
+        return variable
+
+    def source(self, schema, skip=False):
+        if skip:
+            schema.skip(self)
+            result = 'None'
+        else:
+            result = schema.emit(self)
+        header = ['def {0}(data):'.format(self.name)]
+        for method in sorted(self.methods):
+            header.append('    {0} = data.{0}'.format(method))
+        return '\n'.join(header + self.lines + ['    return {0}'.format(result), ''])
+
+
+# Compiled parsers are shared by everyone using the same schema source
+_compiled = dict()
+_compiled_lock = threading.Lock()
+
+
+def generate_source(name, schema, skip=False):
+    """ Returns the python source for a function called ``name`` that reads
+    the given schema from a decoder, or skips past it when ``skip`` is set.
+    """
+    return Compiler(name).source(schema, skip)
+
+
+def compile_parser(name, schema):
+    """ Returns a function called ``name`` that takes a decoder and reads the
+    given schema from it. Functions are cached by their source so compiling
+    the same schema again is cheap.
+    """
+    return _compile(name, generate_source(name, schema))
+
+
+def compile_skipper(name, schema):
+    """ Returns a function called ``name`` that takes a decoder and moves it
+    past a value of the given schema without building the value. The function
+    always returns None.
+    """
+    return _compile(name, generate_source(name, schema, skip=True))
+
+
+def _compile(name, source):
+    with _compiled_lock:
+        parser = _compiled.get(source)
+        if parser is None:
+            # Register the source so that tracebacks can show it
+            filename = '<sc2reader schema {0} #{1}>'.format(name, len(_compiled))
+            linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+
+            namespace = dict()
+            exec(compile(source, filename, 'exec'), namespace)
+            parser = _compiled[source] = namespace[name]
+            parser.source = source
+    return parser
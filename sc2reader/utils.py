@@ -2,12 +2,16 @@
 from __future__ import absolute_import, print_function, unicode_literals, division
 
 import binascii
+import mmap
 import os
 import json
+import pickle
+import struct
+import tempfile
 from datetime import timedelta, datetime
 
 from sc2reader.log_utils import loggable
-from sc2reader.exceptions import MPQError
+from sc2reader.exceptions import MPQError, SC2ReaderError
 from sc2reader.constants import COLOR_CODES, COLOR_CODES_INV
 
 
@@ -48,6 +52,75 @@ class DepotFile(object):
         return self.url
 
 
+class MappedFile(object):
+    """
+    :param path: The path of the file to map.
+
+    A read only file-like object over a memory mapped file. The file is
+    mapped once and pages are only read in as they are used, so hashing it
+    and reading the parts of an archive that are needed doesn't copy the
+    whole file into memory first. :meth:`getbuffer` gives a memoryview of the
+    contents like :meth:`io.BytesIO.getbuffer` does.
+
+    The file must not be changed while it is mapped.
+    """
+    def __init__(self, path):
+        #: The path of the mapped file
+        self.name = path
+
+        with open(path, 'rb') as mapped_file:
+            # Empty files can't be mapped
+            if os.fstat(mapped_file.fileno()).st_size:
+                self._map = mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._map = b''
+        self._position = 0
+
+    def read(self, size=-1):
+        end = len(self._map) if size is None or size < 0 else min(self._position + size, len(self._map))
+        data = self._map[self._position:end]
+        self._position = max(self._position, end)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += len(self._map)
+        if offset < 0:
+            raise ValueError("Negative seek position {0}".format(offset))
+        self._position = offset
+        return offset
+
+    def tell(self):
+        return self._position
+
+    def getbuffer(self):
+        """ Returns a memoryview of the whole file without copying it """
+        return memoryview(self._map)
+
+    def detach(self):
+        """ Copies the contents into memory and closes the map, reads keep
+        working from the copy """
+        if isinstance(self._map, mmap.mmap):
+            contents = self._map[:]
+            self._map.close()
+            self._map = contents
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def __len__(self):
+        return len(self._map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 class PersonDict(dict):
     """
     Deprecated!
@@ -75,6 +148,16 @@ class PersonDict(dict):
         self._key_map[value.name] = key
         super(PersonDict, self).__setitem__(key, value)
 
+    def __reduce__(self):
+        # Items are restored along with the name lookup instead of through
+        # __setitem__, which needs the lookup to be in place already.
+        return self.__class__, (), dict(self.__dict__, _items=list(self.items()))
+
+    def __setstate__(self, state):
+        state = dict(state)
+        dict.update(self, state.pop('_items'))
+        self.__dict__.update(state)
+
 
 def windows_to_unix(windows_time):
     # This windows timestamp measures the number of 100 nanosecond periods since
@@ -197,6 +280,61 @@ def extract_data_file(data_file, archive):
         raise MPQError("Unable to extract file: {0}".format(data_file), e)
 
 
+def read_user_data_header(file_object):
+    """ Reads just the user data header content from the start of a MPQ
+    archive, which is where replays keep their version and length. Nothing
+    else in the file is read.
+    """
+    file_object.seek(0)
+    data = file_object.read(16)
+    if data[:4] != b'MPQ\x1b' or len(data) < 16:
+        raise MPQError("Unable to read the MPQ user data header")
+
+    size = struct.unpack(str('<I'), data[12:16])[0]
+    content = file_object.read(size)
+    if len(content) < size:
+        raise MPQError("Unable to read the MPQ user data header")
+    return content
+
+
+def write_file_atomic(path, data):
+    """ Writes data to the file at path through a temporary file that is
+    renamed into place, so that readers never see a partly written file. The
+    directories on the path are created as needed.
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Someone else may have made it in the meantime
+            if not os.path.isdir(directory):
+                raise
+
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            out.write(data)
+        getattr(os, 'replace', os.rename)(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def portable_error(error):
+    """ Returns the error pickled so that it can be sent between processes.
+    Errors can hold references to half loaded replays and some can't be
+    rebuilt from their pickled arguments. Those are sent as an SC2ReaderError
+    with the error's message instead.
+    """
+    try:
+        pickled = pickle.dumps(error, pickle.HIGHEST_PROTOCOL)
+        pickle.loads(pickled)
+        return pickled
+    except Exception:
+        return pickle.dumps(SC2ReaderError('{0}: {1}'.format(type(error).__name__, error)), pickle.HIGHEST_PROTOCOL)
+
+
 def merged_dict(a, b):
     c = a.copy()
     c.update(b)
@@ -1,6 +1,13 @@
 import sys
+import platform
 import setuptools
 
+# The compiled decoders are optional, sc2reader falls back to the pure python
+# decoders if they can't be built. PyPy runs the python versions faster anyway.
+ext_modules = list()
+if platform.python_implementation() == 'CPython':
+    ext_modules.append(setuptools.Extension('sc2reader._decoders', sources=['sc2reader/_decoders.c'], optional=True))
+
 setuptools.setup(
     license="MIT",
     name="sc2reader",
@@ -49,6 +56,7 @@ setuptools.setup(
 
     install_requires=['mpyq>=0.2.3', 'argparse', 'ordereddict', 'unittest2'] if float(sys.version[:3]) < 2.7 else ['mpyq>=0.2.3'],
     packages=setuptools.find_packages(),
+    ext_modules=ext_modules,
     include_package_data=True,
-    zip_safe=True
+    zip_safe=not ext_modules
 )
@@ -254,6 +254,38 @@ class TestReplays(unittest.TestCase):
         self.assertEqual(hellion_times, [5180, 5183])
         self.assertEqual(hellbat_times, [6736, 6741, 7215, 7220, 12004, 12038])
 
+    def test_compact_units(self):
+        import pickle
+        from sc2reader.data import Unit, UnitType
+
+        replay = sc2reader.load_replay('test_replays/2.0.8.25604/issue136.SC2Replay')
+
+        # Units of the same type share one type object from the datapack
+        hellbats = [u for u in replay.players[0].units if u.name == 'BattleHellion']
+        self.assertTrue(isinstance(hellbats[0]._type_class, UnitType))
+        self.assertTrue(hellbats[0]._type_class is hellbats[1]._type_class)
+        self.assertTrue(hellbats[0]._type_class is replay.datapack.BattleHellion)
+        self.assertFalse(hasattr(hellbats[0]._type_class, '__dict__'))
+
+        # Morphed units keep their type history in order
+        morphed = [u for u in replay.objects.values() if len(u.type_history) > 1][0]
+        self.assertEqual(list(morphed.type_history.keys()), sorted(morphed.type_history.keys()))
+        first_type = list(morphed.type_history.values())[0]
+        self.assertFalse(morphed.is_type(first_type))
+        self.assertTrue(morphed.is_type(first_type, strict=False))
+        self.assertTrue(morphed.is_type(first_type.id, strict=False))
+        self.assertTrue(morphed.is_type(morphed._type_class))
+
+        # Setting a type twice on one frame replaces it
+        unit = Unit(1, 2)
+        self.assertTrue(unit.hallucinated)
+        unit.set_type(first_type, 10)
+        unit.set_type(morphed._type_class, 10)
+        self.assertEqual(list(unit.type_history.items()), [(10, morphed._type_class)])
+
+        # Type objects pickle as references to the datapack
+        self.assertTrue(pickle.loads(pickle.dumps(first_type, pickle.HIGHEST_PROTOCOL)) is first_type)
+
     @unittest.expectedFailure
     def test_outmatched_pids(self):
         replay = sc2reader.load_replay('test_replays/2.0.8.25604/issue131_arid_wastes.SC2Replay')
@@ -285,6 +317,205 @@ class TestReplays(unittest.TestCase):
         controllers = [(p.pid, p.control) for p in replay.map.map_info.players]
         self.assertEqual(controllers, [(0, 3), (1, 1), (2, 1), (15, 4)])
 
+    def test_buffered_decoder(self):
+        from sc2reader.decoders import BitPackedDecoder, BufferedBitPackedDecoder
+
+        # Mix aligned and unaligned reads of every type over the same bytes
+        contents = bytes(bytearray((i * 37 + 11) % 256 for i in range(512)))
+        reads = [
+            ('read_bits', 3), ('read_uint8',), ('read_bits', 13), ('read_uint16',),
+            ('read_bool',), ('read_uint32',), ('read_bytes', 3), ('read_bits', 20),
+            ('read_frames',), ('read_vint',), ('read_uint64',), ('byte_align',),
+            ('read_uint16',), ('read_bits', 7), ('read_aligned_bytes', 5), ('read_bits', 40),
+        ]
+        expected, actual = BitPackedDecoder(contents), BufferedBitPackedDecoder(contents)
+        while expected.length - expected.tell() > 32:
+            for read in reads:
+                self.assertEqual(getattr(expected, read[0])(*read[1:]), getattr(actual, read[0])(*read[1:]))
+                self.assertEqual(expected.tell(), actual.tell())
+                self.assertEqual(expected._bit_shift, actual._bit_shift)
+
+        for path in ["test_replays/1.2.2.17811/1.SC2Replay", "test_replays/2.0.8.25604/mlg1.SC2Replay"]:
+            replay = sc2reader.load_replay(path, engine=None, decoder=BitPackedDecoder)
+            buffered = sc2reader.load_replay(path, engine=None, decoder=BufferedBitPackedDecoder)
+            self.assertEqual(buffered.release_string, replay.release_string)
+            self.assertEqual(len(buffered.events), len(replay.events))
+            for event, buffered_event in zip(replay.events, buffered.events):
+                self.assertEqual(vars(event), vars(buffered_event))
+
+        # Game summaries have bit arrays with small negative lengths
+        import zlib
+        with open("test_s2gs/s2gs1.s2gs", 'rb') as summary_file:
+            contents = zlib.decompress(summary_file.read()[16:])
+        expected, actual = BitPackedDecoder(contents), BufferedBitPackedDecoder(contents)
+        while not expected.done():
+            self.assertEqual(expected.read_struct(), actual.read_struct())
+        self.assertTrue(actual.done())
+
+    @unittest.skipIf(sc2reader.decoders.CBitPackedDecoder is None, "The compiled decoders haven't been built")
+    def test_compiled_decoder(self):
+        import glob
+        from sc2reader.decoders import BitPackedDecoder, CBitPackedDecoder
+
+        contents = bytes(bytearray((i * 37 + 11) % 256 for i in range(512)))
+        expected, actual = BitPackedDecoder(contents), CBitPackedDecoder(contents)
+        for count in [3, 70, 9, 130, 0, 5, 255, 1, 16, 300]:
+            self.assertEqual(expected.read_bits(count), actual.read_bits(count))
+            self.assertEqual(expected.read_selection_bitmask(count), actual.read_selection_bitmask(count))
+            self.assertEqual(expected.read_frames(), actual.read_frames())
+            self.assertEqual(expected.tell(), actual.tell())
+
+        for path in sorted(glob.glob("test_replays/*/*.SC2Replay")):
+            try:
+                replay = sc2reader.load_replay(path, engine=None, decoder=BitPackedDecoder)
+            except Exception:
+                # A few very old replays can't be read by either decoder
+                self.assertRaises(Exception, sc2reader.load_replay, path, engine=None, decoder=CBitPackedDecoder)
+                continue
+
+            compiled = sc2reader.load_replay(path, engine=None, decoder=CBitPackedDecoder)
+            self.assertEqual(compiled.map_name, replay.map_name, path)
+            self.assertEqual([p.name for p in compiled.players], [p.name for p in replay.players], path)
+            self.assertEqual(len(compiled.events), len(replay.events), path)
+            for event, compiled_event in zip(replay.events, compiled.events):
+                self.assertEqual(vars(event), vars(compiled_event), path)
+
+        # Game summaries have bit arrays with small negative lengths
+        import zlib
+        with open("test_s2gs/s2gs1.s2gs", 'rb') as summary_file:
+            contents = zlib.decompress(summary_file.read()[16:])
+        expected, actual = BitPackedDecoder(contents), CBitPackedDecoder(contents)
+        while not expected.done():
+            self.assertEqual(expected.read_struct(), actual.read_struct())
+        self.assertTrue(actual.done())
+        expected, actual = BitPackedDecoder(contents), CBitPackedDecoder(contents)
+        while not expected.done():
+            expected.skip_struct()
+            actual.skip_struct()
+            self.assertEqual(expected.tell(), actual.tell())
+
+    def test_event_schemas(self):
+        from sc2reader import readers
+        from sc2reader.decoders import BitPackedDecoder
+        from sc2reader.schema import compile_parser, Struct, Array, Optional, Choice, Bool, Bits, Uint8, Int8
+
+        schema = Struct(
+            ('kind', Choice(Bits(2), {0: ('None', Bits(0)), 1: ('Small', Bits(3)), 2: ('Big', Uint8), 3: ('Flag', Bool)})),
+            ('items', Array(Bits(2), Struct(('value', Int8), ('extra', Optional(Bits(4)))))),
+        )
+        parser = compile_parser('example_event', schema)
+        self.assertTrue(parser is compile_parser('example_event', schema))
+
+        # Compare against the same reads done by hand
+        contents = bytes(bytearray((i * 53 + 7) % 256 for i in range(64)))
+        expected, actual = BitPackedDecoder(contents), BitPackedDecoder(contents)
+        while expected.length - expected.tell() > 8:
+            kind = {
+                0: lambda: ('None', expected.read_bits(0)),
+                1: lambda: ('Small', expected.read_bits(3)),
+                2: lambda: ('Big', expected.read_uint8()),
+                3: lambda: ('Flag', expected.read_bool()),
+            }[expected.read_bits(2)]()
+            items = [dict(value=expected.read_uint8()-128, extra=expected.read_bits(4) if expected.read_bool() else None) for i in range(expected.read_bits(2))]
+            self.assertEqual(parser(actual), dict(kind=kind, items=items))
+            self.assertEqual(expected.tell(), actual.tell())
+
+        # Unknown choices fail the same way the hand written parsers did
+        parser = compile_parser('example_event', Choice(Bits(2), {0: ('None', Bits(0))}))
+        self.assertRaises(KeyError, parser, BitPackedDecoder(b'\x03'))
+
+        # Schemas override inherited parser methods and are shared between builds
+        old, new = readers.GameEventsReader_15405(), readers.GameEventsReader_16561()
+        self.assertFalse('command_event' in readers.GameEventsReader_15405.compile_schemas())
+        self.assertTrue(new.command_event is readers.GameEventsReader_16561.compile_schemas()['command_event'])
+        self.assertTrue(new.camera_update_event is old.camera_update_event)
+        self.assertTrue(readers.GameEventsReader_18092().command_event is new.command_event)
+
+    def test_event_filters(self):
+        from sc2reader.decoders import BitPackedDecoder
+        from sc2reader.events import CameraEvent, UnitPositionsEvent, AbilityEvent, EventFilter
+        from sc2reader.schema import compile_parser, compile_skipper, Struct, Array, Optional, Choice, Bits, String, Uint32
+
+        # Skippers end up in the same place as parsers without building anything
+        schema = Struct(
+            ('name', String(Bits(3))),
+            ('kind', Choice(Bits(1), {0: ('Tag', Uint32), 1: ('Tags', Array(Bits(2), Optional(Uint32)))})),
+        )
+        contents = bytes(bytearray((i * 97 + 13) % 128 for i in range(64)))
+        parsed, skipped = BitPackedDecoder(contents), BitPackedDecoder(contents)
+        for i in range(4):
+            self.assertEqual(compile_skipper('example_event', schema)(skipped), None)
+            compile_parser('example_event', schema)(parsed)
+            self.assertEqual((parsed.tell(), parsed._bit_shift), (skipped.tell(), skipped._bit_shift))
+
+        path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+        replay = sc2reader.load_replay(path, engine=None)
+        for options in [dict(exclude_event_types=[CameraEvent, 'UnitPositionsEvent']), dict(event_types=['TargetAbilityEvent', 'PlayerStatsEvent'])]:
+            event_filter = EventFilter(options.get('event_types'), options.get('exclude_event_types'))
+            expected = [(e.name, e.frame) for e in replay.events if event_filter.keep(type(e))]
+            filtered = sc2reader.load_replay(path, engine=None, **options)
+            self.assertEqual([(e.name, e.frame) for e in filtered.events], expected)
+            self.assertTrue(len(expected) < len(replay.events))
+
+        self.assertTrue(EventFilter([AbilityEvent]).keep(sc2reader.events.TargetAbilityEvent))
+        self.assertFalse(EventFilter(exclude_event_types=['GameEvent']).keep(CameraEvent))
+        self.assertTrue(EventFilter(exclude_event_types=['GameEvent']).keep(UnitPositionsEvent))
+
+    def test_merged_events(self):
+        for path in ["test_replays/1.2.2.17811/1.SC2Replay", "test_replays/2.0.8.25604/mlg1.SC2Replay"]:
+            replay = sc2reader.load_replay(path, engine=None)
+
+            # Same order as sorting in each source in turn, ties included
+            expected = sorted(replay.message_events, key=lambda e: e.frame)
+            expected = sorted(replay.game_events + expected, key=lambda e: e.frame)
+            expected = sorted(replay.tracker_events + expected, key=lambda e: e.frame)
+            self.assertEqual([id(e) for e in replay.events], [id(e) for e in expected])
+
+            expected = sorted(replay.tracker_events + replay.message_events, key=lambda e: e.frame)
+            self.assertEqual([id(e) for e in replay.merged_events(game_events=False)], [id(e) for e in expected])
+
+    def test_lazy_events(self):
+        path = "test_replays/2.0.5.25092/cn1.SC2Replay"
+        eager = sc2reader.load_replay(path, engine=None)
+
+        # Nothing is read until the events are used
+        replay = sc2reader.load_replay(path, engine=None, lazy_events=True)
+        self.assertFalse('replay.game.events' in replay.raw_data)
+        self.assertFalse('replay.tracker.events' in replay.raw_data)
+        self.assertEqual(len(replay.game_events), len(eager.game_events))
+        self.assertFalse('replay.tracker.events' in replay.raw_data)
+        self.assertEqual([(e.name, e.frame) for e in replay.events], [(e.name, e.frame) for e in eager.events])
+        self.assertEqual(replay.frames, eager.frames)
+
+        # The engine only reads the kinds of events the plugins handle
+        class UnitCounter(object):
+            name = 'UnitCounter'
+
+            def handleInitGame(self, event, replay):
+                self.units = 0
+
+            def handleUnitBornEvent(self, event, replay):
+                self.units += 1
+
+        counter = UnitCounter()
+        replay = sc2reader.load_replay(path, engine=sc2reader.engine.GameEngine(plugins=[counter]), lazy_events=True)
+        self.assertFalse('replay.game.events' in replay.raw_data)
+        self.assertEqual(counter.units, len([e for e in eager.tracker_events if e.name == 'UnitBornEvent']))
+        self.assertEqual(replay.plugins['UnitCounter'], (0, dict()))
+
+        # The frames come from the header until the game events are read
+        path = "test_replays/2.0.3.24764/resume_from_replay.SC2Replay"
+        eager = sc2reader.load_replay(path, engine=None)
+        header = sc2reader.load_replay(path, load_level=2)
+        self.assertTrue(eager.frames > header.frames)
+        counter = UnitCounter()
+        for engine in (None, sc2reader.engine.GameEngine(plugins=[counter])):
+            replay = sc2reader.load_replay(path, engine=engine, lazy_events=True)
+            self.assertEqual((replay.frames, replay.length), (header.frames, header.length))
+            self.assertFalse('replay.game.events' in replay.raw_data)
+            replay.game_events
+            self.assertEqual((replay.frames, replay.length), (eager.frames, eager.length))
+
     def test_engine_plugins(self):
         from sc2reader.engine.plugins import ContextLoader, APMTracker, SelectionTracker
 
@@ -301,6 +532,369 @@ class TestReplays(unittest.TestCase):
         self.assertEqual(code, 0)
         self.assertEqual(details, dict())
 
+    def test_engine_dispatch(self):
+        from sc2reader.engine import GameEngine, PluginExit
+        path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+
+        class ExpansionEvent(object):
+            name = 'ExpansionEvent'
+
+        class Recorder(object):
+            name = 'Recorder'
+
+            def __init__(self):
+                self.calls = list()
+
+            def handleEvent(self, event, replay):
+                self.calls.append(('Event', event.name))
+
+            def handleTrackerEvent(self, event, replay):
+                self.calls.append(('TrackerEvent', event.name))
+
+            def handleAbilityEvent(self, event, replay):
+                self.calls.append(('AbilityEvent', event.name))
+
+            def handleTargetAbilityEvent(self, event, replay):
+                self.calls.append(('TargetAbilityEvent', event.name))
+
+            def handleExpansionEvent(self, event, replay):
+                self.calls.append(('ExpansionEvent', event.name))
+
+        class Announcer(object):
+            name = 'Announcer'
+
+            def handleUnitDoneEvent(self, event, replay):
+                yield ExpansionEvent()
+
+            def handleUnitDiedEvent(self, event, replay):
+                yield PluginExit(self, code=1, details=dict(msg='done'))
+
+        recorder, announcer = Recorder(), Announcer()
+        engine = GameEngine(plugins=[announcer, recorder])
+        replay = sc2reader.load_replay(path, engine=engine)
+        events = [event.name for event in replay.events]
+
+        # Handlers run from most general to most specific, once each
+        target = [call for call in recorder.calls if call[1] == 'TargetAbilityEvent'][:3]
+        self.assertEqual(target, [('Event', 'TargetAbilityEvent'), ('AbilityEvent', 'TargetAbilityEvent'), ('TargetAbilityEvent', 'TargetAbilityEvent')])
+        self.assertEqual(len([call for call in recorder.calls if call[0] == 'Event']), len(events))
+        self.assertEqual(len([call for call in recorder.calls if call[0] == 'TrackerEvent']), len(replay.tracker_events))
+
+        # Yielded events are handled until the plugin that yields them exits
+        first_death = events.index('UnitDiedEvent')
+        expansions = len([name for name in events[:first_death] if name == 'UnitDoneEvent'])
+        self.assertTrue(expansions > 0)
+        self.assertEqual(len([call for call in recorder.calls if call[0] == 'ExpansionEvent']), expansions)
+        self.assertEqual(replay.plugins['Announcer'], (1, dict(msg='done')))
+        self.assertEqual(replay.plugins['Recorder'], (0, dict()))
+
+        # The handler tables are kept for the next replay
+        tables = dict((key, dict(table)) for key, table in engine._handler_tables.items())
+        self.assertEqual(len(tables), 2)
+        recorder.calls = list()
+        sc2reader.load_replay(path, engine=engine)
+        self.assertEqual(len([call for call in recorder.calls if call[0] == 'Event']), len(events))
+        for key, table in tables.items():
+            for event_class, entry in table.items():
+                self.assertTrue(engine._handler_tables[key][event_class] is entry)
+
+        # Only generators add events, whatever else handles the event
+        class Extra(object):
+            name = 'Extra'
+
+        class Returner(object):
+            name = 'Returner'
+
+            def handleInitGame(self, event, replay):
+                return [Extra()]
+
+            def handleExtra(self, event, replay):
+                self.extras += 1
+
+        class Yielder(object):
+            name = 'Yielder'
+
+            def handleInitGame(self, event, replay):
+                yield Extra()
+
+        for plugins, extras in (([], 0), ([Yielder()], 1)):
+            returner = Returner()
+            returner.extras = 0
+            sc2reader.load_replay(path, engine=GameEngine(plugins=[returner] + plugins))
+            self.assertEqual(returner.extras, extras)
+
+    def test_engine_plugin_dependencies(self):
+        from sc2reader.engine import GameEngine
+        from sc2reader.engine.plugins import ContextLoader, SelectionTracker, GameHeartNormalizer
+        from sc2reader.events import UnitBornEvent, UnitDiedEvent
+
+        # Plugins are run after the plugins that provide what they require
+        context, selection = ContextLoader(), SelectionTracker()
+        engine = GameEngine(plugins=[selection, context])
+        self.assertEqual(engine._plugins, [context, selection])
+        replay = sc2reader.load_replay("test_replays/2.0.5.25092/cn1.SC2Replay", engine=engine)
+        self.assertEqual(replay.plugins['SelectionTracker'], (0, dict()))
+
+        class Chicken(object):
+            name = 'Chicken'
+            requires = provides = ('egg',)
+
+        class Egg(object):
+            name = 'Egg'
+            requires = ('chicken',)
+            provides = ('egg',)
+
+        class Hen(object):
+            name = 'Hen'
+            requires = ('egg',)
+            provides = ('chicken',)
+
+        engine = GameEngine(plugins=[Chicken(), Egg()])
+        self.assertRaises(ValueError, engine.register_plugin, Hen())
+
+        # Plugins whose inputs are missing are skipped
+        engine = GameEngine(plugins=[GameHeartNormalizer(), SelectionTracker()])
+        replay = sc2reader.load_replay("test_replays/2.0.5.25092/cn1.SC2Replay", engine=engine)
+        self.assertEqual(replay.plugins['GameHeartNormalizer'], (0, dict(missing=['tracker_events'])))
+        self.assertEqual(replay.plugins['SelectionTracker'], (0, dict(missing=['objects'])))
+
+        # Requirements are checked without reading events that are still pending
+        replay = sc2reader.load_replay("test_replays/2.0.5.25092/cn1.SC2Replay", engine=engine, lazy_events=True)
+        self.assertEqual(replay.plugins['GameHeartNormalizer'], (0, dict(missing=['tracker_events'])))
+        replay = sc2reader.load_replay("test_replays/2.0.8.25604/mlg1.SC2Replay", engine=GameEngine(plugins=[GameHeartNormalizer()]), lazy_events=True)
+        self.assertEqual(replay.plugins['GameHeartNormalizer'], (0, dict()))
+        self.assertFalse('replay.game.events' in replay.raw_data)
+        self.assertFalse('replay.tracker.events' in replay.raw_data)
+
+        # Plugins that declare what they consume only get those events
+        class BornCounter(object):
+            name = 'BornCounter'
+            consumes = ('UnitBornEvent',)
+
+            def handleInitGame(self, event, replay):
+                self.events = list()
+
+            def handleEvent(self, event, replay):
+                self.events.append(event.name)
+
+        class DiedCounter(object):
+            name = 'DiedCounter'
+
+            def handleUnitDiedEvent(self, event, replay):
+                pass
+
+        path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+        born = BornCounter()
+        engine = GameEngine(plugins=[born, DiedCounter()])
+        replay = sc2reader.load_replay(path, engine=engine)
+        self.assertEqual(born.events, [event.name for event in replay.events if event.name == 'UnitBornEvent'])
+        self.assertTrue(len(born.events) > 0)
+
+        # The reader can be told to skip the rest
+        self.assertEqual(engine.event_types(), [UnitBornEvent, UnitDiedEvent])
+        filtered = sc2reader.load_replay(path, engine=engine, event_types=engine.event_types())
+        self.assertEqual(born.events, [event.name for event in replay.events if event.name == 'UnitBornEvent'])
+        self.assertEqual(set(event.name for event in filtered.game_events + filtered.tracker_events), set(['UnitBornEvent', 'UnitDiedEvent']))
+
+        # Without a declaration, handleEvent consumes everything
+        del BornCounter.consumes
+        self.assertEqual(GameEngine(plugins=[BornCounter(), DiedCounter()]).event_types(), None)
+
+    def test_engine_stream_events(self):
+        from sc2reader.engine import GameEngine
+        from sc2reader.engine.plugins import ContextLoader
+
+        class Expansion(object):
+            name = 'ExpansionEvent'
+
+            def __init__(self, frame):
+                self.frame = frame
+
+        class Recorder(object):
+            name = 'Recorder'
+
+            def handleInitGame(self, event, replay):
+                self.events = ['InitGame']
+
+            def handleEvent(self, event, replay):
+                self.events.append((event.name, event.frame))
+                if event.name == 'UnitBornEvent' and event.unit.name == 'Nexus':
+                    yield Expansion(event.frame)
+
+            def handleExpansionEvent(self, event, replay):
+                self.events.append((event.name, event.frame))
+
+            def handleEndGame(self, event, replay):
+                self.events.append('EndGame')
+
+        path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+        seen = list()
+        for options in (dict(), dict(stream_events=True)):
+            recorder = Recorder()
+            replay = sc2reader.load_replay(path, engine=GameEngine(plugins=[ContextLoader(), recorder]), **options)
+            seen.append(recorder.events)
+        self.assertEqual(seen[0], seen[1])
+        self.assertTrue(('ExpansionEvent', 0) in seen[1])
+
+        # Streamed game events are handed to the plugins without being kept
+        self.assertTrue(replay.stream_events)
+        self.assertFalse('replay.game.events' in replay.raw_data)
+        self.assertEqual([(e.name, e.frame) for e in replay.iter_events()], [(e.name, e.frame) for e in replay.merged_events()])
+
+        # The default plugins don't read the streamed game events either
+        replay = sc2reader.load_replay(path, stream_events=True)
+        self.assertEqual(replay.plugins['GameHeartNormalizer'], (0, dict()))
+        self.assertFalse('replay.game.events' in replay.raw_data)
+
+        # Events passed to run are only taken as the plugins get to them
+        class Pulled(object):
+            name = 'Pulled'
+
+            def handleEvent(self, event, replay):
+                self.pulled.append(pulled[0])
+
+        def events():
+            for event in replay.events:
+                pulled[0] += 1
+                yield event
+
+        pulled, plugin = [0], Pulled()
+        plugin.pulled = list()
+        GameEngine(plugins=[plugin]).run(replay, events=events())
+        self.assertEqual(plugin.pulled, list(range(1, len(replay.events)+1)))
+
+        # The frames are checked against the last streamed game event before EndGame
+        class Length(object):
+            name = 'Length'
+
+            def handleGameEvent(self, event, replay):
+                pass
+
+            def handleEndGame(self, event, replay):
+                self.length = (replay.frames, replay.length)
+
+        path = "test_replays/2.0.3.24764/resume_from_replay.SC2Replay"
+        eager = sc2reader.load_replay(path, engine=None)
+        plugin = Length()
+        replay = sc2reader.load_replay(path, engine=GameEngine(plugins=[plugin]), stream_events=True)
+        self.assertEqual(plugin.length, (eager.frames, eager.length))
+        self.assertEqual((replay.frames, replay.length), (eager.frames, eager.length))
+        self.assertFalse('replay.game.events' in replay.raw_data)
+
+    def test_engine_profile(self):
+        import inspect
+        from sc2reader.engine import GameEngine, EngineStats
+        from sc2reader.engine.plugins import ContextLoader
+        path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+
+        class Echo(object):
+            name = 'Echo'
+
+            def handleUpgradeCompleteEvent(self, event, replay):
+                yield EchoEvent()
+
+            def handleUnitBornEvent(self, event, replay):
+                # Return values of handlers that aren't generators are ignored
+                return 1
+
+        class EchoEvent(object):
+            name = 'EchoEvent'
+
+        engine = GameEngine(plugins=[ContextLoader(), Echo()], profile=True)
+        replay = sc2reader.load_replay(path, engine=engine)
+        stats = replay.engine_stats
+        self.assertTrue(isinstance(stats, EngineStats))
+
+        upgrades = len([event for event in replay.events if event.name == 'UpgradeCompleteEvent'])
+        self.assertTrue(upgrades > 0)
+        self.assertEqual(stats[('Echo', 'handleUpgradeCompleteEvent')].calls, upgrades)
+        self.assertEqual(stats[('Echo', 'handleUpgradeCompleteEvent')].yielded, upgrades)
+        born = stats[('ContextLoader', 'handleUnitBornEvent')]
+        self.assertEqual(born.calls, len([event for event in replay.events if event.name == 'UnitBornEvent']))
+        self.assertTrue(0 < born.max_time <= born.total_time)
+        self.assertEqual(stats[('Echo', 'handleUnitBornEvent')].calls, born.calls)
+        self.assertEqual(stats[('Echo', 'handleUnitBornEvent')].yielded, 0)
+
+        dump = stats.dump()
+        self.assertEqual(len(dump), len(stats))
+        self.assertEqual([row['total_time'] for row in dump], sorted([row['total_time'] for row in dump], reverse=True))
+        self.assertEqual(json.loads(json.dumps(dump)), dump)
+
+        # Batches add up the stats of their replays
+        report = GameEngine(plugins=[ContextLoader()], profile=True).run_many(sc2reader.load_replays([path, path], engine=None))
+        self.assertEqual(report.engine_stats[('ContextLoader', 'handleUnitBornEvent')].calls, 2 * born.calls)
+
+        # Handlers aren't wrapped when the engine isn't profiling
+        engine.profile = False
+        replay = sc2reader.load_replay(path, engine=engine)
+        self.assertFalse(hasattr(replay, 'engine_stats'))
+        for table in engine._handler_tables.values():
+            for handlers, yields in table.values():
+                self.assertTrue(all(inspect.ismethod(handler) or handler.__name__ == 'plain_handler' for handler in handlers))
+
+    def test_engine_run_many(self):
+        from sc2reader.engine import GameEngine, PluginExit
+        from sc2reader.engine.plugins import ContextLoader, APMTracker, GameHeartNormalizer
+        paths = ["test_replays/2.0.8.25604/issue136.SC2Replay", "test_replays/2.0.5.25092/cn1.SC2Replay"]
+
+        def load():
+            return sc2reader.load_replays(paths, engine=None)
+
+        # The registered plugins are run over every replay
+        engine = GameEngine(plugins=[GameHeartNormalizer(), ContextLoader(), APMTracker()])
+        report = engine.run_many(load())
+        self.assertTrue(report.ok)
+        self.assertEqual(report.exit_codes, dict(GameHeartNormalizer={0: 2}, ContextLoader={0: 2}, APMTracker={0: 2}))
+        self.assertEqual([replay.filename for replay in report.replays], paths)
+        self.assertTrue(all(player.avg_apm for replay in report.replays for player in replay.players))
+
+        # Plugin factories make new plugins for every replay
+        class Failing(object):
+            name = 'Failing'
+            instances = list()
+
+            def __init__(self):
+                self.instances.append(self)
+
+            def handleInitGame(self, event, replay):
+                if replay.expansion == 'WoL':
+                    raise ValueError('no WoL')
+                yield PluginExit(self, code=2)
+
+        report = GameEngine().run_many(load(), plugins=[ContextLoader, Failing])
+        self.assertFalse(report.ok)
+        self.assertEqual(len(Failing.instances), 2)
+        self.assertEqual(report.exit_codes, dict(ContextLoader={0: 1}, Failing={2: 1}))
+        self.assertEqual(report.replays[1], None)
+        self.assertEqual([(filename, str(error)) for filename, error, error_traceback in report.errors], [(paths[1], 'no WoL')])
+
+        # The plugins made for later replays reuse the handlers looked up for the first
+        class Lookups(object):
+            name = 'Lookups'
+            missing = list()
+
+            def __getattr__(self, name):
+                if name.startswith('handle'):
+                    self.missing.append(name)
+                raise AttributeError(name)
+
+            def handleUnitBornEvent(self, event, replay):
+                pass
+
+        GameEngine().run_many(sc2reader.load_replays(paths[:1], engine=None), plugins=[Lookups])
+        lookups = len(Lookups.missing)
+        self.assertTrue(lookups > 0)
+        del Lookups.missing[:]
+        report = GameEngine().run_many(sc2reader.load_replays(paths[:1] * 3, engine=None), plugins=[Lookups])
+        self.assertTrue(report.ok)
+        self.assertEqual(len(Lookups.missing), lookups)
+
+        # Replays run in worker processes come back as copies
+        report = engine.run_many(load(), workers=2, plugins=[ContextLoader, APMTracker])
+        self.assertTrue(report.ok)
+        self.assertEqual([replay.filename for replay in report.replays], paths)
+        self.assertTrue(all(player.avg_apm for replay in report.replays for player in replay.players))
+
     def test_factory_plugins(self):
         from sc2reader.factories.plugins.replay import APMTracker, SelectionTracker, toJSON
 
@@ -322,6 +916,449 @@ class TestReplays(unittest.TestCase):
         self.assertEqual(result["game_fps"], 16.0)
         self.assertTrue(result["is_ladder"])
 
+    def test_parallel_loading(self):
+        from operator import attrgetter
+        from sc2reader.factories import LoadResult
+
+        paths = [
+            "test_replays/2.0.5.25092/cn1.SC2Replay",
+            "test_replays/does_not_exist.SC2Replay",
+            "test_replays/1.2.2.17811/1.SC2Replay",
+            "test_replays/2.0.8.25604/mlg1.SC2Replay",
+        ]
+        expected = [(replay.map_name, replay.frames) for replay in sc2reader.load_replays([paths[0]] + paths[2:])]
+
+        factory = sc2reader.factories.SC2Factory()
+        results = list(factory.load_replays(paths, parallel=2, chunksize=2, projection=attrgetter('map_name', 'frames')))
+        self.assertTrue(all(isinstance(result, LoadResult) for result in results))
+        self.assertEqual([result.source for result in results], paths)
+
+        # One bad source doesn't stop the rest of the batch
+        failed = results.pop(1)
+        self.assertFalse(failed.ok)
+        self.assertTrue(isinstance(failed.error, IOError))
+        self.assertTrue('does_not_exist' in failed.traceback)
+        self.assertEqual([result.value for result in results], expected)
+
+        results = factory.load_replays(paths, parallel=2, ordered=False, projection=attrgetter('map_name', 'frames'))
+        self.assertEqual(sorted(result.source for result in results), sorted(paths))
+
+        # Sources are read as their chunks are sent, a few ahead of the results
+        read = list()
+        def sources():
+            for i in range(20):
+                read.append(i)
+                with open(paths[0], 'rb') as source:
+                    yield source
+        results = factory.load_replays(sources(), parallel=2, projection=attrgetter('map_name'))
+        self.assertEqual(next(results).value, expected[0][0])
+        self.assertTrue(len(read) <= 5)
+        results.close()
+
+    def test_pickle_replay(self):
+        import pickle
+
+        replay = sc2reader.load_replay("test_replays/2.0.8.25604/mlg1.SC2Replay")
+        data = pickle.dumps(replay, pickle.HIGHEST_PROTOCOL)
+        copy = pickle.loads(data)
+        self.assertEqual(copy.archive, None)
+        self.assertEqual(copy.factory, None)
+        self.assertEqual(copy.filehash, replay.filehash)
+        self.assertEqual([event.name for event in copy.events], [event.name for event in replay.events])
+        self.assertEqual([event.frame for event in copy.events], [event.frame for event in replay.events])
+        self.assertEqual([str(player) for player in copy.players], [str(player) for player in replay.players])
+        self.assertEqual(sorted(str(unit) for unit in copy.objects.values()), sorted(str(unit) for unit in replay.objects.values()))
+
+        # References between the events, players and units are kept and the
+        # unit types come from the loaded datapacks
+        unit = [event.unit for event in copy.tracker_events if getattr(event, 'unit', None) is not None][0]
+        self.assertTrue(unit is copy.objects[unit.id])
+        self.assertTrue(unit._type_class is copy.datapack.units[unit._type_class.id])
+        event = [event for event in copy.game_events if getattr(event, 'player', None) is not None][0]
+        self.assertTrue(event.player is copy.entity[event.player.pid])
+        self.assertTrue(copy.events[0] is copy.merged_events()[0])
+
+        # Events are stored as rows of values rather than one dict each
+        state = dict((key, value) for key, value in replay.__dict__.items() if key not in ('archive', 'factory', 'logger', 'registered_readers', 'registered_datapacks'))
+        self.assertTrue(len(data) < 0.75 * len(pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+
+        # Pending lazy events are read before the archive is dropped
+        replay = sc2reader.load_replay("test_replays/2.0.8.25604/mlg1.SC2Replay", lazy_events=True)
+        copy = pickle.loads(pickle.dumps(replay, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(len(copy.game_events), len(replay.game_events))
+
+    def test_parsed_replay_cache(self):
+        import os
+        import shutil
+        import tempfile
+        from sc2reader.factories import SC2Factory, ParsedReplayCache
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = ParsedReplayCache(cache_dir)
+            factory = SC2Factory(replay_cache=cache)
+            path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+
+            replay = factory.load_replay(path)
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            cached = factory.load_replay(path)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertTrue(cached is not replay)
+            self.assertTrue(cached.factory is factory)
+            self.assertEqual(cached.filehash, replay.filehash)
+            self.assertEqual([event.name for event in cached.events], [event.name for event in replay.events])
+            self.assertEqual(cached.plugins, replay.plugins)
+
+            # Options that change the replay have their own entries
+            replay = factory.load_replay(path, load_level=2)
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+            self.assertEqual(len(factory.load_replay(path, load_level=2).events), len(replay.events))
+            self.assertEqual((cache.hits, cache.misses), (2, 2))
+            factory.load_replay(path, event_types=['AbilityEvent'])
+            self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+            # Entries that can't be read are replaced
+            with open(path, 'rb') as replay_file:
+                key = cache.key(sc2reader.resources.Replay, replay_file.read(), factory._get_options(sc2reader.resources.Replay), [])
+            with open(cache.cache_path(key), 'wb') as entry:
+                entry.write(b'not a replay')
+            self.assertEqual(len(factory.load_replay(path).events), len(cached.events))
+            self.assertEqual((cache.hits, cache.misses), (2, 4))
+            self.assertEqual(len(factory.load_replay(path).events), len(cached.events))
+            self.assertEqual((cache.hits, cache.misses), (3, 4))
+            self.assertFalse([name for root, dirs, files in os.walk(cache_dir) for name in files if name.endswith('.tmp')])
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_parsed_replay_cache_stream_events(self):
+        import shutil
+        import tempfile
+        from sc2reader.factories import SC2Factory, ParsedReplayCache
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = ParsedReplayCache(cache_dir)
+            factory = SC2Factory(replay_cache=cache)
+            path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+
+            # Streamed events don't stay on the replay, so a plain load of the
+            # same file needs its own entry
+            factory.load_replay(path, stream_events=True)
+            replay = factory.load_replay(path)
+            self.assertEqual((cache.hits, cache.misses), (0, 2))
+            targets = [event for event in replay.game_events if event.name == 'TargetAbilityEvent']
+            self.assertTrue(targets)
+            self.assertTrue(all(hasattr(event, 'target') for event in targets))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_mmap_resources(self):
+        from sc2reader.utils import MappedFile
+
+        path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+        with open(path, 'rb') as replay_file:
+            contents = replay_file.read()
+
+        with MappedFile(path) as mapped:
+            self.assertEqual(len(mapped), len(contents))
+            self.assertEqual(mapped.read(16), contents[:16])
+            mapped.seek(-16, 2)
+            self.assertEqual(mapped.read(), contents[-16:])
+            self.assertEqual(mapped.read(16), b'')
+            mapped.seek(100)
+            mapped.seek(10, 1)
+            self.assertEqual(mapped.tell(), 110)
+            self.assertEqual(mapped.getbuffer().tobytes(), contents)
+
+        replay = sc2reader.load_replay(path)
+        mapped = sc2reader.load_replay(path, mmap=True)
+        self.assertTrue(isinstance(mapped.archive.file, MappedFile))
+        self.assertEqual(mapped.filehash, replay.filehash)
+        self.assertEqual(mapped.filename, replay.filename)
+        self.assertEqual([event.name for event in mapped.events], [event.name for event in replay.events])
+
+        # The map is closed once the replay is loaded, replays that still
+        # read the file keep a copy of it
+        self.assertTrue(mapped.archive.file._map.closed)
+        mapped = sc2reader.load_replay(path, mmap=True, lazy_events=True, engine=None)
+        self.assertEqual(mapped.archive.file._map, contents)
+        self.assertEqual(len(mapped.events), len(replay.events))
+
+    def test_peek_header(self):
+        from io import BytesIO
+
+        path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+        replay = sc2reader.load_replay(path, load_level=0)
+        header = sc2reader.peek_header(path)
+        for name in ['versions', 'frames', 'build', 'base_build', 'release_string', 'game_length', 'length']:
+            self.assertEqual(getattr(header, name), getattr(replay, name))
+        self.assertEqual(header.filename, path)
+        self.assertEqual(header.filehash, None)
+        self.assertEqual(header.archive, None)
+
+        # Only the header is read from the file
+        with open(path, 'rb') as replay_file:
+            contents = replay_file.read()
+        source = BytesIO(contents)
+        header = sc2reader.peek_header(source)
+        self.assertEqual(header.release_string, replay.release_string)
+        self.assertTrue(source.tell() < 1024)
+
+        # The archive isn't needed
+        header = sc2reader.load_replay(BytesIO(contents[:source.tell()]), load_level=-1)
+        self.assertEqual(header.build, replay.build)
+
+        with self.assertRaises(sc2reader.exceptions.MPQError):
+            sc2reader.peek_header(BytesIO(b'not a replay'))
+
+    def test_file_hashing(self):
+        import hashlib
+        import pickle
+
+        path = "test_replays/2.0.8.25604/mlg1.SC2Replay"
+        with open(path, 'rb') as replay_file:
+            contents = replay_file.read()
+
+        replay = sc2reader.load_replay(path, load_level=1)
+        self.assertEqual(replay.hash_algorithm, 'sha256')
+        self.assertEqual(replay.filehash, hashlib.sha256(contents).hexdigest())
+
+        replay = sc2reader.load_replay(path, load_level=1, hash_algorithm=None)
+        self.assertEqual(replay.filehash, None)
+
+        replay = sc2reader.load_replay(path, load_level=1, hash_algorithm='md5')
+        self.assertEqual(replay.filehash, hashlib.md5(contents).hexdigest())
+
+        # Lazy hashes are computed when first used, or before pickling
+        replay = sc2reader.load_replay(path, load_level=1, lazy_hash=True)
+        self.assertEqual(replay._filehash, None)
+        self.assertEqual(replay.filehash, hashlib.sha256(contents).hexdigest())
+        replay = sc2reader.load_replay(path, load_level=1, lazy_hash=True)
+        self.assertEqual(pickle.loads(pickle.dumps(replay)).filehash, hashlib.sha256(contents).hexdigest())
+
+    def test_dict_cache(self):
+        import pickle
+        import threading
+        from sc2reader.factories import DictCachedSC2Factory
+
+        factory = DictCachedSC2Factory(cache_max_size='3', cache_max_bytes=10)
+        self.assertEqual(factory.cache_max_size, 3)
+        for key in 'abc':
+            factory.cache_set(key, b'xx')
+        self.assertEqual(factory.cache_get('a'), b'xx')
+
+        # The least recently used entry goes first
+        factory.cache_set('d', b'xx')
+        self.assertEqual(list(factory.cache_dict), ['c', 'a', 'd'])
+        self.assertEqual(factory.cache_lookup('b'), None)
+
+        # The byte budget is kept as well
+        factory.cache_set('e', b'xxxxxx')
+        self.assertEqual(list(factory.cache_dict), ['a', 'd', 'e'])
+        self.assertEqual(factory.cache_bytes, 10)
+        factory.cache_set('f', b'x' * 11)
+        self.assertFalse(factory.cache_has('f'))
+        self.assertEqual(factory.cache_stats(), dict(hits=1, misses=1, evictions=2, entries=3, bytes=10, max_size=3, max_bytes=10))
+
+        # Factories can be shared between threads and pickled
+        factory = pickle.loads(pickle.dumps(DictCachedSC2Factory(cache_max_size=50)))
+
+        def work(thread):
+            for i in range(500):
+                key = (thread * i) % 80
+                if factory.cache_lookup(key) is None:
+                    factory.cache_set(key, b'x' * (key + 1))
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(1, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(factory.cache_hits + factory.cache_misses, 2000)
+        self.assertEqual(len(factory.cache_dict), 50)
+        self.assertEqual(factory.cache_bytes, sum(len(value) for value in factory.cache_dict.values()))
+
+    def test_file_cache(self):
+        import os
+        import shutil
+        import tempfile
+        import time
+        from sc2reader.factories import FileCachedSC2Factory
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            factory = FileCachedSC2Factory(cache_dir, cache_compression='zlib', cache_dir_max_bytes=100)
+            data = b'sc2' * 1000
+            factory.cache_set(('us', 'abcdef.s2ma'), data)
+            path = os.path.join(cache_dir, 'us', 'ab', 'abcdef.s2ma.zlib')
+            self.assertEqual(factory.cache_path(('us', 'abcdef.s2ma')), path)
+            self.assertTrue(factory.cache_has(('us', 'abcdef.s2ma')))
+            self.assertEqual(factory.cache_get(('us', 'abcdef.s2ma')), data)
+            self.assertEqual(factory.cache_lookup(('us', 'missing.s2ma')), None)
+
+            # The least recently used files are swept out along with stale temporary files
+            old = time.time() - 2 * factory.stale_temp_age
+            os.utime(path, (old, old))
+            with open(os.path.join(cache_dir, 'us', 'ab', 'dead.tmp'), 'wb') as out:
+                out.write(b'x')
+            os.utime(os.path.join(cache_dir, 'us', 'ab', 'dead.tmp'), (old, old))
+            for name in ['1111', '2222', '3333']:
+                factory.cache_set(('us', name), os.urandom(30))
+            self.assertFalse(factory.cache_has(('us', 'abcdef.s2ma')))
+            self.assertFalse(os.path.exists(os.path.join(cache_dir, 'us', 'ab', 'dead.tmp')))
+            self.assertTrue(factory.cache_sweep() <= 100)
+
+            self.assertRaises(ValueError, FileCachedSC2Factory, cache_dir, cache_compression='bz2')
+        finally:
+            shutil.rmtree(cache_dir)
+
+    @unittest.skipIf(sys.version_info < (3, 7), "Needs asyncio.run from python 3.7")
+    def test_async_factory(self):
+        import asyncio
+        import functools
+        import threading
+        from http.server import HTTPServer, SimpleHTTPRequestHandler
+        from sc2reader.factories import AsyncSC2Factory
+
+        requests = list()
+
+        class Handler(SimpleHTTPRequestHandler):
+            def do_GET(self):
+                requests.append(self.path)
+                SimpleHTTPRequestHandler.do_GET(self)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory='test_replays'))
+        threading.Thread(target=server.serve_forever).start()
+        try:
+            base = 'http://127.0.0.1:{0}/'.format(server.server_port)
+            urls = [base+'2.0.8.25604/mlg1.SC2Replay', base+'1.2.2.17811/13.SC2Replay', base+'2.0.8.25604/mlg1.SC2Replay']
+            factory = AsyncSC2Factory(max_connections=2)
+
+            async def load():
+                first = await factory.load_replay(urls[0], load_level=1)
+                return first, await factory.load_replays(urls, load_level=1)
+
+            first, replays = asyncio.run(load())
+            factory.close()
+
+            self.assertEqual(first.filename, urls[0])
+            self.assertEqual([replay.filename for replay in replays], urls)
+            self.assertEqual(replays[0].filehash, replays[2].filehash)
+            self.assertEqual(replays[1].release_string, '1.2.2.17811')
+            self.assertTrue(replays[0].factory is factory.factory)
+
+            # The batch downloaded the duplicate url once
+            self.assertEqual(sorted(requests), ['/1.2.2.17811/13.SC2Replay', '/2.0.8.25604/mlg1.SC2Replay', '/2.0.8.25604/mlg1.SC2Replay'])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_shared_maps(self):
+        import threading
+        import time
+        from sc2reader.factories import SC2Factory
+        from sc2reader.resources import Map
+
+        class MapCounter(SC2Factory):
+            # Stands in for the depot, maps are loaded as their hashes
+            def __init__(self, **options):
+                super(MapCounter, self).__init__(**options)
+                self.map_loads = list()
+                self.map_threads = set()
+
+            def load(self, cls, source, options=None, **new_options):
+                if cls is not Map:
+                    return super(MapCounter, self).load(cls, source, options, **new_options)
+                self.map_loads.append(source.hash)
+                self.map_threads.add(threading.current_thread())
+                time.sleep(0.05)
+                return source.hash
+
+        sources = ["test_replays/1.2.2.17811/{0}.SC2Replay".format(i) for i in (1, 2, 3, 1, 2, 3)]
+        factory = MapCounter()
+        replays = list(factory.load_replays(sources, load_level=1, load_map=True, prefetch_maps=2))
+        self.assertEqual([replay.map for replay in replays], [replay.map_hash for replay in replays])
+        self.assertEqual(sorted(factory.map_loads), sorted(set(replay.map_hash for replay in replays)))
+        self.assertTrue(factory.map_threads - set([threading.current_thread()]))
+
+        # Concurrent loads of one map wait on the first
+        factory = MapCounter(map_cache_size=1)
+        map_file = replays[0].map_file
+        threads = [threading.Thread(target=factory.load_map, args=(map_file,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(factory.map_loads, [map_file.hash])
+
+        # Without sharing every load is made
+        factory = MapCounter(map_cache_size=0)
+        list(factory.load_replays(sources, load_level=1, load_map=True))
+        self.assertEqual(len(factory.map_loads), 6)
+
+    def test_lazy_datapacks(self):
+        import os
+        import shutil
+        import subprocess
+        import tempfile
+        from sc2reader import data
+
+        # Nothing is built on import, and using a datapack only builds that one
+        script = "\n".join([
+            "import sc2reader.data as data",
+            "built = lambda: sum(len(builds._builds) for builds in data.builds.values())",
+            "print(built())",
+            "data.builds['HotS']['24764']",
+            "print(built())",
+        ])
+        built = subprocess.check_output([sys.executable, '-c', script]).split()
+        self.assertEqual([int(count) for count in built], [0, 1])
+
+        replay = sc2reader.load_replay("test_replays/2.0.8.25604/mlg1.SC2Replay", load_level=1)
+        self.assertTrue(replay.datapack is data.builds['HotS']['24764'])
+        self.assertEqual(sorted(data.builds['WoL']), ['16117', '17326', '18092', '19458', '22612', '24944'])
+
+        # Snapshots hold the same rows as the data files
+        snapshot_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(snapshot_dir, 'datapacks.pickle')
+            data.write_snapshot(path)
+            rows = data.read_snapshot(path)
+            self.assertEqual(rows[('HotS', '24764')], data.build_rows('HotS', '24764'))
+            self.assertEqual(len(rows), 10)
+
+            with open(path, 'wb') as snapshot_file:
+                snapshot_file.write(b'not a snapshot')
+            self.assertEqual(data.read_snapshot(path), None)
+        finally:
+            shutil.rmtree(snapshot_dir)
+
+    @unittest.skipIf(sys.version_info < (3, 7), "Modules can only import lazily from python 3.7")
+    def test_import_budget(self):
+        import subprocess
+
+        def imported(script):
+            # Returns the modules imported by the script
+            output = subprocess.check_output([sys.executable, '-c', script + "; import sys; print(' '.join(sys.modules))"])
+            return set(output.decode('utf8').split())
+
+        # The import time itself is measured by examples/sc2bench.py
+        modules = imported("import sc2reader")
+        self.assertEqual(sorted(name for name in modules if name.startswith('sc2reader')), ['sc2reader', 'sc2reader.log_utils'])
+        for name in ('sc2reader.engine', 'sc2reader.factories', 'sc2reader.data', 'urllib.request', 'concurrent.futures', 'asyncio'):
+            self.assertFalse(name in modules, name)
+
+        modules = imported("import sc2reader; sc2reader.peek_header('test_replays/2.0.8.25604/mlg1.SC2Replay')")
+        for name in ('sc2reader.engine', 'sc2reader.events', 'sc2reader.readers', 'sc2reader.schema', 'urllib.request', 'concurrent.futures', 'asyncio'):
+            self.assertFalse(name in modules, name)
+
+        # Everything is still reachable from the sc2reader module
+        script = "import sc2reader; print(sc2reader.engine.GameEngine, sc2reader.SC2Reader, sc2reader.factories.AsyncSC2Factory, sc2reader.utils.DepotFile)"
+        subprocess.check_output([sys.executable, '-c', script])
+
     def test_gameheartnormalizer_plugin(self):
         from sc2reader.engine.plugins import GameHeartNormalizer
         sc2reader.engine.register_plugin(GameHeartNormalizer())
@@ -358,6 +1395,13 @@ class TestReplays(unittest.TestCase):
         self.assertEqual(replay.teams[1].players[0].name, 'LiquidTaeJa')
         self.assertEqual(replay.winner, replay.teams[0])
 
+        # It moves every event back, so the readers can't skip any of them
+        from sc2reader.engine import GameEngine
+        engine = GameEngine(plugins=[GameHeartNormalizer()])
+        self.assertEqual(engine.event_types(), None)
+        filtered = sc2reader.load_replay("test_replays/gameheart/gh_sameteam.SC2Replay", engine=engine, event_types=engine.event_types())
+        self.assertEqual([(e.name, e.frame) for e in filtered.events], [(e.name, e.frame) for e in replay.events])
+
 
 if __name__ == '__main__':
     unittest.main()